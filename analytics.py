@@ -0,0 +1,181 @@
+# 활동 기록 분석 인덱스: 추가될 때마다 일별/카테고리/습관 집계와 연속 기록(streak)을 갱신
+import bisect
+from collections import Counter, OrderedDict
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from records import ActivityRecord, timestamp_day, timestamp_key
+
+# 시각을 해석할 수 없는 활동은 가장 오래된 것으로 정렬
+UNKNOWN_TIME_KEY = -(1 << 62)
+
+
+class UserActivityStats:
+    """한 사용자의 활동 집계와 시간순 인덱스
+
+    - days / categories / habits / kinds: 추가마다 O(1)로 증가하는 카운터
+    - 연속 기록은 마지막 활동일 기준으로 이어 붙이고, 과거 날짜가 늦게 들어온 경우에만 다시 계산
+    - keys/records: (시각 키, 순번) 순으로 정렬된 목록 (대부분 끝에 추가되므로 삽입도 O(log n))
+      시각 키는 records.timestamp_key의 마이크로초 정수이고, records는 저장소와 같은 레코드 객체를 공유
+    """
+
+    def __init__(self):
+        self.seen = 0  # 반영한 활동 수 (저장소의 활동 수와 비교해 새 활동 감지)
+        self.position = 0  # 마지막으로 반영한 활동의 저장소 위치 (Repository.scan_activities)
+        self.days: Counter = Counter()
+        self.categories: Counter = Counter()
+        self.habits: Counter = Counter()
+        self.kinds: Counter = Counter()
+        self.last_day: Optional[date] = None
+        self.current_run = 0  # last_day에서 끝나는 연속 일수
+        self.longest_streak = 0
+        self.keys: List[Tuple[int, int]] = []
+        self.records: List[ActivityRecord] = []
+
+    def add(self, record: ActivityRecord) -> None:
+        seq = self.seen
+        self.seen += 1
+        self.kinds[record.activity or "unknown"] += 1
+        if record.category:
+            self.categories[record.category] += 1
+        if record.habit:
+            self.habits[record.habit] += 1
+
+        time_key = timestamp_key(record.timestamp)
+        key = (UNKNOWN_TIME_KEY if time_key is None else time_key, seq)
+        index = bisect.bisect_right(self.keys, key)
+        self.keys.insert(index, key)
+        self.records.insert(index, record)
+
+        day = timestamp_day(record.timestamp)
+        if day is None:
+            return
+        self.days[day.isoformat()] += 1
+        if self.days[day.isoformat()] > 1:
+            return
+        if self.last_day is None or day == self.last_day + timedelta(days=1):
+            self.current_run = self.current_run + 1 if self.last_day is not None else 1
+            self.last_day = day
+        elif day > self.last_day:
+            self.current_run = 1
+            self.last_day = day
+        else:
+            self._recompute_streaks()
+            return
+        self.longest_streak = max(self.longest_streak, self.current_run)
+
+    def _recompute_streaks(self) -> None:
+        """과거 날짜가 새로 추가되었을 때 전체 연속 기록을 다시 계산 (활동한 날 수에 비례)"""
+        run = 0
+        longest = 0
+        previous = None
+        for day in sorted(date.fromisoformat(key) for key in self.days):
+            run = run + 1 if previous is not None and day == previous + timedelta(days=1) else 1
+            longest = max(longest, run)
+            previous = day
+        self.last_day = previous
+        self.current_run = run
+        self.longest_streak = longest
+
+    def current_streak(self, today: date) -> int:
+        """오늘 또는 어제까지 이어진 연속 일수 (그 전에 끊겼으면 0)"""
+        if self.last_day is None or self.last_day < today - timedelta(days=1):
+            return 0
+        return self.current_run
+
+    def page(
+        self,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+        before: Optional[Tuple[int, int]] = None,
+        limit: int = 50,
+    ) -> Tuple[List[ActivityRecord], Optional[Tuple[int, int]]]:
+        """시각 키 [since, until) 범위에서 before보다 오래된 활동을 최신순으로 limit개, 다음 커서와 함께 반환"""
+        lo = bisect.bisect_left(self.keys, (since, -1)) if since is not None else 0
+        hi = bisect.bisect_left(self.keys, (until, -1)) if until is not None else len(self.keys)
+        if before is not None:
+            hi = min(hi, bisect.bisect_left(self.keys, before))
+        start = max(lo, hi - limit)
+        records = self.records[start:hi][::-1]
+        next_cursor = self.keys[start] if start > lo else None
+        return records, next_cursor
+
+    def summary(self, today: date, recent_days: int) -> Dict:
+        daily = [
+            {"date": day.isoformat(), "count": self.days.get(day.isoformat(), 0)}
+            for day in (today - timedelta(days=offset) for offset in range(recent_days - 1, -1, -1))
+        ]
+        return {
+            "total": self.seen,
+            "active_days": len(self.days),
+            "current_streak": self.current_streak(today),
+            "longest_streak": self.longest_streak,
+            "last_active_day": self.last_day.isoformat() if self.last_day else None,
+            "daily": daily,
+            "categories": dict(self.categories.most_common()),
+            "habits": dict(self.habits.most_common()),
+            "activities": dict(self.kinds.most_common()),
+        }
+
+
+class ActivityAnalytics:
+    """사용자별 UserActivityStats를 LRU로 보관
+
+    처음 조회할 때 저장소의 활동을 chunk개씩 읽어 만들고, 이후 조회에서 저장소의 사용자별 활동 수가
+    반영한 수보다 많으면 (이 프로세스나 다른 워커가 기록한 경우) 마지막으로 반영한 위치 이후의 활동만
+    읽어 더합니다. 활동 수가 줄어든 경우(초기화)에만 그 사용자의 인덱스를 다시 만듭니다.
+    """
+
+    def __init__(
+        self,
+        scan: Callable[[str, int, int], List[Tuple[int, ActivityRecord]]],
+        count: Callable[[str], int],
+        max_users: int,
+        chunk: int = 1000,
+    ):
+        self._scan = scan
+        self._count = count
+        self.max_users = max_users
+        self.chunk = chunk
+        self._users: OrderedDict = OrderedDict()
+        self.counters = {"builds": 0, "rebuilds": 0, "updates": 0}
+
+    def _apply_new(self, user_id: str, stats: UserActivityStats) -> int:
+        """stats.position 이후의 활동을 저장소 순서대로 반영하고 반영한 개수 반환"""
+        applied = 0
+        while True:
+            page = self._scan(user_id, stats.position, self.chunk)
+            for position, record in page:
+                stats.add(record)
+                stats.position = position
+            applied += len(page)
+            if len(page) < self.chunk:
+                return applied
+
+    def get(self, user_id: str) -> UserActivityStats:
+        stats = self._users.get(user_id)
+        if stats is not None:
+            count = self._count(user_id)
+            if stats.seen < count:
+                # 수를 센 뒤 추가된 활동까지 읽을 수 있으므로 반영한 수가 같거나 많으면 최신
+                self.counters["updates"] += self._apply_new(user_id, stats)
+                fresh = stats.seen >= count
+            else:
+                fresh = stats.seen == count
+            if fresh:
+                self._users.move_to_end(user_id)
+                return stats
+        self.counters["rebuilds" if stats is not None else "builds"] += 1
+        stats = UserActivityStats()
+        self._apply_new(user_id, stats)
+        self._users[user_id] = stats
+        self._users.move_to_end(user_id)
+        if len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+        return stats
+
+    def clear(self) -> None:
+        self._users.clear()
+
+    def stats(self) -> Dict:
+        return {"users": len(self._users), "max_users": self.max_users, **self.counters}
@@ -0,0 +1,75 @@
+"""로그인 지연 시간 마이크로 벤치마크
+
+사용자 수를 1천 명에서 100만 명까지 늘려가며 login_user 핸들러의 평균 지연을 측정합니다.
+이메일 인덱스 덕분에 사용자 수와 관계없이 지연이 거의 일정해야 합니다.
+조회 비용만 보기 위해 KDF 작업량은 최소(PBKDF2 1회)로 낮춰서 측정합니다.
+
+실행: python benchmarks/bench_login.py [--sizes 1000 10000 100000 1000000] [--logins 2000]
+"""
+import argparse
+import asyncio
+import gc
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+
+def populate(count: int, hashed_password: str) -> None:
+    """저장소를 비우고 count명의 사용자를 직접 채웁니다 (해시는 한 번만 계산)"""
+    main.repo.reset()
+    for i in range(count):
+        user_id = f"user_bench_{i}"
+        main.repo.add_user({
+            "id": user_id,
+            "name": f"사용자{i}",
+            "email": f"user{i}@example.com",
+            "password": hashed_password,
+            "joinDate": "2024-06-10",
+            "createdAt": "2024-06-10T00:00:00",
+        })
+
+
+async def measure(count: int, logins: int, password: str) -> float:
+    """무작위가 아닌 고르게 퍼진 사용자들로 로그인하여 평균 지연(µs) 반환"""
+    step = max(count // logins, 1)
+    requests = [
+        main.UserLogin(email=f"user{(i * step) % count}@example.com", password=password)
+        for i in range(logins)
+    ]
+
+    start = time.perf_counter()
+    for login in requests:
+        await main.login_user(login)
+    elapsed = time.perf_counter() - start
+
+    return elapsed / logins * 1_000_000
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description="로그인 지연 벤치마크")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--logins", type=int, default=2_000)
+    args = parser.parse_args()
+
+    # KDF 비용이 조회 비용을 가리지 않도록 작업량을 최소로 설정
+    main.PASSWORD_KDF = "pbkdf2_sha256"
+    main.PBKDF2_ITERATIONS = 1
+
+    password = "bench-password"
+    hashed_password = main.hash_password(password)
+
+    print(f"{'users':>10} | {'avg login (µs)':>15}")
+    print("-" * 28)
+    for count in args.sizes:
+        populate(count, hashed_password)
+        gc.collect()
+        avg_us = asyncio.run(measure(count, args.logins, password))
+        print(f"{count:>10,} | {avg_us:>15.1f}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,115 @@
+"""로그인 폭주 중 채팅 지연 벤치마크
+
+가짜 업스트림(고정 지연)을 붙인 상태에서 /api/chat/send 지연을 세 가지 상황에서 측정합니다.
+
+1. baseline  : 로그인 없이 채팅만
+2. offloaded : 로그인 폭주 + 채팅 (해시를 전용 스레드 풀에서 실행, 현재 방식)
+3. inline    : 로그인 폭주 + 채팅 (해시를 이벤트 루프에서 직접 실행, 이전 방식)
+
+offloaded의 채팅 지연이 baseline과 비슷하고 inline만 크게 늘어나야 합니다.
+
+실행: python benchmarks/bench_login_storm.py [--logins 200] [--chats 40] [--upstream-delay 0.05]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["RATE_LIMIT_ENABLED"] = "false"  # 같은 사용자가 채팅을 연달아 보내므로 요청 제한 끔
+
+import main  # noqa: E402
+
+
+def fake_upstream(delay: float) -> httpx.AsyncClient:
+    """고정 지연 후 짧은 답변을 돌려주는 가짜 업스트림"""
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(delay)
+        return httpx.Response(200, json={
+            "choices": [{"message": {"role": "assistant", "content": "좋아요!"}}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12},
+        })
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def percentile(values, ratio: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+
+async def chat_latencies(client: httpx.AsyncClient, token: str, count: int, until: asyncio.Task = None) -> list:
+    """채팅을 count번 (until 작업이 있으면 그 작업이 끝날 때까지 계속) 보내고 지연(ms) 목록 반환"""
+    latencies = []
+    headers = {"Authorization": f"Bearer {token}"}
+    i = 0
+    while i < count or (until is not None and not until.done()):
+        i += 1
+        start = time.perf_counter()
+        response = await client.post("/api/chat/send", json={"message": f"질문 {i}"}, headers=headers)
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+async def login_storm(client: httpx.AsyncClient, emails: list, count: int) -> None:
+    async def login(i: int) -> None:
+        await client.post("/api/auth/login", json={"email": emails[i % len(emails)], "password": "storm-password"})
+    await asyncio.gather(*(login(i) for i in range(count)))
+
+
+async def run(args) -> None:
+    main.http_client = fake_upstream(args.upstream_delay)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        response = await client.post("/api/auth/register", json={"name": "채팅", "email": "chat@example.com", "password": "chat-password"})
+        token = response.json()["token"]
+        emails = [f"storm{i}@example.com" for i in range(10)]
+        for email in emails:
+            await client.post("/api/auth/register", json={"name": "폭주", "email": email, "password": "storm-password"})
+
+        results = {"baseline": await chat_latencies(client, token, args.chats)}
+
+        async def with_storm() -> list:
+            storm = asyncio.create_task(login_storm(client, emails, args.logins))
+            latencies = await chat_latencies(client, token, args.chats, until=storm)
+            await storm
+            return latencies
+
+        results["offloaded"] = await with_storm()
+
+        # 이전 방식: 해시를 이벤트 루프에서 직접 계산
+        offloaded_job = main.run_password_job
+
+        async def inline_job(func, *job_args):
+            return func(*job_args)
+
+        main.run_password_job = inline_job
+        try:
+            results["inline"] = await with_storm()
+        finally:
+            main.run_password_job = offloaded_job
+
+    print(f"KDF={main.PASSWORD_KDF} logins={args.logins} chats={args.chats} upstream_delay={args.upstream_delay * 1000:.0f}ms")
+    print(f"{'scenario':>10} | {'chats':>5} | {'mean (ms)':>9} | {'p50 (ms)':>9} | {'p95 (ms)':>9} | {'max (ms)':>9}")
+    print("-" * 68)
+    for name, latencies in results.items():
+        print(
+            f"{name:>10} | {len(latencies):>5} | {statistics.mean(latencies):>9.1f} | {statistics.median(latencies):>9.1f}"
+            f" | {percentile(latencies, 0.95):>9.1f} | {max(latencies):>9.1f}"
+        )
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description="로그인 폭주 중 채팅 지연 벤치마크")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--chats", type=int, default=40)
+    parser.add_argument("--upstream-delay", type=float, default=0.05)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,100 @@
+"""채팅/활동 기록의 메모리 사용량 벤치마크
+
+같은 내용의 기록을 이전 방식(딕셔너리 + ISO 문자열)과 현재 방식(records 모듈의 __slots__ 레코드,
+epoch 마이크로초 정수, intern된 반복 문자열)으로 N개씩 만들어 tracemalloc으로 잰 기록당 바이트를 비교합니다.
+요청 본문을 JSON으로 받은 것처럼 카테고리/습관/role 문자열은 기록마다 새 객체로 만들어 넣습니다.
+
+실행: python benchmarks/bench_record_memory.py [--count 100000]
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from records import ActivityRecord, ChatRecord, encode_timestamp  # noqa: E402
+
+CATEGORIES = ["health", "productivity", "learning", "mindfulness", "chat"]
+HABITS = ["아침 운동", "물 마시기", "독서 10분", "명상", "habit_coaching"]
+ACTIVITIES = ["habit_qa_request", "habit_selected", "chat_conversation", "habit_completed"]
+
+
+def fresh(text: str) -> str:
+    """JSON 파싱 결과처럼 같은 내용의 새 문자열 객체"""
+    return text.encode().decode()
+
+
+def moment(i: int) -> datetime:
+    return datetime(2025, 1, 1) + timedelta(seconds=i * 37, microseconds=i % 1000000)
+
+
+def activity_dict(i: int) -> dict:
+    now = moment(i).isoformat()
+    record = {
+        "activity": fresh(ACTIVITIES[i % len(ACTIVITIES)]),
+        "timestamp": now,
+        "category": fresh(CATEGORIES[i % len(CATEGORIES)]),
+        "habit": fresh(HABITS[i % len(HABITS)]),
+    }
+    if i % 2 == 0:
+        record["question"] = f"습관을 꾸준히 이어가려면 어떻게 해야 하나요? {i}"
+    record["recordedAt"] = moment(i).isoformat()  # 이전 방식은 같은 시각을 문자열로 한 번 더 보관
+    return record
+
+
+def activity_record(i: int) -> ActivityRecord:
+    now = encode_timestamp(moment(i).isoformat())
+    return ActivityRecord(
+        fresh(ACTIVITIES[i % len(ACTIVITIES)]), now, fresh(CATEGORIES[i % len(CATEGORIES)]), fresh(HABITS[i % len(HABITS)]),
+        question=f"습관을 꾸준히 이어가려면 어떻게 해야 하나요? {i}" if i % 2 == 0 else None,
+        recorded_at=now,
+    )
+
+
+def chat_dict(i: int) -> dict:
+    return {"id": i + 1, "role": fresh("user" if i % 2 == 0 else "assistant"), "content": f"메시지 {i}", "timestamp": moment(i).isoformat()}
+
+
+def chat_record(i: int) -> ChatRecord:
+    return ChatRecord(i + 1, fresh("user" if i % 2 == 0 else "assistant"), f"메시지 {i}", encode_timestamp(moment(i).isoformat()))
+
+
+def measure(build, count: int) -> float:
+    """build로 count개를 만들어 리스트에 보관했을 때 늘어난 메모리 (기록당 바이트)"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    items = [build(i) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert len(items) == count
+    del items
+    return (after - before) / count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=100000)
+    args = parser.parse_args()
+
+    # 두 방식의 JSON 형태가 같은지 먼저 확인
+    for i in range(10):
+        assert activity_record(i).to_dict() == activity_dict(i)
+        assert chat_record(i).to_dict() == chat_dict(i)
+
+    print(f"기록 {args.count:,}개 (질문 내용/메시지 본문 문자열 포함)")
+    print(f"{'kind':<10} {'dict B/rec':>12} {'record B/rec':>13} {'saved':>7}")
+    for kind, before_build, after_build in (
+        ("activity", activity_dict, activity_record),
+        ("chat", chat_dict, chat_record),
+    ):
+        before = measure(before_build, args.count)
+        after = measure(after_build, args.count)
+        print(f"{kind:<10} {before:>12.1f} {after:>13.1f} {1 - after / before:>6.0%}")
+
+
+if __name__ == "__main__":
+    main()
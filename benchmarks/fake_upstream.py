@@ -0,0 +1,148 @@
+"""부하 테스트용 가짜 LLM 업스트림
+
+부트캠프 API와 같은 형식(POST, 본문은 메시지 목록)으로 요청을 받아 지연 후 답변을 돌려줍니다.
+외부 의존성 없이 asyncio 소켓 서버로 동작하며 keep-alive 연결을 지원합니다.
+
+- latency / jitter : 응답 지연 = latency ± jitter (초)
+- error_rate       : 이 비율만큼 503 응답
+- stream           : Accept: text/event-stream 요청에 SSE로 토큰 단위 응답
+
+단독 실행: python benchmarks/fake_upstream.py --port 9100 --latency 0.3 --jitter 0.1 --error-rate 0.01 --stream
+앱 연결:   BOOTCAMP_API_URL=http://127.0.0.1:9100/ uvicorn main:app
+"""
+import argparse
+import asyncio
+import json
+import random
+from typing import Dict, Optional
+
+ANSWER = (
+    "좋은 질문이에요! 아주 작은 습관부터 시작해볼까요?\n\n"
+    "1. 2분 규칙: 처음에는 2분 안에 끝나는 버전으로 시작하세요.\n"
+    "2. 습관 쌓기: 이미 하고 있는 행동 바로 뒤에 새 습관을 붙이세요.\n"
+    "3. 환경 디자인: 좋은 습관에 필요한 물건을 눈에 보이는 곳에 두세요.\n\n"
+    "완벽하지 않아도 괜찮아요. 매일 조금씩 반복하는 것이 핵심입니다."
+)
+
+
+class FakeUpstream:
+    def __init__(self, latency: float = 0.3, jitter: float = 0.1, error_rate: float = 0.0, stream: bool = False, chunk_delay: float = 0.01):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.stream = stream
+        self.chunk_delay = chunk_delay
+        self.stats = {"requests": 0, "errors": 0, "streams": 0}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """서버를 시작하고 접속 URL 반환 (port=0이면 빈 포트 사용)"""
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        port = self._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{port}/"
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+    def _usage(self, messages) -> Dict:
+        prompt_chars = sum(len(message.get("content", "")) for message in messages) if isinstance(messages, list) else 0
+        prompt_tokens = prompt_chars // 2 + 1
+        completion_tokens = len(ANSWER) // 2
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+                await self._respond(writer, headers, body)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer: asyncio.StreamWriter, headers: Dict, body: bytes) -> None:
+        self.stats["requests"] += 1
+        await asyncio.sleep(self._delay())
+
+        if random.random() < self.error_rate:
+            self.stats["errors"] += 1
+            payload = b'{"error": "fake upstream error"}'
+            writer.write(b"HTTP/1.1 503 Service Unavailable\r\nContent-Type: application/json\r\n"
+                         b"Content-Length: " + str(len(payload)).encode() + b"\r\n\r\n" + payload)
+            await writer.drain()
+            return
+
+        try:
+            messages = json.loads(body or b"[]")
+        except ValueError:
+            messages = []
+        usage = self._usage(messages)
+
+        if self.stream and "text/event-stream" in headers.get("accept", ""):
+            self.stats["streams"] += 1
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n")
+            for i in range(0, len(ANSWER), 8):
+                event = {"choices": [{"delta": {"content": ANSWER[i:i + 8]}}]}
+                await self._write_chunk(writer, f"data: {json.dumps(event, ensure_ascii=False)}\n\n")
+                await asyncio.sleep(self.chunk_delay)
+            await self._write_chunk(writer, f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n")
+            await self._write_chunk(writer, "data: [DONE]\n\n")
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+            return
+
+        payload = json.dumps({
+            "choices": [{"message": {"role": "assistant", "content": ANSWER}}],
+            "usage": usage,
+        }, ensure_ascii=False).encode()
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                     b"Content-Length: " + str(len(payload)).encode() + b"\r\n\r\n" + payload)
+        await writer.drain()
+
+    async def _write_chunk(self, writer: asyncio.StreamWriter, text: str) -> None:
+        data = text.encode()
+        writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        await writer.drain()
+
+
+async def serve(args) -> None:
+    upstream = FakeUpstream(args.latency, args.jitter, args.error_rate, args.stream)
+    url = await upstream.start(args.host, args.port)
+    print(f"가짜 업스트림 실행 중: {url} (latency={args.latency}s jitter={args.jitter}s error_rate={args.error_rate} stream={args.stream})")
+    await asyncio.Event().wait()
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description="부하 테스트용 가짜 LLM 업스트림")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--stream", action="store_true")
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,257 @@
+"""가짜 업스트림을 붙인 부하 테스트
+
+templates/index.html의 실제 사용 흐름을 가상 사용자 여러 명이 동시에 반복합니다.
+
+1. 회원가입 → 로그인, 목표 카테고리 조회
+2. 습관 카드 선택 (/api/habits/select) + 카드 추천 Q&A, 가끔 "다른 추천 받기"
+3. 채팅창 열기 (/api/chat/history) 후 여러 턴 /api/chat/send
+4. 활동 내역 폴링 (/api/user/activities)
+5. 로그아웃
+
+엔드포인트별 처리량(RPS)과 p50/p95/p99 지연, 상태 코드, 메모리(RSS) 증가량을 출력하고
+--output 경로에 JSON으로 저장합니다 (실행 간 회귀 비교용).
+
+기본은 앱을 같은 프로세스에서 ASGI로 직접 호출합니다. 실제 서버를 측정하려면:
+    python benchmarks/fake_upstream.py --port 9100 &
+    BOOTCAMP_API_URL=http://127.0.0.1:9100/ uvicorn main:app --port 8000 &
+    python benchmarks/load_test.py --app-url http://127.0.0.1:8000 --app-pid <uvicorn pid>
+
+실행: python benchmarks/load_test.py [--users 50] [--iterations 3] [--latency 0.3] [--stream] [--output load.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fake_upstream import FakeUpstream  # noqa: E402
+
+CHAT_QUESTIONS = [
+    "아침에 일어나자마자 할 수 있는 작은 습관이 뭐가 있을까요?",
+    "자꾸 운동을 미루게 되는데 어떻게 하면 좋을까요?",
+    "습관을 3일 넘게 유지하기가 너무 어려워요.",
+    "2분 규칙을 독서에 적용하려면 어떻게 해야 하나요?",
+    "스마트폰 사용 시간을 줄이고 싶어요.",
+    "좋은 습관을 기존 루틴에 연결하는 예시를 알려주세요.",
+]
+
+
+def rss_bytes(pid: Optional[int] = None) -> Optional[int]:
+    """프로세스의 현재 RSS (리눅스 /proc 사용, 없으면 자기 자신의 최대 RSS)"""
+    path = f"/proc/{pid or 'self'}/statm"
+    try:
+        with open(path) as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        if pid is not None:
+            return None
+        scale = 1 if platform.system() == "Darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def percentile(values: List[float], ratio: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+
+class Recorder:
+    """엔드포인트별 지연과 상태 코드 기록"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.failures: Dict[str, int] = defaultdict(int)
+
+    async def request(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            if kwargs.get("headers", {}).get("Accept") == "text/event-stream":
+                await response.aread()
+        except httpx.HTTPError:
+            self.failures[name] += 1
+            return None
+        finally:
+            self.latencies[name].append((time.perf_counter() - start) * 1000)
+        self.statuses[name][response.status_code] += 1
+        return response
+
+    def summary(self, elapsed: float) -> Dict:
+        endpoints = {}
+        for name, values in sorted(self.latencies.items()):
+            endpoints[name] = {
+                "requests": len(values),
+                "rps": round(len(values) / elapsed, 2),
+                "mean_ms": round(statistics.mean(values), 2),
+                "p50_ms": round(percentile(values, 0.50), 2),
+                "p95_ms": round(percentile(values, 0.95), 2),
+                "p99_ms": round(percentile(values, 0.99), 2),
+                "max_ms": round(max(values), 2),
+                "status_codes": {str(code): count for code, count in sorted(self.statuses[name].items())},
+                "transport_errors": self.failures[name],
+            }
+        return endpoints
+
+
+async def virtual_user(client: httpx.AsyncClient, recorder: Recorder, user_no: int, args, catalog: Dict) -> None:
+    """index.html의 한 사용자 흐름을 args.iterations번 반복"""
+    rng = random.Random(user_no)
+    email = f"load{user_no}_{int(time.time() * 1000)}@example.com"
+    password = "load-test-password"
+
+    await recorder.request(client, "POST /api/auth/register", "POST", "/api/auth/register",
+                           json={"name": f"부하{user_no}", "email": email, "password": password})
+    response = await recorder.request(client, "POST /api/auth/login", "POST", "/api/auth/login",
+                                      json={"email": email, "password": password})
+    if response is None or response.status_code != 200:
+        return
+    headers = {"Authorization": f"Bearer {response.json()['token']}"}
+    await recorder.request(client, "GET /api/habits/goals", "GET", "/api/habits/goals")
+
+    qa_path = "/api/habits/qa/stream" if args.stream else "/api/habits/qa"
+    chat_path = "/api/chat/stream" if args.stream else "/api/chat/send"
+    stream_headers = {**headers, "Accept": "text/event-stream"} if args.stream else headers
+
+    for _ in range(args.iterations):
+        # 카드 클릭 → 습관 선택 + 추천 Q&A
+        category = rng.choice(list(catalog))
+        title, prompt = rng.choice(catalog[category])
+        await recorder.request(client, "POST /api/habits/select", "POST", "/api/habits/select", headers=headers,
+                               json={"title": title, "prompt": prompt, "category": category})
+        request_type = "alternative" if rng.random() < args.alternative_ratio else None
+        template = "{prompt}에 대해 이전과 다른 새로운 아주 작은 습관 3개를 추천해주세요. 창의적이고 실행하기 쉬운 방법들로 제안해주세요." if request_type \
+            else "{prompt}에 대해 구체적이고 실행 가능한 아주 작은 습관 3개를 추천해주세요. 각 습관마다 실행 방법과 기대 효과를 포함해서 설명해주세요."
+        await recorder.request(client, f"POST {qa_path}", "POST", qa_path, headers=stream_headers,
+                               json={"question": template.format(prompt=prompt), "category": category,
+                                     "habitType": title, "requestType": request_type})
+        await recorder.request(client, "GET /api/user/activities", "GET", "/api/user/activities", headers=headers)
+
+        # 채팅창 열기 → 여러 턴 대화
+        await recorder.request(client, "GET /api/chat/history", "GET", "/api/chat/history", headers=headers)
+        for _ in range(args.chat_turns):
+            await recorder.request(client, f"POST {chat_path}", "POST", chat_path, headers=stream_headers,
+                                   json={"message": rng.choice(CHAT_QUESTIONS)})
+
+        # 활동 내역 폴링
+        for _ in range(args.polls):
+            await asyncio.sleep(args.think_time)
+            await recorder.request(client, "GET /api/user/activities", "GET", "/api/user/activities", headers=headers)
+
+    await recorder.request(client, "POST /api/auth/logout", "POST", "/api/auth/logout", headers=headers)
+
+
+async def run(args) -> Dict:
+    upstream = None
+    upstream_url = args.upstream_url
+    if upstream_url is None:
+        upstream = FakeUpstream(args.latency, args.jitter, args.error_rate, args.stream)
+        upstream_url = await upstream.start()
+    os.environ["BOOTCAMP_API_URL"] = upstream_url
+    if not args.rate_limit:
+        os.environ["RATE_LIMIT_ENABLED"] = "false"  # 처리량 측정이 목적이므로 기본은 요청 제한 끔
+
+    import main  # 환경변수를 설정한 뒤 불러와야 가짜 업스트림을 사용
+    catalog = main.HABIT_CATALOG
+
+    lifespan = None
+    if args.app_url:
+        client = httpx.AsyncClient(base_url=args.app_url, timeout=None)
+        pid = args.app_pid
+    else:
+        lifespan = main.lifespan(main.app)
+        await lifespan.__aenter__()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://load", timeout=None)
+        pid = None
+
+    recorder = Recorder()
+    rss_start = rss_bytes(pid)
+    start = time.perf_counter()
+    try:
+        async with client:
+            await asyncio.gather(*(virtual_user(client, recorder, i, args, catalog) for i in range(args.users)))
+            elapsed = time.perf_counter() - start
+            status = (await client.get("/api/status")).json()
+    finally:
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+        if upstream is not None:
+            await upstream.stop()
+    rss_end = rss_bytes(pid)
+
+    total = sum(len(values) for values in recorder.latencies.values())
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "python": platform.python_version(),
+        "elapsed_s": round(elapsed, 3),
+        "total_requests": total,
+        "rps": round(total / elapsed, 2),
+        "endpoints": recorder.summary(elapsed),
+        "memory": {
+            "rss_start_bytes": rss_start,
+            "rss_end_bytes": rss_end,
+            "rss_growth_bytes": rss_end - rss_start if rss_start is not None and rss_end is not None else None,
+        },
+        "upstream": upstream.stats if upstream is not None else None,
+        "server_status": status,
+    }
+
+
+def print_report(result: Dict) -> None:
+    print(f"users={result['config']['users']} iterations={result['config']['iterations']} "
+          f"elapsed={result['elapsed_s']}s total={result['total_requests']} rps={result['rps']}")
+    print(f"{'endpoint':<32} | {'reqs':>6} | {'rps':>7} | {'p50 (ms)':>9} | {'p95 (ms)':>9} | {'p99 (ms)':>9} | status")
+    print("-" * 100)
+    for name, stats in result["endpoints"].items():
+        codes = " ".join(f"{code}:{count}" for code, count in stats["status_codes"].items())
+        print(f"{name:<32} | {stats['requests']:>6} | {stats['rps']:>7.1f} | {stats['p50_ms']:>9.1f}"
+              f" | {stats['p95_ms']:>9.1f} | {stats['p99_ms']:>9.1f} | {codes}")
+    memory = result["memory"]
+    if memory["rss_growth_bytes"] is not None:
+        print(f"RSS {memory['rss_start_bytes'] / 2**20:.1f} MiB → {memory['rss_end_bytes'] / 2**20:.1f} MiB "
+              f"(+{memory['rss_growth_bytes'] / 2**20:.1f} MiB)")
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description="가짜 업스트림을 붙인 부하 테스트")
+    parser.add_argument("--users", type=int, default=50, help="동시 가상 사용자 수")
+    parser.add_argument("--iterations", type=int, default=3, help="사용자별 카드 선택~채팅~폴링 반복 횟수")
+    parser.add_argument("--chat-turns", type=int, default=3)
+    parser.add_argument("--polls", type=int, default=2)
+    parser.add_argument("--think-time", type=float, default=0.05, help="폴링 사이 대기(초)")
+    parser.add_argument("--alternative-ratio", type=float, default=0.2, help="'다른 추천 받기' 비율")
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--stream", action="store_true", help="스트리밍 엔드포인트와 SSE 업스트림 사용")
+    parser.add_argument("--rate-limit", action="store_true", help="같은 프로세스 앱의 사용자/IP 요청 제한을 켠 채로 측정")
+    parser.add_argument("--upstream-url", help="이미 실행 중인 가짜 업스트림 주소")
+    parser.add_argument("--app-url", help="이미 실행 중인 앱 주소 (없으면 같은 프로세스에서 실행)")
+    parser.add_argument("--app-pid", type=int, help="--app-url 서버의 PID (메모리 측정용)")
+    parser.add_argument("--output", help="결과 JSON 저장 경로")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    print_report(result)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"결과 저장: {args.output}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,51 @@
+# 클라이언트가 연결을 끊으면 아직 응답을 시작하지 않은 핸들러를 취소 (업스트림 호출도 함께 취소됨)
+import asyncio
+
+
+class CancelOnDisconnectMiddleware:
+    """HTTP 요청마다 핸들러를 별도 Task로 실행하고, http.disconnect가 오면 취소하는 ASGI 미들웨어
+
+    receive는 별도 Task가 대신 읽어 큐로 넘기므로 핸들러가 receive를 기다리지 않는 동안에도
+    연결 종료를 알 수 있습니다. 응답을 이미 시작했다면 취소하지 않습니다
+    (스트리밍 응답은 Starlette가 직접 연결 종료를 감지해 본문 생성을 멈춤).
+    """
+
+    def __init__(self, app, cancelled):
+        self.app = app
+        self.cancelled = cancelled  # 취소한 요청 수를 세는 Counter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        messages: asyncio.Queue = asyncio.Queue()
+        state = {"started": False, "disconnected": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["started"] = True
+            await send(message)
+
+        handler = asyncio.ensure_future(self.app(scope, messages.get, send_wrapper))
+
+        async def pump():
+            while True:
+                message = await receive()
+                messages.put_nowait(message)
+                if message["type"] == "http.disconnect":
+                    state["disconnected"] = True
+                    if not state["started"] and not handler.done():
+                        handler.cancel()
+                    return
+
+        reader = asyncio.ensure_future(pump())
+        try:
+            await handler
+        except asyncio.CancelledError:
+            if not (handler.cancelled() and state["disconnected"]):
+                handler.cancel()  # 서버 종료 등 바깥에서 취소된 경우
+                raise
+            self.cancelled.inc()
+        finally:
+            reader.cancel()
@@ -3,28 +3,511 @@ from fastapi import FastAPI, HTTPException, Request, Form, Depends, Header
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, EmailStr
 import httpx
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
+import asyncio
+import base64
+import bisect
 import hashlib
+import hmac
+import json
+import os
 import secrets
 import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime, timedelta
 
-templates = Jinja2Templates(directory="templates")
+from analytics import ActivityAnalytics
+from cancellation import CancelOnDisconnectMiddleware
+from metrics import CallbackGauge, Counter, Gauge, Histogram, MetricsMiddleware, Registry
+from storage import ChatMemory, EmailTaken, MemoryRepository, RedisRepository, Repository, SQLiteRepository, create_redis_client
+from static_cache import PrecompressedAsset
+from similarity import DEFAULT_THRESHOLD as SIMILAR_DEFAULT_THRESHOLD, SimilarQuestionCache
+from tokens import TokenCounter, pack_context
+from ratelimit import RateLimitHeadersMiddleware, TokenBucketLimiter
+from records import ActivityRecord, ChatRecord, encode_timestamp, now_timestamp, timestamp_key
+from upstream import CircuitBreaker, HedgePolicy, UpstreamGateway, UpstreamUnavailable, upstream_flow
+
+templates = Jinja2Templates(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates"))
+
+# 🆕 미리 렌더링한 응답의 캐시 정책 (메인 페이지는 매번 ETag로 재검증, 고정 목록은 1시간 캐시)
+HOME_CACHE_CONTROL = os.getenv("HOME_CACHE_CONTROL", "no-cache")
+GOALS_CACHE_CONTROL = os.getenv("GOALS_CACHE_CONTROL", "public, max-age=3600")
+
+# 부트캠프 API 엔드포인트 URL (🆕 부하 테스트 등에서는 환경변수로 가짜 업스트림 지정)
+BOOTCAMP_API_URL = os.getenv("BOOTCAMP_API_URL", "https://dev.wenivops.co.kr/services/openai-api")
+
+# 🆕 업스트림 HTTP 클라이언트 설정 (환경변수로 조정 가능)
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "20"))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "30"))
+UPSTREAM_HTTP2 = os.getenv("UPSTREAM_HTTP2", "false").lower() in ("1", "true", "yes")
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "5"))
+UPSTREAM_READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", "30"))
+UPSTREAM_WRITE_TIMEOUT = float(os.getenv("UPSTREAM_WRITE_TIMEOUT", "10"))
+UPSTREAM_POOL_TIMEOUT = float(os.getenv("UPSTREAM_POOL_TIMEOUT", "5"))
+
+# 🆕 업스트림 동시 호출 제한 / 재시도 / 서킷 브레이커 설정
+UPSTREAM_MAX_IN_FLIGHT = int(os.getenv("UPSTREAM_MAX_IN_FLIGHT", "32"))
+UPSTREAM_MAX_QUEUE = int(os.getenv("UPSTREAM_MAX_QUEUE", "64"))
+UPSTREAM_QUEUE_TIMEOUT = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT", "10"))
+UPSTREAM_MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "2"))
+UPSTREAM_RETRY_BASE = float(os.getenv("UPSTREAM_RETRY_BASE", "0.5"))
+UPSTREAM_RETRY_MAX = float(os.getenv("UPSTREAM_RETRY_MAX", "4"))
+UPSTREAM_BREAKER_THRESHOLD = int(os.getenv("UPSTREAM_BREAKER_THRESHOLD", "5"))
+UPSTREAM_BREAKER_RESET = float(os.getenv("UPSTREAM_BREAKER_RESET", "30"))
+UPSTREAM_MAX_QUEUE_PER_FLOW = int(os.getenv("UPSTREAM_MAX_QUEUE_PER_FLOW", "8"))  # 🆕 사용자/IP 하나가 차지할 수 있는 대기열 자리
+
+# 🆕 애플리케이션 전체에서 공유하는 업스트림 클라이언트 (lifespan에서 생성/종료)
+http_client: Optional[httpx.AsyncClient] = None
+
+def create_http_client() -> httpx.AsyncClient:
+    """커넥션 풀과 keep-alive를 사용하는 업스트림 클라이언트 생성"""
+    http2 = UPSTREAM_HTTP2
+    if http2:
+        # HTTP/2는 h2 패키지가 필요합니다 (pip install "httpx[http2]")
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            print("h2 패키지가 없어 HTTP/1.1로 연결합니다")
+            http2 = False
+
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+            keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(
+            connect=UPSTREAM_CONNECT_TIMEOUT,
+            read=UPSTREAM_READ_TIMEOUT,
+            write=UPSTREAM_WRITE_TIMEOUT,
+            pool=UPSTREAM_POOL_TIMEOUT,
+        ),
+    )
+
+def get_http_client() -> httpx.AsyncClient:
+    """공유 업스트림 클라이언트 반환 (lifespan 밖에서 호출되면 지연 생성)"""
+    global http_client
+    if http_client is None:
+        http_client = create_http_client()
+    return http_client
+
+# 🆕 모든 LLM 호출이 거치는 관문 (슬롯이 없으면 대기열에서 기다리고, 넘치면 429/503)
+upstream_gateway = UpstreamGateway(
+    max_in_flight=UPSTREAM_MAX_IN_FLIGHT,
+    max_queue=UPSTREAM_MAX_QUEUE,
+    queue_timeout=UPSTREAM_QUEUE_TIMEOUT,
+    max_retries=UPSTREAM_MAX_RETRIES,
+    retry_base=UPSTREAM_RETRY_BASE,
+    retry_max=UPSTREAM_RETRY_MAX,
+    breaker=CircuitBreaker(UPSTREAM_BREAKER_THRESHOLD, UPSTREAM_BREAKER_RESET),
+    max_queue_per_flow=UPSTREAM_MAX_QUEUE_PER_FLOW,
+)
+
+# 🆕 헤지 요청 설정 (느린 호출에 같은 요청을 한 번 더 보내 먼저 온 응답 사용)
+UPSTREAM_HEDGE_ENABLED = os.getenv("UPSTREAM_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+UPSTREAM_HEDGE_DELAY = os.getenv("UPSTREAM_HEDGE_DELAY")  # 초, 비우면 관측한 지연의 UPSTREAM_HEDGE_QUANTILE 사용
+UPSTREAM_HEDGE_QUANTILE = float(os.getenv("UPSTREAM_HEDGE_QUANTILE", "0.9"))
+UPSTREAM_HEDGE_BUDGET = float(os.getenv("UPSTREAM_HEDGE_BUDGET", "0.05"))  # 전체 호출 대비 헤지 비율 상한
+
+upstream_hedge = HedgePolicy(
+    float(UPSTREAM_HEDGE_DELAY) if UPSTREAM_HEDGE_DELAY else None,
+    UPSTREAM_HEDGE_QUANTILE,
+    UPSTREAM_HEDGE_BUDGET,
+)
+
+# 🆕 Prometheus 메트릭 (/metrics)
+metrics_registry = Registry()
+http_request_duration = metrics_registry.register(Histogram(
+    "http_request_duration_seconds", "라우트별 요청 처리 시간", ("method", "route")))
+http_requests_total = metrics_registry.register(Counter(
+    "http_requests_total", "라우트/상태 코드별 요청 수", ("method", "route", "status")))
+http_requests_in_flight = metrics_registry.register(Gauge(
+    "http_requests_in_flight", "라우트별 처리 중인 요청 수", ("method", "route")))
+upstream_request_duration = metrics_registry.register(Histogram(
+    "upstream_request_duration_seconds", "업스트림 호출 시간 (스트림은 끝까지)", ("mode",)))
+upstream_responses_total = metrics_registry.register(Counter(
+    "upstream_responses_total", "업스트림 응답 상태 코드/오류 종류별 수", ("mode", "status")))
+upstream_timeouts_total = metrics_registry.register(Counter(
+    "upstream_timeouts_total", "업스트림 타임아웃 수", ("mode",)))
+llm_tokens_total = metrics_registry.register(Counter(
+    "llm_tokens_total", "업스트림 usage 토큰 합계", ("endpoint", "category", "kind")))
+rate_limited_total = metrics_registry.register(Counter(
+    "rate_limited_total", "요청 제한으로 거절한 요청 수", ("scope",)))
+client_disconnects_total = metrics_registry.register(Counter(
+    "client_disconnects_cancelled_total", "응답 전에 클라이언트가 끊어 취소한 요청 수"))
+streams_aborted_total = metrics_registry.register(Counter(
+    "sse_streams_aborted_total", "done 이벤트까지 보내지 못하고 끝난 SSE 스트림 수 (연결 끊김/오류)", ("stream",)))
+similar_cache_lookups_total = metrics_registry.register(Counter(
+    "similar_cache_lookups_total", "유사 질문 캐시 조회 결과별 수", ("kind", "result")))
+similar_cache_similarity = metrics_registry.register(Histogram(
+    "similar_cache_similarity", "유사 질문 캐시에서 가장 비슷한 후보의 Jaccard 유사도", ("kind",),
+    buckets=(0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 1.0)))
+
+UsageLabels = Tuple[str, str]  # (endpoint, category)
+
+def record_usage(labels: UsageLabels, usage: Dict) -> None:
+    """업스트림이 알려준 usage 토큰을 엔드포인트/카테고리별로 누적"""
+    endpoint, category = labels
+    if category not in HABIT_CATALOG and category not in ("chat", "conversation"):
+        category = "other"  # 클라이언트가 보낸 임의 값으로 라벨이 늘지 않도록
+    for kind in ("prompt", "completion"):
+        tokens = usage.get(f"{kind}_tokens")
+        if tokens:
+            llm_tokens_total.inc(endpoint, category, kind, amount=tokens)
+
+@contextmanager
+def track_upstream(mode: str):
+    """업스트림 호출 하나의 시간과 결과(상태 코드, timeout 등) 기록"""
+    outcome = {"status": "error"}
+    start = time.perf_counter()
+    try:
+        yield outcome
+    except httpx.TimeoutException:
+        outcome["status"] = "timeout"
+        upstream_timeouts_total.inc(mode)
+        raise
+    except httpx.TransportError:
+        outcome["status"] = "transport_error"
+        raise
+    finally:
+        upstream_request_duration.observe(time.perf_counter() - start, mode)
+        upstream_responses_total.inc(mode, outcome["status"])
+
+async def call_upstream(messages: List[Dict], labels: UsageLabels = ("other", "other"), hedge: bool = False) -> Dict:
+    """부트캠프 API 호출 후 JSON 응답 반환 (일시적 오류는 게이트웨이가 재시도)
+
+    🆕 hedge=True이고 헤지가 켜져 있으면 헤지 지연이 지나도록 응답이 없을 때 한 번 더 호출합니다.
+    """
+    async def post() -> Dict:
+        start = time.perf_counter()
+        with track_upstream("json") as outcome:
+            response = await get_http_client().post(BOOTCAMP_API_URL, json=messages)
+            outcome["status"] = str(response.status_code)
+        response.raise_for_status()
+        upstream_hedge.observe(time.perf_counter() - start)
+        response_data = response.json()
+        record_usage(labels, response_data.get("usage") or {})
+        return response_data
+    
+    if hedge and UPSTREAM_HEDGE_ENABLED:
+        return await upstream_gateway.call_hedged(post, upstream_hedge)
+    return await upstream_gateway.call(post)
+
+async def stream_upstream(messages: List[Dict], labels: UsageLabels = ("other", "other")) -> AsyncIterator[Dict]:
+    """🆕 부트캠프 API 응답을 토큰 단위로 전달
+
+    {"delta": 텍스트} 조각들을 내보낸 뒤 마지막에 {"usage": ...}를 한 번 내보냅니다.
+    업스트림이 SSE를 지원하지 않고 일반 JSON을 돌려주면 전체 답변을 한 조각으로 전달합니다.
+    첫 조각을 내보내기 전의 일시적 오류만 재시도합니다 (이미 보낸 조각은 되돌릴 수 없음).
+    """
+    headers = {"Accept": "text/event-stream"}
+    async with upstream_gateway.admit():
+        attempt = 0
+        while True:
+            upstream_gateway.begin_attempt()
+            started = False
+            try:
+                with track_upstream("stream") as outcome:
+                    async with get_http_client().stream("POST", BOOTCAMP_API_URL, json=messages, headers=headers) as response:
+                        outcome["status"] = str(response.status_code)
+                        response.raise_for_status()
+                        
+                        if "text/event-stream" not in response.headers.get("content-type", ""):
+                            response_data = json.loads(await response.aread())
+                            upstream_gateway.record_result()
+                            record_usage(labels, response_data.get("usage") or {})
+                            started = True
+                            yield {"delta": response_data["choices"][0]["message"]["content"]}
+                            yield {"usage": response_data.get("usage", {})}
+                            return
+                        
+                        usage = {}
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[len("data:"):].strip()
+                            if data == "[DONE]":
+                                break
+                            
+                            chunk = json.loads(data)
+                            if chunk.get("usage"):
+                                usage = chunk["usage"]
+                            for choice in chunk.get("choices", []):
+                                content = (choice.get("delta") or {}).get("content")
+                                if content:
+                                    if not started:
+                                        upstream_gateway.record_result()
+                                        started = True
+                                    yield {"delta": content}
+                        
+                        if not started:
+                            upstream_gateway.record_result()
+                        record_usage(labels, usage)
+                        yield {"usage": usage}
+                        return
+            except (asyncio.CancelledError, GeneratorExit):
+                if not started:
+                    upstream_gateway.breaker.release_probe()
+                raise
+            except Exception as e:
+                upstream_gateway.record_result(e)
+                if started or not upstream_gateway.should_retry(attempt, e):
+                    raise
+                upstream_gateway.counters["retries"] += 1
+                await asyncio.sleep(upstream_gateway.backoff(attempt, e))
+                attempt += 1
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def sse_event(event: str, data: Dict) -> str:
+    """Server-Sent Events 형식의 이벤트 문자열 생성"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """앱 시작 시 공유 클라이언트를 만들고 종료 시 커넥션을 정리"""
+    global http_client, password_executor
+    http_client = create_http_client()
+    warmer = asyncio.create_task(run_recommendation_warmer()) if PREWARM_ENABLED else None
+    try:
+        yield
+    finally:
+        if warmer is not None:
+            warmer.cancel()
+        await http_client.aclose()
+        http_client = None
+        repo.close()
+        if password_executor is not None:
+            password_executor.shutdown(wait=False)
+            password_executor = None
 
 # FastAPI 애플리케이션 인스턴스 생성
-app = FastAPI(title="부트캠프 ChatGPT API 서버", version="1.0.0")
+app = FastAPI(title="부트캠프 ChatGPT API 서버", version="1.0.0", lifespan=lifespan)
+
+@app.exception_handler(UpstreamUnavailable)
+async def upstream_unavailable_handler(request: Request, exc: UpstreamUnavailable):
+    """🆕 업스트림 과부하/장애 시 Retry-After와 함께 빠르게 429/503 응답"""
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+# 🆕 라우트별 지연/요청 수/처리 중 요청 기록
+app.add_middleware(
+    MetricsMiddleware,
+    latency=http_request_duration,
+    requests=http_requests_total,
+    in_flight=http_requests_in_flight,
+)
+
+# 🆕 요청 제한 헤더 (핸들러가 request.state에 남긴 값을 응답에 추가)
+app.add_middleware(RateLimitHeadersMiddleware)
+
+# 🆕 응답 전에 클라이언트가 끊으면 핸들러와 업스트림 호출 취소 (가장 바깥 미들웨어, 메트릭에는 499로 기록)
+app.add_middleware(CancelOnDisconnectMiddleware, cancelled=client_disconnects_total)
+
+def upstream_error_event(e: Exception, prefix: str) -> str:
+    """🆕 스트리밍 도중 오류를 SSE error 이벤트로 변환 (과부하면 재시도 시간 포함)"""
+    if isinstance(e, UpstreamUnavailable):
+        return sse_event("error", {"detail": e.detail, "status": e.status_code, "retry_after": e.retry_after})
+    return sse_event("error", {"detail": f"{prefix}: {str(e)}"})
+
+# 🆕 사용자별 채팅 메모리 설정
+CHAT_MEMORY_MAX_MESSAGES = int(os.getenv("CHAT_MEMORY_MAX_MESSAGES", "100"))  # 사용자별 보관 메시지 수
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "3000"))  # 🆕 업스트림에 보내는 prompt 토큰 예산
+CHAT_CONTEXT_MAX_MESSAGES = int(os.getenv("CHAT_CONTEXT_MAX_MESSAGES", "60"))  # 예산과 별개로 보내는 최근 메시지 수 상한
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "20000"))
+CHAT_SUMMARY_BATCH = int(os.getenv("CHAT_SUMMARY_BATCH", "20"))  # 이만큼 밀려나면 백그라운드에서 요약
+CHAT_SUMMARY_MAX_CHARS = int(os.getenv("CHAT_SUMMARY_MAX_CHARS", "1500"))
+
+# 🆕 저장소 설정 (memory: 프로세스 메모리, sqlite: 디스크에 영구 저장, redis: 여러 워커가 공유)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "memory")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "atomic_habit.db")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")  # inprocess:// 는 테스트용 대용품
+REDIS_KEY_PREFIX = os.getenv("REDIS_KEY_PREFIX", "ah:")
+REDIS_TOKEN_CACHE_TTL = float(os.getenv("REDIS_TOKEN_CACHE_TTL", "2"))  # 워커별 토큰 조회 캐시 유지 시간(초)
+
+def create_repository() -> Repository:
+    """설정에 맞는 저장소 생성"""
+    if STORAGE_BACKEND == "sqlite":
+        return SQLiteRepository(SQLITE_PATH, chat_max_messages=CHAT_MEMORY_MAX_MESSAGES)
+    if STORAGE_BACKEND == "redis":
+        return RedisRepository(
+            create_redis_client(REDIS_URL),
+            chat_max_messages=CHAT_MEMORY_MAX_MESSAGES,
+            prefix=REDIS_KEY_PREFIX,
+            token_cache_ttl=REDIS_TOKEN_CACHE_TTL,
+        )
+    return MemoryRepository(chat_max_messages=CHAT_MEMORY_MAX_MESSAGES)
+
+# 🆕 저장소 (사용자, 토큰, 활동, 채팅 내역, 선택된 습관)
+repo = create_repository()
+
+# 🆕 활동 분석 인덱스 (사용자별 집계/연속 기록/시간순 목록, 최근 조회한 사용자만 보관)
+ANALYTICS_MAX_USERS = int(os.getenv("ANALYTICS_MAX_USERS", "10000"))
+# 새 활동은 조회할 때 저장소의 마지막 반영 위치 이후만 읽어 더함 (다른 워커가 기록한 활동 포함)
+activity_analytics = ActivityAnalytics(repo.scan_activities, repo.count_user_activities, ANALYTICS_MAX_USERS)
 
-# 부트캠프 API 엔드포인트 URL
-BOOTCAMP_API_URL = "https://dev.wenivops.co.kr/services/openai-api"
+# 🆕 세션 토큰 설정
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", str(7 * 24 * 3600)))  # 마지막 사용 후 유지 시간
+SESSION_REFRESH_INTERVAL = float(os.getenv("SESSION_REFRESH_INTERVAL", "300"))  # 만료 시각 갱신 최소 간격
+SESSION_MAX_PER_USER = int(os.getenv("SESSION_MAX_PER_USER", "5"))  # 사용자별 동시 세션 수
+SESSION_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "1"))
+SESSION_SWEEP_BATCH = int(os.getenv("SESSION_SWEEP_BATCH", "100"))  # 한 번에 정리할 최대 토큰 수
+next_token_sweep_at = 0.0
 
-# 🆕 메모리 저장소 (딕셔너리)
-users_db = {}  # {user_id: user_data}
-tokens_db = {}  # {token: user_id}
-user_activities = {}  # {user_id: [activities]}
-user_chat_history = {}  # {user_id: [chat_messages]} 🆕 채팅 내역 저장소
-user_selected_habits = {}  # {user_id: selected_habit_data} 🆕 선택된 습관 저장소
+# 🆕 백그라운드 작업 참조 (작업이 GC로 사라지지 않도록 보관)
+background_tasks = set()
+
+def run_in_background(coro) -> None:
+    """요청 처리와 분리된 백그라운드 작업 실행"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+# 🆕 습관 Q&A 응답 캐시 설정
+QA_CACHE_MAX_ENTRIES = int(os.getenv("QA_CACHE_MAX_ENTRIES", "1000"))
+QA_CACHE_TTL = float(os.getenv("QA_CACHE_TTL", "600"))
+
+class TTLCache:
+    """TTL 만료와 LRU 제거를 지원하는 메모리 캐시"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+
+        # 최근 사용한 항목을 뒤로 옮겨 LRU 순서 유지
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
+
+qa_cache = TTLCache(QA_CACHE_MAX_ENTRIES, QA_CACHE_TTL)
+
+def make_cache_key(messages: List[Dict]) -> str:
+    """완성된 메시지 목록으로 캐시 키 생성"""
+    payload = json.dumps(messages, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+# 🆕 유사 질문 캐시 설정 (표현만 다른 질문은 같은 범위의 이전 답변 재사용)
+SIMILAR_CACHE_ENABLED = os.getenv("SIMILAR_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+SIMILAR_CACHE_THRESHOLD = float(os.getenv("SIMILAR_CACHE_THRESHOLD", str(SIMILAR_DEFAULT_THRESHOLD)))  # 재사용할 최소 Jaccard 유사도
+SIMILAR_CACHE_MAX_ENTRIES = int(os.getenv("SIMILAR_CACHE_MAX_ENTRIES", "5000"))
+SIMILAR_CACHE_TTL = float(os.getenv("SIMILAR_CACHE_TTL", str(QA_CACHE_TTL)))
+
+similar_cache = SimilarQuestionCache(SIMILAR_CACHE_THRESHOLD, SIMILAR_CACHE_MAX_ENTRIES, SIMILAR_CACHE_TTL)
+
+def similar_scope(kind: str, category: Optional[str], context: List[Dict], habit: Optional[str] = None) -> str:
+    """카테고리·습관과 질문 앞의 메시지(시스템 프롬프트, 이전 대화)까지 같아야 같은 범위 (다른 습관/개인화된 답변이 섞이지 않음)"""
+    return f"{kind}|{category or ''}|{habit or ''}|{make_cache_key(context)[:16]}"
+
+def lookup_similar(kind: str, scope: str, question: str) -> Optional[Dict]:
+    """유사 질문 캐시 조회 후 결과와 유사도를 메트릭에 기록"""
+    response_data, similarity = similar_cache.lookup(scope, question)
+    if similarity is not None:
+        similar_cache_similarity.observe(similarity, kind)
+    similar_cache_lookups_total.inc(kind, "hit" if response_data is not None else "miss")
+    return response_data
+
+class SingleFlight:
+    """🆕 같은 키의 요청이 동시에 들어오면 진행 중인 하나의 호출 결과를 함께 기다림
+
+    공유 호출은 별도 Task로 실행하고 각 대기자는 shield로 기다리므로, 한 대기자가
+    취소되어도 다른 대기자의 호출은 계속됩니다. 마지막 대기자까지 취소되면 호출도 취소합니다.
+    예외는 모든 대기자에게 전달됩니다.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self.calls = 0  # 실제로 실행한 호출 수
+        self.shared = 0  # 진행 중인 호출에 합류한 요청 수
+        self.abandoned = 0  # 기다리는 요청이 모두 끊겨 취소한 호출 수
+
+    async def do(self, key: str, func):
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(func())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+            self.calls += 1
+        else:
+            self.shared += 1
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters.get(task) == 1 and not task.done():
+                task.cancel()
+                self.abandoned += 1
+            raise
+        finally:
+            remaining = self._waiters.get(task, 1) - 1
+            if remaining > 0:
+                self._waiters[task] = remaining
+            else:
+                self._waiters.pop(task, None)
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # 모든 대기자가 취소된 뒤 실패해도 "never retrieved" 경고가 나지 않도록 예외 확인
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict:
+        return {"in_flight": len(self._in_flight), "calls": self.calls, "shared": self.shared, "abandoned": self.abandoned}
+
+upstream_flights = SingleFlight()
+
+async def call_upstream_coalesced(messages: List[Dict], labels: UsageLabels = ("other", "other")) -> Dict:
+    """동일한 메시지 목록의 동시 업스트림 호출을 하나로 합침 (응답 dict는 공유되므로 수정 금지)"""
+    return await upstream_flights.do(make_cache_key(messages), lambda: call_upstream(messages, labels, hedge=True))
 
 # Security
 security = HTTPBearer()
@@ -61,9 +544,14 @@ class ChatHistoryRequest(BaseModel):
 class ChatHistoryResponse(BaseModel):
     success: bool
     response: str
-    chat_history: List[Dict]
+    messages: List[Dict]  # 이번 턴에 추가된 사용자/AI 메시지
+    cursor: int
     usage: Dict = {}
 
+# 🆕 채팅 내역 페이지 크기
+CHAT_HISTORY_DEFAULT_LIMIT = 50
+CHAT_HISTORY_MAX_LIMIT = 200
+
 # 기존 모델들
 class Message(BaseModel):
     role: str
@@ -75,6 +563,7 @@ class SimpleChatRequest(BaseModel):
 
 class ConversationRequest(BaseModel):
     messages: List[Message]
+    allow_similar: bool = True  # 🆕 false면 비슷한 질문의 이전 답변을 재사용하지 않음
 
 class ChatResponse(BaseModel):
     response: str
@@ -89,6 +578,7 @@ class QARequest(BaseModel):
     category: Optional[str] = None
     habitType: Optional[str] = None
     requestType: Optional[str] = "normal"
+    allowSimilar: bool = True  # 🆕 false면 비슷한 질문의 이전 답변을 재사용하지 않음
 
 class HabitResponse(BaseModel):
     success: bool
@@ -96,24 +586,136 @@ class HabitResponse(BaseModel):
     answer: str = ""
     usage: Dict = {}
 
+# 🆕 비밀번호 해시 설정 (작업량 파라미터는 해시 문자열에 함께 저장)
+PASSWORD_KDF = os.getenv("PASSWORD_KDF", "scrypt")  # scrypt 또는 pbkdf2_sha256
+SCRYPT_N = int(os.getenv("SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.getenv("SCRYPT_R", "8"))
+SCRYPT_P = int(os.getenv("SCRYPT_P", "1"))
+PBKDF2_ITERATIONS = int(os.getenv("PBKDF2_ITERATIONS", "600000"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))  # 해시 전용 스레드 수
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))  # 동시에 대기할 수 있는 해시 작업 수
+
+# 🆕 해시 계산은 이벤트 루프 밖의 전용 스레드 풀에서 실행 (hashlib은 계산 중 GIL을 놓음)
+password_executor: Optional[ThreadPoolExecutor] = None
+password_slots = asyncio.Semaphore(PASSWORD_HASH_MAX_PENDING)
+
 # 🆕 유틸리티 함수들
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode()
+
 def hash_password(password: str) -> str:
-    """비밀번호 해시화"""
-    return hashlib.sha256(password.encode()).hexdigest()
+    """비밀번호 해시화 (현재 설정된 KDF와 작업량 사용)"""
+    salt = secrets.token_bytes(16)
+    if PASSWORD_KDF == "pbkdf2_sha256":
+        digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, PBKDF2_ITERATIONS)
+        return f"pbkdf2_sha256${PBKDF2_ITERATIONS}${_b64(salt)}${_b64(digest)}"
+    
+    digest = hashlib.scrypt(
+        password.encode(), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P,
+        maxmem=256 * SCRYPT_N * SCRYPT_R * SCRYPT_P, dklen=32
+    )
+    return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(digest)}"
+
+def verify_password(password: str, stored: str) -> bool:
+    """저장된 해시와 비밀번호 비교 (상수 시간 비교)"""
+    try:
+        parts = stored.split("$")
+        if parts[0] == "scrypt":
+            n, r, p = int(parts[1]), int(parts[2]), int(parts[3])
+            expected = base64.b64decode(parts[5])
+            digest = hashlib.scrypt(
+                password.encode(), salt=base64.b64decode(parts[4]), n=n, r=r, p=p,
+                maxmem=256 * n * r * p, dklen=len(expected)
+            )
+        elif parts[0] == "pbkdf2_sha256":
+            expected = base64.b64decode(parts[3])
+            digest = hashlib.pbkdf2_hmac("sha256", password.encode(), base64.b64decode(parts[2]), int(parts[1]))
+        else:
+            # 이전 버전의 솔트 없는 SHA-256 해시
+            expected = stored.encode()
+            digest = hashlib.sha256(password.encode()).hexdigest().encode()
+    except (ValueError, IndexError):
+        return False
+    return hmac.compare_digest(digest, expected)
+
+def password_needs_rehash(stored: str) -> bool:
+    """저장된 해시가 현재 KDF 설정과 다르면 True (다음 로그인 때 재해시)"""
+    if PASSWORD_KDF == "pbkdf2_sha256":
+        return not stored.startswith(f"pbkdf2_sha256${PBKDF2_ITERATIONS}$")
+    return not stored.startswith(f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$")
+
+def get_password_executor() -> ThreadPoolExecutor:
+    """해시 전용 스레드 풀 반환 (없으면 생성)"""
+    global password_executor
+    if password_executor is None:
+        password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+    return password_executor
+
+async def run_password_job(func, *args):
+    """해시 작업을 전용 스레드 풀에서 실행 (대기 작업 수 제한)"""
+    async with password_slots:
+        return await asyncio.get_running_loop().run_in_executor(get_password_executor(), func, *args)
+
+# 존재하지 않는 이메일로 로그인해도 같은 시간이 걸리도록 비교에 쓰는 해시
+DUMMY_PASSWORD_HASH = hash_password(secrets.token_urlsafe(16))
+
+def normalize_email(email: str) -> str:
+    """이메일 인덱스 키로 사용할 정규화된 이메일 (앞뒤 공백 제거, 소문자)"""
+    return email.strip().lower()
 
 def generate_token() -> str:
     """토큰 생성"""
     return secrets.token_urlsafe(32)
 
+def issue_token(user_id: str) -> str:
+    """🆕 세션 토큰 발급 (사용자별 최대 개수를 넘으면 가장 오래된 세션부터 만료)"""
+    token = generate_token()
+    repo.add_token(token, user_id, time.time() + SESSION_TTL_SECONDS)
+    
+    user_tokens = repo.user_tokens(user_id)
+    for old_token in user_tokens[:max(0, len(user_tokens) - SESSION_MAX_PER_USER)]:
+        repo.delete_token(old_token)
+    
+    return token
+
+def sweep_expired_tokens(now: float) -> None:
+    """🆕 만료된 토큰을 만료 순서대로 조금씩 정리 (전체 스캔 없음)"""
+    global next_token_sweep_at
+    if now < next_token_sweep_at:
+        return
+    next_token_sweep_at = now + SESSION_SWEEP_INTERVAL
+    repo.purge_expired_tokens(now, SESSION_SWEEP_BATCH)
+
+def resolve_token(token: str) -> Optional[str]:
+    """🆕 토큰의 사용자 id 반환 (만료 확인 및 슬라이딩 갱신)"""
+    now = time.time()
+    sweep_expired_tokens(now)
+    
+    entry = repo.get_token(token)
+    if entry is None:
+        return None
+    
+    user_id, expires_at = entry
+    if expires_at <= now:
+        repo.delete_token(token)
+        return None
+    
+    # 사용할 때마다 만료 시각을 연장하되, 쓰기를 줄이기 위해 갱신 간격을 둠
+    if expires_at - now < SESSION_TTL_SECONDS - SESSION_REFRESH_INTERVAL:
+        repo.refresh_token(token, now + SESSION_TTL_SECONDS)
+    
+    return user_id
+
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """현재 사용자 확인"""
     token = credentials.credentials
-    user_id = tokens_db.get(token)
+    user_id = resolve_token(token)
+    user = repo.get_user(user_id) if user_id else None
     
-    if not user_id or user_id not in users_db:
+    if not user:
         raise HTTPException(status_code=401, detail="유효하지 않은 토큰입니다")
     
-    return users_db[user_id]
+    return user
 
 def optional_auth(authorization: Optional[str] = Header(None)):
     """선택적 인증 (토큰이 없어도 됨)"""
@@ -122,42 +724,95 @@ def optional_auth(authorization: Optional[str] = Header(None)):
     
     try:
         token = authorization.replace("Bearer ", "")
-        user_id = tokens_db.get(token)
-        return users_db.get(user_id) if user_id else None
+        user_id = resolve_token(token)
+        return repo.get_user(user_id) if user_id else None
     except:
         return None
 
+# 🆕 LLM 엔드포인트 요청 제한 (토큰 버킷: 분당 RATE개씩 채워지고 최대 BURST개까지 연속 허용)
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_USER_PER_MINUTE = float(os.getenv("RATE_LIMIT_USER_PER_MINUTE", "20"))
+RATE_LIMIT_USER_BURST = int(os.getenv("RATE_LIMIT_USER_BURST", "10"))
+RATE_LIMIT_IP_PER_MINUTE = float(os.getenv("RATE_LIMIT_IP_PER_MINUTE", "10"))  # 로그인하지 않은 요청
+RATE_LIMIT_IP_BURST = int(os.getenv("RATE_LIMIT_IP_BURST", "5"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "50000"))  # 종류별로 기억하는 사용자/IP 수
+TRUST_PROXY_HEADERS = os.getenv("TRUST_PROXY_HEADERS", "false").lower() in ("1", "true", "yes")  # X-Forwarded-For 사용
+ALTERNATIVE_REQUEST_COST = 2  # "다른 추천 받기"는 캐시를 거치지 않으므로 두 배로 계산
+
+user_rate_limiter = TokenBucketLimiter(RATE_LIMIT_USER_PER_MINUTE / 60, RATE_LIMIT_USER_BURST, RATE_LIMIT_MAX_KEYS)
+ip_rate_limiter = TokenBucketLimiter(RATE_LIMIT_IP_PER_MINUTE / 60, RATE_LIMIT_IP_BURST, RATE_LIMIT_MAX_KEYS)
+
+def client_ip(http_request: Request) -> str:
+    if TRUST_PROXY_HEADERS:
+        forwarded = http_request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return http_request.client.host if http_request.client else "unknown"
+
+def enforce_rate_limit(http_request: Request, current_user: Optional[dict], cost: float = 1) -> None:
+    """로그인 사용자는 사용자별, 아니면 IP별 버킷에서 cost만큼 차감 (부족하면 429)
+
+    버킷 크기(burst)보다 비싼 요청은 기다려도 통과할 수 없으므로 400으로 거절합니다.
+    이 요청의 업스트림 호출이 사용자/IP 단위로 공정하게 슬롯을 나눠 받도록 흐름 키도 설정합니다.
+    """
+    if current_user:
+        scope, key, limiter = "user", f"user:{current_user['id']}", user_rate_limiter
+    else:
+        scope, key, limiter = "ip", f"ip:{client_ip(http_request)}", ip_rate_limiter
+    upstream_flow.set((key, 1.0))
+    if not RATE_LIMIT_ENABLED:
+        return
+    
+    if cost > limiter.burst:
+        raise HTTPException(
+            status_code=400,
+            detail=f"한 번에 요청할 수 있는 양({limiter.burst})을 넘었습니다. 나눠서 요청해주세요."
+        )
+    decision = limiter.acquire(key, cost)
+    http_request.state.rate_limit_headers = decision.headers()
+    if not decision.allowed:
+        rate_limited_total.inc(scope)
+        raise HTTPException(
+            status_code=429,
+            detail="요청이 너무 많습니다. 잠시 후 다시 시도해주세요.",
+            headers=decision.headers()
+        )
+
 # 🆕 인증 API 엔드포인트들
 @app.post("/api/auth/register")
 async def register_user(user_data: UserRegister):
-    """회원가입"""
+    """회원가입 (이미 등록된 이메일은 어느 단계에서 확인되든 409)"""
     
     # 이메일 중복 확인
-    for user in users_db.values():
-        if user["email"] == user_data.email:
-            raise HTTPException(status_code=400, detail="이미 존재하는 이메일입니다")
+    email = normalize_email(user_data.email)
+    if repo.get_user_by_email(email):
+        raise HTTPException(status_code=409, detail="이미 존재하는 이메일입니다")
     
-    # 사용자 생성
-    user_id = f"user_{int(time.time())}_{len(users_db)}"
-    hashed_password = hash_password(user_data.password)
+    hashed_password = await run_password_job(hash_password, user_data.password)
     
+    # 해시를 계산하는 동안 같은 이메일이 가입했을 수 있으므로 다시 확인
+    if repo.get_user_by_email(email):
+        raise HTTPException(status_code=409, detail="이미 존재하는 이메일입니다")
+    
+    # 사용자 생성 (id는 저장소가 워커 간에도 겹치지 않게 발급)
+    user_id = repo.new_user_id()
     user = {
         "id": user_id,
         "name": user_data.name,
-        "email": user_data.email,
+        "email": email,
         "password": hashed_password,
         "joinDate": datetime.now().strftime("%Y-%m-%d"),
         "createdAt": datetime.now().isoformat()
     }
     
-    users_db[user_id] = user
-    user_activities[user_id] = []
-    user_chat_history[user_id] = []  # 🆕 채팅 내역 초기화
-    user_selected_habits[user_id] = {}  # 🆕 선택된 습관 초기화
+    # 위의 확인 이후 다른 워커가 같은 이메일을 먼저 등록했으면 저장소가 거절
+    try:
+        repo.add_user(user)
+    except EmailTaken:
+        raise HTTPException(status_code=409, detail="이미 존재하는 이메일입니다")
     
     # 토큰 생성
-    token = generate_token()
-    tokens_db[token] = user_id
+    token = issue_token(user_id)
     
     # 비밀번호 제외하고 반환
     user_response = {k: v for k, v in user.items() if k != "password"}
@@ -173,23 +828,21 @@ async def register_user(user_data: UserRegister):
 async def login_user(login_data: UserLogin):
     """로그인"""
     
-    hashed_password = hash_password(login_data.password)
-    
-    # 사용자 찾기
-    user = None
-    user_id = None
-    for uid, user_data in users_db.items():
-        if user_data["email"] == login_data.email and user_data["password"] == hashed_password:
-            user = user_data
-            user_id = uid
-            break
+    # 사용자 찾기 (이메일 인덱스 조회 후 비밀번호 확인)
+    user = repo.get_user_by_email(normalize_email(login_data.email))
+    stored_hash = user["password"] if user else DUMMY_PASSWORD_HASH
+    verified = await run_password_job(verify_password, login_data.password, stored_hash)
     
-    if not user:
+    if not user or not verified:
         raise HTTPException(status_code=401, detail="이메일 또는 비밀번호가 올바르지 않습니다")
     
+    # 예전 방식이나 작업량으로 저장된 해시는 현재 설정으로 교체
+    if password_needs_rehash(stored_hash):
+        new_hash = await run_password_job(hash_password, login_data.password)
+        user = repo.update_user(user["id"], {"password": new_hash})
+    
     # 토큰 생성
-    token = generate_token()
-    tokens_db[token] = user_id
+    token = issue_token(user["id"])
     
     # 비밀번호 제외하고 반환
     user_response = {k: v for k, v in user.items() if k != "password"}
@@ -208,8 +861,7 @@ async def logout_user(current_user: dict = Depends(get_current_user), credential
     token = credentials.credentials
     
     # 토큰 삭제
-    if token in tokens_db:
-        del tokens_db[token]
+    repo.delete_token(token)
     
     return {
         "success": True,
@@ -217,33 +869,7 @@ async def logout_user(current_user: dict = Depends(get_current_user), credential
     }
 
 # 🆕 채팅 관련 API
-@app.post("/api/chat/send")
-async def send_chat_message(request: ChatHistoryRequest, current_user: dict = Depends(get_current_user)):
-    """채팅 메시지 전송 및 내역 저장"""
-    
-    user_id = current_user["id"]
-    
-    # 사용자별 채팅 내역 초기화 (필요시)
-    if user_id not in user_chat_history:
-        user_chat_history[user_id] = []
-    
-    # 선택된 습관 저장 (있는 경우)
-    if request.selected_habit:
-        user_selected_habits[user_id] = request.selected_habit
-    
-    # 사용자 메시지 저장
-    user_message = {
-        "role": "user",
-        "content": request.message,
-        "timestamp": datetime.now().isoformat()
-    }
-    user_chat_history[user_id].append(user_message)
-    
-    try:
-        # 시스템 메시지 구성
-        system_message = {
-            "role": "system",
-            "content": """당신은 『아주 작은 습관(Atomic Habits)』 전문가이자 친근한 습관 코치입니다. 
+CHAT_SYSTEM_PROMPT = """당신은 『아주 작은 습관(Atomic Habits)』 전문가이자 친근한 습관 코치입니다. 
 
 다음 원칙들을 기반으로 조언해주세요:
 1. 습관은 작게 시작해야 합니다 (2분 규칙)
@@ -253,73 +879,217 @@ async def send_chat_message(request: ChatHistoryRequest, current_user: dict = De
 5. 완벽하지 않아도 계속하는 것이 중요합니다
 
 사용자와 자연스럽고 친근한 대화를 나누면서 실용적이고 즉시 실행 가능한 조언을 해주세요. 답변은 따뜻하고 격려하는 톤으로 해주세요."""
-        }
+
+def new_chat_message(role: str, content: str) -> ChatRecord:
+    """id가 부여된 채팅 메시지 생성"""
+    return ChatRecord(repo.next_message_id(), role, content, now_timestamp())
+
+# 🆕 메시지 내용별 토큰 수 캐시와 컨텍스트 크기 통계
+token_counter = TokenCounter(TOKEN_CACHE_MAX_ENTRIES)
+chat_context_stats = {"turns": 0, "messages_sent": 0, "estimated_prompt_tokens": 0, "actual_prompt_tokens": 0}
+
+def start_chat_turn(user_id: str, request: ChatHistoryRequest) -> tuple:
+    """(저장 전 사용자 메시지, 업스트림에 보낼 메시지 목록, 추정 prompt 토큰) 반환
+
+    🆕 사용자 메시지는 답변이 나온 뒤 finish_chat_turn에서 답변과 함께 저장하므로,
+    업스트림 오류나 클라이언트 연결 종료로 취소된 턴은 채팅 내역에 남지 않습니다.
+    """
+    
+    # 선택된 습관 저장 (있는 경우)
+    if request.selected_habit:
+        repo.set_selected_habit(user_id, request.selected_habit)
+    
+    user_message = ChatRecord(None, "user", request.message, now_timestamp())
+    memory = repo.chat_memory(user_id)
+    
+    # 시스템 메시지 구성
+    system_message = {"role": "system", "content": CHAT_SYSTEM_PROMPT}
+    
+    # 선택된 습관 정보 추가 (있는 경우)
+    habit_info = repo.get_selected_habit(user_id)
+    if habit_info:
+        system_message["content"] += f"\n\n현재 사용자가 관심 있는 습관: {habit_info.get('title', '')} - {habit_info.get('description', '')}"
+    
+    # 오래된 대화 요약 추가 (있는 경우)
+    if memory.summary:
+        system_message["content"] += f"\n\n이전 대화 요약: {memory.summary}"
+    
+    # 🆕 토큰 예산 안에 들어가는 만큼 최근 채팅 내역 포함 (업스트림에는 role/content만 전달)
+    messages, prompt_tokens = pack_context(
+        token_counter, system_message, memory.recent(CHAT_CONTEXT_MAX_MESSAGES - 1) + [user_message], CHAT_CONTEXT_TOKEN_BUDGET
+    )
+    return user_message, messages, prompt_tokens
+
+def record_prompt_usage(messages: List[Dict], prompt_tokens: int, usage: Dict) -> None:
+    """🆕 추정한 prompt 토큰과 업스트림이 알려준 실제 사용량을 누적 (/api/status의 chat_context로 확인)"""
+    actual = usage.get("prompt_tokens")
+    chat_context_stats["turns"] += 1
+    chat_context_stats["messages_sent"] += len(messages)
+    chat_context_stats["estimated_prompt_tokens"] += prompt_tokens
+    if actual is not None:
+        chat_context_stats["actual_prompt_tokens"] += actual
+
+def finish_chat_turn(user_id: str, user_message: ChatRecord, ai_response: str) -> ChatRecord:
+    """사용자 메시지(id 부여)와 AI 응답, 채팅 활동 기록 저장 후 AI 메시지 반환"""
+    question = user_message.content
+    
+    # 사용자 메시지와 AI 응답을 연속된 id로 저장
+    user_message.id = repo.next_message_id()
+    repo.append_chat_message(user_id, user_message)
+    ai_message = new_chat_message("assistant", ai_response)
+    repo.append_chat_message(user_id, ai_message)
+    
+    # 밀려난 메시지가 충분히 쌓이면 요청 경로 밖에서 요약
+    memory = repo.chat_memory(user_id)
+    if memory.needs_summary(CHAT_SUMMARY_BATCH) and memory.start_summary():
+        run_in_background(summarize_chat_memory(user_id, memory))
+    
+    # 활동 기록
+    now = now_timestamp()
+    activity_record = ActivityRecord(
+        "chat_conversation", now, "chat", "habit_coaching",
+        question=question[:100] + "..." if len(question) > 100 else question,
+        recorded_at=now,
+    )
+    repo.add_activity(user_id, activity_record)
+    
+    return ai_message
+
+async def summarize_chat_memory(user_id: str, memory: ChatMemory) -> None:
+    """🆕 ring buffer에서 밀려난 대화를 기존 요약과 합쳐 새 요약 생성"""
+    batch = memory.pending[:]
+    transcript = "\n".join(
+        f"{'사용자' if message.role == 'user' else '코치'}: {message.content}"
+        for message in batch
+    )
+    messages = [
+        {
+            "role": "system",
+            "content": f"사용자와 습관 코치의 대화를 요약하는 도우미입니다. 기존 요약과 새 대화를 합쳐 사용자의 목표, 시도한 습관, 어려움, 코치의 핵심 조언이 드러나도록 {CHAT_SUMMARY_MAX_CHARS}자 이내의 한국어로 요약해주세요."
+        },
+        {"role": "user", "content": f"[기존 요약]\n{memory.summary or '없음'}\n\n[새 대화]\n{transcript}"}
+    ]
+    
+    try:
+        response_data = await call_upstream(messages, ("chat_summary", "chat"))
+        repo.save_chat_summary(user_id, response_data["choices"][0]["message"]["content"][:CHAT_SUMMARY_MAX_CHARS])
+        # 요약하는 동안 새로 밀려난 메시지는 다음 요약을 위해 남겨둠
+        repo.trim_chat_pending(user_id, [message.id for message in batch])
+    except Exception as e:
+        print(f"채팅 요약 중 오류: {e}")
+    finally:
+        memory.summarizing = False
+
+@app.post("/api/chat/send", response_model=ChatHistoryResponse)
+async def send_chat_message(request: ChatHistoryRequest, http_request: Request, current_user: dict = Depends(get_current_user)):
+    """채팅 메시지 전송 및 내역 저장"""
+    
+    user_id = current_user["id"]
+    enforce_rate_limit(http_request, current_user)
+    upstream_gateway.check_admission()  # 🆕 과부하면 메시지를 저장하기 전에 거절
+    user_message, messages, prompt_tokens = start_chat_turn(user_id, request)
+    
+    try:
+        # OpenAI API 호출 (공유 클라이언트 사용)
+        response_data = await call_upstream(messages, ("chat", "chat"), hedge=True)
+        ai_response = response_data["choices"][0]["message"]["content"]
         
-        # 선택된 습관 정보 추가 (있는 경우)
-        if user_id in user_selected_habits and user_selected_habits[user_id]:
-            habit_info = user_selected_habits[user_id]
-            system_message["content"] += f"\n\n현재 사용자가 관심 있는 습관: {habit_info.get('title', '')} - {habit_info.get('description', '')}"
+        ai_message = finish_chat_turn(user_id, user_message, ai_response)
+        record_prompt_usage(messages, prompt_tokens, response_data.get("usage", {}))
         
-        # 최근 채팅 내역 포함 (최대 20개)
-        recent_messages = user_chat_history[user_id][-20:]
-        messages = [system_message] + recent_messages
+        # 전체 내역 대신 이번 턴의 메시지와 최신 커서만 반환
+        return {
+            "success": True,
+            "response": ai_response,
+            "messages": [user_message.to_dict(), ai_message.to_dict()],
+            "cursor": ai_message.id,
+            "usage": response_data["usage"]
+        }
         
-        # OpenAI API 호출
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                BOOTCAMP_API_URL,
-                json=messages,
-                timeout=30.0
-            )
-            response.raise_for_status()
-            response_data = response.json()
-            
-            ai_response = response_data["choices"][0]["message"]["content"]
-            
-            # AI 응답 저장
-            ai_message = {
-                "role": "assistant",
-                "content": ai_response,
-                "timestamp": datetime.now().isoformat()
-            }
-            user_chat_history[user_id].append(ai_message)
-            
-            # 활동 기록
-            if user_id not in user_activities:
-                user_activities[user_id] = []
-            
-            activity_record = {
-                "activity": "chat_conversation",
-                "timestamp": datetime.now().isoformat(),
-                "category": "chat",
-                "habit": "habit_coaching",
-                "question": request.message[:100] + "..." if len(request.message) > 100 else request.message,
-                "recordedAt": datetime.now().isoformat()
-            }
-            user_activities[user_id].append(activity_record)
-            
-            return {
-                "success": True,
-                "response": ai_response,
-                "chat_history": user_chat_history[user_id],
-                "usage": response_data["usage"]
-            }
-            
+    except UpstreamUnavailable:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"채팅 처리 중 오류: {str(e)}")
 
+@app.post("/api/chat/stream")
+async def stream_chat_message(request: ChatHistoryRequest, http_request: Request, current_user: dict = Depends(get_current_user)):
+    """🆕 채팅 메시지 스트리밍 전송 (Server-Sent Events)"""
+    
+    user_id = current_user["id"]
+    enforce_rate_limit(http_request, current_user)
+    upstream_gateway.check_admission()
+    user_message, messages, prompt_tokens = start_chat_turn(user_id, request)
+    
+    async def event_stream():
+        chunks = []
+        usage = {}
+        completed = False
+        try:
+            async for chunk in stream_upstream(messages, ("chat_stream", "chat")):
+                if "delta" in chunk:
+                    chunks.append(chunk["delta"])
+                    yield sse_event("delta", {"content": chunk["delta"]})
+                else:
+                    usage = chunk["usage"]
+            
+            # 스트림이 끝난 뒤에만 응답과 활동을 저장
+            ai_response = "".join(chunks)
+            ai_message = finish_chat_turn(user_id, user_message, ai_response)
+            record_prompt_usage(messages, prompt_tokens, usage)
+            completed = True
+            yield sse_event("done", {
+                "response": ai_response,
+                "messages": [user_message.to_dict(), ai_message.to_dict()],
+                "cursor": ai_message.id,
+                "usage": usage
+            })
+        except Exception as e:
+            yield upstream_error_event(e, "채팅 처리 중 오류")
+        finally:
+            if not completed:
+                streams_aborted_total.inc("chat")
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
 @app.get("/api/chat/history")
-async def get_chat_history(current_user: dict = Depends(get_current_user)):
-    """사용자 채팅 내역 조회"""
+async def get_chat_history(
+    before: Optional[int] = None,
+    after: Optional[int] = None,
+    limit: int = CHAT_HISTORY_DEFAULT_LIMIT,
+    current_user: dict = Depends(get_current_user)
+):
+    """사용자 채팅 내역 조회 (커서 기반 페이지네이션)
+
+    - after: 해당 id 이후의 메시지를 오래된 순으로 최대 limit개
+    - before: 해당 id 이전의 메시지 중 최근 limit개
+    - 둘 다 없으면 가장 최근 limit개
+    """
     
     user_id = current_user["id"]
-    chat_history = user_chat_history.get(user_id, [])
-    selected_habit = user_selected_habits.get(user_id, {})
+    chat_history = list(repo.chat_memory(user_id).messages)
+    selected_habit = repo.get_selected_habit(user_id)
+    limit = max(1, min(limit, CHAT_HISTORY_MAX_LIMIT))
+    
+    # 메시지 id는 단조 증가하므로 이진 탐색으로 커서 위치를 찾음
+    if after is not None:
+        start = bisect.bisect_right(chat_history, after, key=lambda message: message.id)
+        page = chat_history[start:start + limit]
+        has_more = start + limit < len(chat_history)
+    else:
+        end = len(chat_history)
+        if before is not None:
+            end = bisect.bisect_left(chat_history, before, key=lambda message: message.id)
+        start = max(0, end - limit)
+        page = chat_history[start:end]
+        has_more = start > 0
     
     return {
         "success": True,
-        "chat_history": chat_history,
+        "chat_history": [message.to_dict() for message in page],
         "selected_habit": selected_habit,
+        "cursor": page[-1].id if page else after,  # 다음 after 요청에 사용
+        "first_id": page[0].id if page else None,  # 다음 before 요청에 사용
+        "has_more": has_more,
         "total_messages": len(chat_history)
     }
 
@@ -328,8 +1098,8 @@ async def clear_chat_history(current_user: dict = Depends(get_current_user)):
     """채팅 내역 초기화"""
     
     user_id = current_user["id"]
-    user_chat_history[user_id] = []
-    user_selected_habits[user_id] = {}
+    repo.clear_chat(user_id)
+    repo.set_selected_habit(user_id, {})
     
     return {
         "success": True,
@@ -341,20 +1111,12 @@ async def select_habit(habit_data: dict, current_user: dict = Depends(get_curren
     """습관 선택 저장"""
     
     user_id = current_user["id"]
-    user_selected_habits[user_id] = habit_data
+    repo.set_selected_habit(user_id, habit_data)
     
     # 활동 기록
-    if user_id not in user_activities:
-        user_activities[user_id] = []
-    
-    activity_record = {
-        "activity": "habit_selected",
-        "timestamp": datetime.now().isoformat(),
-        "category": habit_data.get("category", ""),
-        "habit": habit_data.get("title", ""),
-        "recordedAt": datetime.now().isoformat()
-    }
-    user_activities[user_id].append(activity_record)
+    now = now_timestamp()
+    activity_record = ActivityRecord("habit_selected", now, habit_data.get("category", ""), habit_data.get("title", ""), recorded_at=now)
+    repo.add_activity(user_id, activity_record)
     
     return {
         "success": True,
@@ -375,25 +1137,30 @@ async def get_user_profile(current_user: dict = Depends(get_current_user)):
 
 @app.put("/api/user/profile")
 async def update_user_profile(profile_data: UserProfile, current_user: dict = Depends(get_current_user)):
-    """사용자 프로필 업데이트"""
+    """사용자 프로필 업데이트 (다른 사용자가 쓰는 이메일이면 409)"""
     
     user_id = current_user["id"]
     
     # 이메일 중복 확인 (다른 사용자가 사용 중인지)
-    if profile_data.email:
-        for uid, user in users_db.items():
-            if uid != user_id and user["email"] == profile_data.email:
-                raise HTTPException(status_code=400, detail="이미 사용 중인 이메일입니다")
+    new_email = normalize_email(profile_data.email) if profile_data.email else None
+    if new_email:
+        owner = repo.get_user_by_email(new_email)
+        if owner is not None and owner["id"] != user_id:
+            raise HTTPException(status_code=409, detail="이미 사용 중인 이메일입니다")
     
-    # 프로필 업데이트
+    # 프로필 업데이트 (이메일 인덱스는 저장소가 함께 갱신)
+    changes = {"updatedAt": datetime.now().isoformat()}
     if profile_data.name:
-        users_db[user_id]["name"] = profile_data.name
-    if profile_data.email:
-        users_db[user_id]["email"] = profile_data.email
+        changes["name"] = profile_data.name
+    if new_email:
+        changes["email"] = new_email
     
-    users_db[user_id]["updatedAt"] = datetime.now().isoformat()
+    try:
+        user = repo.update_user(user_id, changes)
+    except EmailTaken:
+        raise HTTPException(status_code=409, detail="이미 사용 중인 이메일입니다")
     
-    user_response = {k: v for k, v in users_db[user_id].items() if k != "password"}
+    user_response = {k: v for k, v in user.items() if k != "password"}
     
     return {
         "success": True,
@@ -407,66 +1174,114 @@ async def log_user_activity(activity: ActivityLog, current_user: dict = Depends(
     
     user_id = current_user["id"]
     
-    if user_id not in user_activities:
-        user_activities[user_id] = []
+    activity_record = ActivityRecord(
+        activity.activity, encode_timestamp(activity.timestamp), activity.category, activity.habit, recorded_at=now_timestamp()
+    )
     
-    activity_record = {
-        "activity": activity.activity,
-        "timestamp": activity.timestamp,
-        "category": activity.category,
-        "habit": activity.habit,
-        "recordedAt": datetime.now().isoformat()
-    }
-    
-    user_activities[user_id].append(activity_record)
+    repo.add_activity(user_id, activity_record)
     
     return {
         "success": True,
         "message": "활동이 기록되었습니다",
-        "activity": activity_record
+        "activity": activity_record.to_dict()
     }
 
+# 🆕 활동 내역 페이지 크기
+ACTIVITIES_MAX_LIMIT = 200
+
+def parse_activity_cursor(cursor: str) -> Tuple[int, int]:
+    """"순번:시각 키" 형식의 활동 커서 해석 (시각 자리가 ISO 문자열인 이전 형식도 허용)"""
+    seq, _, timestamp = cursor.partition(":")
+    try:
+        key = int(timestamp) if timestamp.lstrip("-").isdigit() else timestamp_key(timestamp)
+        if key is None:
+            raise ValueError(timestamp)
+        return key, int(seq)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="잘못된 cursor입니다")
+
+def parse_time_bound(name: str, value: Optional[str]) -> Optional[int]:
+    """since/until ISO 시각을 활동 인덱스의 시각 키로 변환"""
+    if value is None:
+        return None
+    key = timestamp_key(value)
+    if key is None:
+        raise HTTPException(status_code=400, detail=f"{name}는 ISO 8601 시각이어야 합니다")
+    return key
+
 @app.get("/api/user/activities")
-async def get_user_activities(current_user: dict = Depends(get_current_user)):
-    """사용자 활동 내역 조회"""
+async def get_user_activities(
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """사용자 활동 내역 조회
+
+    🆕 since/until/limit/cursor 중 하나라도 주면 timestamp [since, until) 범위를 최신순으로
+    limit개씩 반환하고, 다음 페이지는 next_cursor로 요청합니다. 아무것도 없으면 전체 목록(저장 순서).
+    """
     
     user_id = current_user["id"]
-    activities = user_activities.get(user_id, [])
+    if since is None and until is None and limit is None and cursor is None:
+        activities = [record.to_dict() for record in repo.get_activities(user_id)]
+        return {
+            "success": True,
+            "activities": activities,
+            "total": len(activities)
+        }
+    
+    limit = max(1, min(limit or CHAT_HISTORY_DEFAULT_LIMIT, ACTIVITIES_MAX_LIMIT))
+    bounds = parse_time_bound("since", since), parse_time_bound("until", until)
+    stats = activity_analytics.get(user_id)
+    activities, next_key = stats.page(*bounds, parse_activity_cursor(cursor) if cursor else None, limit)
     
     return {
         "success": True,
-        "activities": activities,
-        "total": len(activities)
+        "activities": [record.to_dict() for record in activities],
+        "total": stats.seen,
+        "next_cursor": f"{next_key[1]}:{next_key[0]}" if next_key else None
     }
 
+@app.get("/api/user/stats")
+async def get_user_stats(days: int = 30, current_user: dict = Depends(get_current_user)):
+    """🆕 활동 통계: 최근 days일 일별 개수, 카테고리/습관/활동 종류별 개수, 현재/최장 연속 기록"""
+    days = max(1, min(days, 366))
+    stats = activity_analytics.get(current_user["id"])
+    return {"success": True, **stats.summary(datetime.now().date(), days)}
+
 @app.post("/chat/conversation", response_model=ChatResponse)
-async def conversation_chat(request: ConversationRequest):
+async def conversation_chat(request: ConversationRequest, http_request: Request, current_user: Optional[dict] = Depends(optional_auth)):
     """대화 맥락 유지 채팅"""
+    enforce_rate_limit(http_request, current_user)
     messages = [{"role": msg.role, "content": msg.content} for msg in request.messages]
 
     if not any(msg["role"] == "system" for msg in messages):
         messages.insert(0, {"role": "system", "content": "You are a helpful assistant."})
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(BOOTCAMP_API_URL, json=messages, timeout=30.0)
-            response.raise_for_status()
-            response_data = response.json()
+    # 🆕 마지막 사용자 질문은 이전 대화가 같은 범위에서만 유사 질문 캐시로 찾음
+    use_similar = SIMILAR_CACHE_ENABLED and request.allow_similar and messages[-1]["role"] == "user"
+    scope = similar_scope("conversation", None, messages[:-1]) if use_similar else None
 
-            return ChatResponse(
-                response=response_data["choices"][0]["message"]["content"],
-                usage=response_data["usage"]
-            )
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
+    try:
+        response_data = lookup_similar("conversation", scope, messages[-1]["content"]) if use_similar else None
+        if response_data is None:
+            response_data = await call_upstream_coalesced(messages, ("conversation", "conversation"))
+            if use_similar and response_data["choices"]:
+                similar_cache.store(scope, messages[-1]["content"], response_data)
+
+        return ChatResponse(
+            response=response_data["choices"][0]["message"]["content"],
+            usage=response_data["usage"]
+        )
+    except UpstreamUnavailable:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 # 🆕 습관 관련 API (인증 선택적)
-@app.post("/api/habits/qa")
-async def habit_qa(request: QARequest, current_user: Optional[dict] = Depends(optional_auth)):
-    """습관 관련 Q&A"""
-    
-    # 사용자별 맞춤 시스템 메시지
-    base_system_message = """
+QA_SYSTEM_PROMPT = """
     당신은 『아주 작은 습관(Atomic Habits)』 책의 내용을 바탕으로 조언하는 습관 코치입니다. 
     다음 원칙들을 기반으로 답변해주세요:
     
@@ -478,125 +1293,605 @@ async def habit_qa(request: QARequest, current_user: Optional[dict] = Depends(op
     
     실용적이고 즉시 실행 가능한 조언을 해주세요.
     """
+
+def build_qa_messages(request: QARequest, current_user: Optional[dict]) -> List[Dict]:
+    """Q&A 요청에 맞는 메시지 목록 구성"""
     
     # 요청 타입에 따른 메시지 조정
     if request.requestType == "alternative":
-        system_message = base_system_message + "\n\n이번에는 이전과 다른 창의적이고 새로운 방법들을 제안해주세요."
+        system_message = QA_SYSTEM_PROMPT + "\n\n이번에는 이전과 다른 창의적이고 새로운 방법들을 제안해주세요."
     else:
-        system_message = base_system_message
+        system_message = QA_SYSTEM_PROMPT
     
     # 사용자가 로그인한 경우 개인화
-    user_context = ""
     if current_user:
         user_context = f"\n\n[사용자 정보: {current_user['name']}님을 위한 맞춤 조언]"
         system_message += user_context
     
-    messages = [
+    return [
         {"role": "system", "content": system_message},
         {"role": "user", "content": request.question}
     ]
 
-    async with httpx.AsyncClient() as client:
+def qa_activity_record(request: QARequest) -> ActivityRecord:
+    now = now_timestamp()
+    return ActivityRecord(
+        "habit_qa_request", now, request.category, request.habitType,
+        question=request.question[:100] + "..." if len(request.question) > 100 else request.question,
+        recorded_at=now,
+    )
+
+def log_qa_activity(request: QARequest, current_user: Optional[dict]) -> None:
+    """Q&A 활동 기록 (로그인한 경우)"""
+    if not current_user:
+        return
+    
+    try:
+        repo.add_activity(current_user["id"], qa_activity_record(request))
+    except Exception as log_error:
+        print(f"활동 기록 중 오류: {log_error}")
+
+def log_qa_activities(requests: List[QARequest], current_user: Optional[dict]) -> None:
+    """🆕 배치 Q&A 활동을 한 번에 기록 (로그인한 경우)"""
+    if not current_user or not requests:
+        return
+    
+    try:
+        repo.add_activities(current_user["id"], [qa_activity_record(request) for request in requests])
+    except Exception as log_error:
+        print(f"활동 기록 중 오류: {log_error}")
+
+# 🆕 습관 카드 카탈로그 (프론트엔드 cardData와 같은 카테고리/카드/프롬프트)
+HABIT_CATALOG = {
+    "health": [
+        ("아침 운동", "매일 아침 5-10분 간단한 운동 루틴"),
+        ("건강한 식단", "건강한 식단 관리와 영양소 섭취"),
+        ("수면 관리", "숙면을 위한 수면 패턴과 환경 조성"),
+        ("물 마시기", "적절한 수분 섭취와 물 마시는 습관"),
+        ("스트레칭", "일상 속 간단한 스트레칭 루틴"),
+        ("산책하기", "규칙적인 산책과 걷기 운동"),
+    ],
+    "productivity": [
+        ("투두리스트", "효과적인 할 일 목록 작성과 관리"),
+        ("포모도로 기법", "포모도로 기법을 활용한 집중력 향상"),
+        ("독서하기", "꾸준한 독서 습관과 지식 습득"),
+        ("목표 설정", "구체적이고 달성 가능한 목표 설정"),
+        ("정리정돈", "효율적인 작업 공간 정리와 관리"),
+        ("시간 관리", "시간 관리 기술과 우선순위 설정"),
+    ],
+    "stress": [
+        ("명상하기", "일상 속 간단한 명상과 마음챙김"),
+        ("감사하기", "감사 인사와 긍정적 사고 습관"),
+        ("음악 듣기", "스트레스 해소를 위한 음악 활용"),
+        ("일기 쓰기", "감정 정리와 자기 성찰을 위한 일기"),
+        ("자연 감상", "자연 속에서 스트레스 해소하기"),
+        ("심호흡", "효과적인 호흡법과 이완 기술"),
+    ],
+    "energy": [
+        ("아침 햇빛", "아침 햇빛 쬐기와 비타민D 합성"),
+        ("파워 포즈", "에너지를 높이는 파워 포즈와 자세"),
+        ("신나는 음악", "에너지 충전을 위한 음악 활용"),
+        ("건강 간식", "에너지 보충을 위한 건강한 간식"),
+        ("차가운 샤워", "에너지 부스터, 차가운 샤워의 효과"),
+        ("새로운 도전", "일상 속 작은 도전과 성취감"),
+    ],
+}
+
+# 프론트엔드가 카드 클릭("normal")과 "다른 추천 받기"("alternative")에서 보내는 질문 템플릿
+CATALOG_QUESTION_TEMPLATES = {
+    "normal": "{prompt}에 대해 구체적이고 실행 가능한 아주 작은 습관 3개를 추천해주세요. 각 습관마다 실행 방법과 기대 효과를 포함해서 설명해주세요.",
+    "alternative": "{prompt}에 대해 이전과 다른 새로운 아주 작은 습관 3개를 추천해주세요. 창의적이고 실행하기 쉬운 방법들로 제안해주세요.",
+}
+
+# 🆕 추천 사전 생성 설정
+# 켜면 워커마다 시작할 때와 갱신 주기마다 카드 수 × 요청 타입 × PREWARM_VARIANTS번 업스트림을 호출하므로 기본은 끔
+PREWARM_ENABLED = os.getenv("PREWARM_ENABLED", "false").lower() in ("1", "true", "yes")
+PREWARM_VARIANTS = int(os.getenv("PREWARM_VARIANTS", "3"))  # 카드/요청 타입별로 준비할 답변 수
+PREWARM_CONCURRENCY = int(os.getenv("PREWARM_CONCURRENCY", "4"))  # 사전 생성 동시 업스트림 호출 수
+PREWARM_REFRESH_INTERVAL = float(os.getenv("PREWARM_REFRESH_INTERVAL", str(6 * 3600)))
+
+# {(category, habitType, requestType): [response_data, ...]}
+recommendation_pool: Dict[tuple, List[Dict]] = {}
+# 요청자(IP)별로 카드마다 다음에 보여줄 답변 위치 {client_key: {pool_key: index}} (최근 RATE_LIMIT_MAX_KEYS명만)
+recommendation_pool_cursor: "OrderedDict[str, Dict[tuple, int]]" = OrderedDict()
+recommendation_pool_stats = {"hits": 0, "misses": 0, "refreshes": 0, "errors": 0, "last_refresh": None}
+
+def catalog_requests() -> List[QARequest]:
+    """카탈로그의 모든 (카테고리, 카드, 요청 타입) 조합을 QARequest로 생성"""
+    return [
+        QARequest(
+            question=template.format(prompt=prompt),
+            category=category,
+            habitType=title,
+            requestType=request_type
+        )
+        for category, cards in HABIT_CATALOG.items()
+        for title, prompt in cards
+        for request_type, template in CATALOG_QUESTION_TEMPLATES.items()
+    ]
+
+def pool_key(request: QARequest) -> tuple:
+    return (request.category, request.habitType, request.requestType or "normal")
+
+# 카탈로그 질문인지 확인하기 위한 {pool_key: question}
+CATALOG_QUESTIONS = {pool_key(request): request.question for request in catalog_requests()}
+CATALOG_QUESTION_TEXTS = frozenset(CATALOG_QUESTIONS.values())
+
+def use_similar_cache(request: QARequest) -> bool:
+    """카드 템플릿 질문은 정확히 같은 질문 캐시와 사전 생성으로 충분하고, 템플릿을 공유해 다른 습관끼리도
+    비슷해 보이므로 유사 질문 캐시를 쓰지 않음"""
+    return SIMILAR_CACHE_ENABLED and request.question not in CATALOG_QUESTION_TEXTS
+
+def take_prewarmed(request: QARequest, current_user: Optional[dict] = None) -> Optional[Dict]:
+    """카탈로그 질문이면 미리 만든 답변을 번갈아 반환 (없으면 None)
+
+    미리 만든 답변은 개인화 없이 생성하므로, 로그인 사용자는 맞춤 조언을 받도록 풀을 쓰지 않습니다.
+    """
+    if current_user:
+        return None
+    key = pool_key(request)
+    if CATALOG_QUESTIONS.get(key) != request.question:
+        return None
+    
+    variants = recommendation_pool.get(key)
+    if not variants:
+        recommendation_pool_stats["misses"] += 1
+        return None
+    
+    # 같은 요청자가 같은 카드를 다시 누르거나 "다른 추천 받기"를 누르면 다음 답변으로 회전
+    # (다른 요청자의 클릭이 끼어들어도 본 답변이 다시 나오지 않도록 요청자별로 위치를 기억)
+    client_key = upstream_flow.get()
+    client_key = client_key[0] if client_key else ""
+    cursors = recommendation_pool_cursor.get(client_key)
+    if cursors is None:
+        cursors = recommendation_pool_cursor[client_key] = {}
+        if len(recommendation_pool_cursor) > RATE_LIMIT_MAX_KEYS:
+            recommendation_pool_cursor.popitem(last=False)
+    else:
+        recommendation_pool_cursor.move_to_end(client_key)
+    index = cursors.get(key, 0)
+    cursors[key] = index + 1
+    recommendation_pool_stats["hits"] += 1
+    return variants[index % len(variants)]
+
+async def prewarm_recommendations() -> None:
+    """카탈로그 전체의 추천 답변을 제한된 동시성으로 새로 생성해 교체"""
+    slots = asyncio.Semaphore(PREWARM_CONCURRENCY)
+    
+    async def generate(messages: List[Dict], category: str) -> Optional[Dict]:
+        async with slots:
+            try:
+                # 변형 답변이 서로 달라야 하므로 single-flight를 거치지 않고 호출
+                response_data = await call_upstream(messages, ("prewarm", category))
+                return response_data if response_data.get("choices") else None
+            except Exception as e:
+                recommendation_pool_stats["errors"] += 1
+                print(f"추천 사전 생성 중 오류: {e}")
+                return None
+    
+    async def warm(request: QARequest) -> None:
+        messages = build_qa_messages(request, None)
+        results = await asyncio.gather(*(generate(messages, request.category) for _ in range(PREWARM_VARIANTS)))
+        variants = [result for result in results if result is not None]
+        # 새로 만든 답변이 있을 때만 교체 (실패하면 이전 답변을 계속 사용)
+        if variants:
+            recommendation_pool[pool_key(request)] = variants
+    
+    await asyncio.gather(*(warm(request) for request in catalog_requests()))
+    recommendation_pool_stats["refreshes"] += 1
+    recommendation_pool_stats["last_refresh"] = datetime.now().isoformat()
+
+async def run_recommendation_warmer() -> None:
+    """lifespan에서 시작하는 백그라운드 작업: 주기적으로 추천 풀을 갱신"""
+    while True:
         try:
-            response = await client.post(BOOTCAMP_API_URL, json=messages, timeout=30.0)
-            response.raise_for_status()
-            response_data = response.json()
-            
-            if not response_data["choices"]:
-                raise HTTPException(status_code=500, detail="응답이 비어 있습니다.")
+            await prewarm_recommendations()
+        except Exception as e:
+            print(f"추천 사전 생성 작업 오류: {e}")
+        await asyncio.sleep(PREWARM_REFRESH_INTERVAL)
+
+def find_cached_qa(request: QARequest, messages: List[Dict], current_user: Optional[dict] = None) -> Optional[Dict]:
+    """미리 만든 답변 → 같은 메시지 목록 캐시 → 🆕 유사 질문 캐시 순으로 조회"""
+    # 로그인하지 않은 사용자의 카탈로그 카드 질문은 미리 만든 답변에서 응답
+    response_data = take_prewarmed(request, current_user)
+    
+    # 동일한 메시지 목록은 캐시에서 응답 ("다른 추천 받기"는 항상 새로 생성)
+    if response_data is None and request.requestType != "alternative":
+        response_data = qa_cache.get(make_cache_key(messages))
+        if response_data is None and request.allowSimilar and use_similar_cache(request):
+            scope = similar_scope("qa", request.category, messages[:-1], request.habitType)
+            response_data = lookup_similar("habit_qa", scope, request.question)
+    return response_data
+
+def store_qa_answer(request: QARequest, messages: List[Dict], response_data: Dict) -> None:
+    if request.requestType == "alternative":
+        return
+    qa_cache.set(make_cache_key(messages), response_data)
+    if use_similar_cache(request):
+        similar_cache.store(similar_scope("qa", request.category, messages[:-1], request.habitType), request.question, response_data)
+
+async def answer_qa(request: QARequest, current_user: Optional[dict], endpoint: str = "habit_qa") -> Tuple[Dict, bool]:
+    """Q&A 답변을 (응답 데이터, 캐시 여부)로 반환 (활동 기록은 호출한 쪽에서)"""
+    messages = build_qa_messages(request, current_user)
+    
+    response_data = find_cached_qa(request, messages, current_user)
+    if response_data is not None:
+        return response_data, True
+    
+    response_data = await call_upstream_coalesced(messages, (endpoint, request.category))
+    
+    if not response_data["choices"]:
+        raise HTTPException(status_code=500, detail="응답이 비어 있습니다.")
+    
+    store_qa_answer(request, messages, response_data)
+    return response_data, False
+
+def qa_request_cost(request: QARequest) -> int:
+    return ALTERNATIVE_REQUEST_COST if request.requestType == "alternative" else 1
+
+@app.post("/api/habits/qa")
+async def habit_qa(request: QARequest, http_request: Request, current_user: Optional[dict] = Depends(optional_auth)):
+    """습관 관련 Q&A"""
+    
+    enforce_rate_limit(http_request, current_user, qa_request_cost(request))
+    try:
+        response_data, cached = await answer_qa(request, current_user)
+        
+        log_qa_activity(request, current_user)
+        
+        return {
+            "success": True,
+            "question": request.question,
+            "answer": response_data["choices"][0]["message"]["content"],
+            "usage": response_data["usage"],
+            "user_authenticated": current_user is not None,
+            "cached": cached
+        }
+
+    except UpstreamUnavailable:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"답변 생성 중 오류: {str(e)}")
+
+@app.post("/api/habits/qa/stream")
+async def habit_qa_stream(request: QARequest, http_request: Request, current_user: Optional[dict] = Depends(optional_auth)):
+    """🆕 습관 관련 Q&A 스트리밍 (Server-Sent Events)"""
+    
+    enforce_rate_limit(http_request, current_user, qa_request_cost(request))
+    messages = build_qa_messages(request, current_user)
+    cached_data = find_cached_qa(request, messages, current_user)
+    if cached_data is None:
+        upstream_gateway.check_admission()
+    
+    async def event_stream():
+        # 캐시된 답변은 한 번에 전달
+        if cached_data is not None:
+            answer = cached_data["choices"][0]["message"]["content"]
+            log_qa_activity(request, current_user)
+            yield sse_event("delta", {"content": answer})
+            yield sse_event("done", {"answer": answer, "usage": cached_data["usage"], "cached": True})
+            return
+        
+        chunks = []
+        usage = {}
+        completed = False
+        try:
+            async for chunk in stream_upstream(messages, ("habit_qa_stream", request.category)):
+                if "delta" in chunk:
+                    chunks.append(chunk["delta"])
+                    yield sse_event("delta", {"content": chunk["delta"]})
+                else:
+                    usage = chunk["usage"]
             
-            # 사용자 활동 기록 (로그인한 경우)
-            if current_user:
-                try:
-                    user_id = current_user["id"]
-                    if user_id not in user_activities:
-                        user_activities[user_id] = []
-                    
-                    activity_record = {
-                        "activity": "habit_qa_request",
-                        "timestamp": datetime.now().isoformat(),
-                        "category": request.category,
-                        "habit": request.habitType,
-                        "question": request.question[:100] + "..." if len(request.question) > 100 else request.question,
-                        "recordedAt": datetime.now().isoformat()
-                    }
-                    user_activities[user_id].append(activity_record)
-                except Exception as log_error:
-                    print(f"활동 기록 중 오류: {log_error}")
+            answer = "".join(chunks)
+            if not answer:
+                raise ValueError("응답이 비어 있습니다.")
             
-            return {
-                "success": True,
-                "question": request.question,
-                "answer": response_data["choices"][0]["message"]["content"],
-                "usage": response_data["usage"],
-                "user_authenticated": current_user is not None
-            }
+            store_qa_answer(request, messages, {"choices": [{"message": {"role": "assistant", "content": answer}}], "usage": usage})
+            log_qa_activity(request, current_user)
+            completed = True
+            yield sse_event("done", {"answer": answer, "usage": usage, "cached": False})
+        except Exception as e:
+            yield upstream_error_event(e, "답변 생성 중 오류")
+        finally:
+            if not completed:
+                streams_aborted_total.inc("qa")
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+# 🆕 배치 Q&A 설정
+QA_BATCH_MAX_ITEMS = int(os.getenv("QA_BATCH_MAX_ITEMS", "12"))  # 한 번에 보낼 수 있는 질문 수
+QA_BATCH_CONCURRENCY = int(os.getenv("QA_BATCH_CONCURRENCY", "4"))  # 배치 하나가 동시에 쓰는 업스트림 호출 수
 
+class QABatchRequest(BaseModel):
+    items: List[QARequest]
+
+async def answer_batch_item(index: int, request: QARequest, current_user: Optional[dict], slots: asyncio.Semaphore) -> Dict:
+    """배치의 한 항목 처리 (실패해도 예외 대신 항목별 오류로 반환)"""
+    async with slots:
+        try:
+            response_data, cached = await answer_qa(request, current_user, "habit_qa_batch")
+        except UpstreamUnavailable as e:
+            return {"index": index, "success": False, "status": e.status_code, "detail": e.detail, "retry_after": e.retry_after}
         except Exception as e:
-            raise HTTPException(status_code=500, detail=f"답변 생성 중 오류: {str(e)}")
+            return {"index": index, "success": False, "status": 500, "detail": f"답변 생성 중 오류: {str(e)}"}
+    return {
+        "index": index,
+        "success": True,
+        "question": request.question,
+        "answer": response_data["choices"][0]["message"]["content"],
+        "usage": response_data["usage"],
+        "cached": cached
+    }
+
+@app.post("/api/habits/qa/batch")
+async def habit_qa_batch(
+    batch: QABatchRequest,
+    http_request: Request,
+    stream: bool = False,
+    current_user: Optional[dict] = Depends(optional_auth)
+):
+    """🆕 여러 습관 Q&A를 한 번에 요청
+
+    - 항목들은 QA_BATCH_CONCURRENCY개씩 동시에 업스트림으로 보내고, 결과는 요청 순서대로 반환
+    - 항목별로 success/오류를 돌려주므로 일부가 느리거나 실패해도 나머지는 응답
+    - stream=true면 끝나는 대로 SSE "item" 이벤트로 보내고 마지막에 "done"
+    - 성공한 항목의 활동 기록은 배치 전체를 한 번에 추가
+    """
+    items = batch.items
+    if not items:
+        raise HTTPException(status_code=400, detail="items가 비어 있습니다")
+    if len(items) > QA_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"한 번에 최대 {QA_BATCH_MAX_ITEMS}개까지 요청할 수 있습니다")
+    
+    enforce_rate_limit(http_request, current_user, sum(qa_request_cost(item) for item in items))
+    upstream_gateway.check_admission()
+    slots = asyncio.Semaphore(QA_BATCH_CONCURRENCY)
+    
+    def summary(results: List[Dict]) -> Dict:
+        succeeded = [items[result["index"]] for result in results if result["success"]]
+        log_qa_activities(succeeded, current_user)
+        return {"succeeded": len(succeeded), "failed": len(results) - len(succeeded), "user_authenticated": current_user is not None}
+    
+    if not stream:
+        results = await asyncio.gather(*(answer_batch_item(i, item, current_user, slots) for i, item in enumerate(items)))
+        return {"success": True, "results": results, **summary(results)}
+    
+    async def event_stream():
+        tasks = [asyncio.create_task(answer_batch_item(i, item, current_user, slots)) for i, item in enumerate(items)]
+        results = []
+        try:
+            for finished in asyncio.as_completed(tasks):
+                result = await finished
+                results.append(result)
+                yield sse_event("item", result)
+            yield sse_event("done", summary(results))
+        finally:
+            # 클라이언트가 끊으면 남은 업스트림 호출 취소
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+# 🆕 목표 카테고리 (고정 목록이라 시작할 때 한 번만 직렬화·압축)
+AVAILABLE_GOALS = [
+    {"id": "health", "label": "건강 관리", "description": "운동, 식단, 수면 관련 습관"},
+    {"id": "productivity", "label": "생산성 향상", "description": "업무 효율성과 시간 관리"},
+    {"id": "stress", "label": "스트레스 관리", "description": "정신 건강과 감정 조절"},
+    {"id": "energy", "label": "에너지 증진", "description": "활력과 컨디션 개선"}
+]
+goals_asset = PrecompressedAsset(
+    json.dumps({"goals": AVAILABLE_GOALS}, ensure_ascii=False).encode(),
+    "application/json",
+    GOALS_CACHE_CONTROL
+)
 
 # 🆕 목표 카테고리 조회 (인증 불필요)
 @app.get("/api/habits/goals")
-async def get_available_goals():
-    """사용 가능한 목표 카테고리"""
-    goals = [
-        {"id": "health", "label": "건강 관리", "description": "운동, 식단, 수면 관련 습관"},
-        {"id": "productivity", "label": "생산성 향상", "description": "업무 효율성과 시간 관리"},
-        {"id": "stress", "label": "스트레스 관리", "description": "정신 건강과 감정 조절"},
-        {"id": "energy", "label": "에너지 증진", "description": "활력과 컨디션 개선"}
-    ]
-    return {"goals": goals}
+async def get_available_goals(request: Request):
+    """사용 가능한 목표 카테고리 (If-None-Match가 맞으면 304)"""
+    return goals_asset.response(request)
 
 # 🆕 개발용 엔드포인트들
 @app.get("/api/dev/users")
-async def get_all_users():
-    """개발용: 모든 사용자 조회"""
-    users = []
-    for user_id, user_data in users_db.items():
-        user_safe = {k: v for k, v in user_data.items() if k != "password"}
-        users.append(user_safe)
+async def get_all_users(cursor: Optional[str] = None, limit: int = 100):
+    """개발용: 사용자 조회 (🆕 가입 순서로 limit명씩, 다음 페이지는 next_cursor로)"""
+    user_cursor, _ = parse_export_cursor(cursor)
+    limit = max(1, min(limit, EXPORT_PAGE_SIZE))
+    page = repo.scan_users(user_cursor, limit)
     
     return {
-        "users": users,
-        "total": len(users),
-        "active_tokens": len(tokens_db)
+        "users": [{k: v for k, v in user_data.items() if k != "password"} for _, user_data in page],
+        "next_cursor": str(page[-1][0]) if len(page) == limit else None,
+        "total": repo.count_users(),
+        "active_tokens": repo.count_tokens()
     }
 
 @app.get("/api/dev/activities")
-async def get_all_activities():
-    """개발용: 모든 활동 조회"""
+async def get_all_activities(cursor: Optional[str] = None, limit: int = 100):
+    """개발용: 활동 조회 (🆕 사용자 가입 순서, 사용자별 저장 순서로 limit개씩, 다음 페이지는 next_cursor로)
+
+    cursor 형식은 /api/dev/export/activities와 같습니다.
+    """
+    user_cursor, position = parse_export_cursor(cursor)
+    remaining = max(1, min(limit, EXPORT_ACTIVITY_CHUNK))
+    user_activities: Dict[str, List[Dict]] = {}
+    next_cursor = None
+    while remaining > 0:
+        users = repo.scan_users(user_cursor, EXPORT_PAGE_SIZE)
+        if not users:
+            break
+        for next_user_cursor, user in users:
+            chunk = repo.scan_activities(user["id"], position, remaining)
+            if chunk:
+                user_activities.setdefault(user["id"], []).extend(record.to_dict() for _, record in chunk)
+                position = chunk[-1][0]
+                remaining -= len(chunk)
+                next_cursor = f"{user_cursor}.{position}"
+                if remaining == 0:
+                    break
+            user_cursor, position = next_user_cursor, 0
+        await asyncio.sleep(0)  # 사용자 페이지마다 다른 요청에 이벤트 루프 양보
+    
     return {
         "user_activities": user_activities,
-        "total_users": len(user_activities),
-        "total_activities": sum(len(activities) for activities in user_activities.values())
+        "next_cursor": next_cursor if remaining == 0 else None,
+        "total_users": repo.count_users(),
+        "total_activities": repo.count_activities()
     }
 
+# 🆕 개발용 NDJSON 스트리밍 내보내기 (데이터 양과 관계없이 한 페이지 분량의 메모리만 사용)
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "500"))  # 한 번에 읽는 사용자 수
+EXPORT_ACTIVITY_CHUNK = int(os.getenv("EXPORT_ACTIVITY_CHUNK", "1000"))  # 한 사용자의 활동을 한 번에 읽는 개수
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+def parse_export_cursor(cursor: Optional[str]) -> Tuple[int, int]:
+    """"사용자 커서.활동 위치" 형식의 재개 커서 해석 (활동 위치는 Repository.scan_activities의 위치)"""
+    if not cursor:
+        return 0, 0
+    user_cursor, _, index = cursor.partition(".")
+    try:
+        return int(user_cursor), int(index or 0)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="잘못된 cursor입니다")
+
+def ndjson_response(lines: AsyncIterator[Dict], use_gzip: bool) -> StreamingResponse:
+    """dict를 한 줄씩 NDJSON으로 내보내는 스트리밍 응답 (gzip은 조각마다 sync flush)"""
+    async def body():
+        compressor = zlib.compressobj(wbits=31) if use_gzip else None
+        buffer = []
+        size = 0
+        async for line in lines:
+            encoded = (json.dumps(line, ensure_ascii=False) + "\n").encode()
+            buffer.append(encoded)
+            size += len(encoded)
+            if size < EXPORT_CHUNK_BYTES:
+                continue
+            chunk = b"".join(buffer)
+            buffer, size = [], 0
+            # 끊겨도 받은 부분까지는 온전한 줄로 풀리도록 조각마다 flush
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH) if compressor else chunk
+        chunk = b"".join(buffer)
+        yield compressor.compress(chunk) + compressor.flush() if compressor else chunk
+    
+    headers = {"Content-Encoding": "gzip"} if use_gzip else {}
+    return StreamingResponse(body(), media_type="application/x-ndjson", headers=headers)
+
+def in_time_range(value: Optional[str], since: Optional[str], until: Optional[str]) -> bool:
+    """ISO 시각 문자열이 [since, until) 범위인지 확인"""
+    value = value or ""
+    return (since is None or value >= since) and (until is None or value < until)
+
+@app.get("/api/dev/export/users")
+async def export_users(
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    cursor: Optional[str] = None,
+    gzip: bool = False
+):
+    """개발용: 사용자 NDJSON 내보내기
+
+    - since/until: 가입 시각(createdAt) 범위 [since, until)
+    - cursor: 이전 응답의 마지막 줄에 있던 cursor로 이어받기
+    - 각 줄은 {"cursor", "user"}, 마지막 줄은 {"done": true, ...}
+    """
+    user_cursor, _ = parse_export_cursor(cursor)
+    
+    async def lines():
+        nonlocal user_cursor
+        exported = 0
+        while True:
+            page = repo.scan_users(user_cursor, EXPORT_PAGE_SIZE)
+            if not page:
+                break
+            for next_cursor, user_data in page:
+                user_cursor = next_cursor
+                if in_time_range(user_data.get("createdAt"), since, until):
+                    exported += 1
+                    yield {"cursor": str(next_cursor), "user": {k: v for k, v in user_data.items() if k != "password"}}
+            await asyncio.sleep(0)  # 페이지마다 다른 요청에 이벤트 루프 양보
+        yield {"done": True, "exported": exported, "cursor": str(user_cursor), "total_users": repo.count_users()}
+    
+    return ndjson_response(lines(), gzip)
+
+@app.get("/api/dev/export/activities")
+async def export_activities(
+    user_id: Optional[str] = None,
+    category: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    cursor: Optional[str] = None,
+    gzip: bool = False
+):
+    """개발용: 활동 기록 NDJSON 내보내기
+
+    - user_id / category: 특정 사용자 / 카테고리만
+    - since/until: 활동 시각(timestamp) 범위 [since, until)
+    - cursor: 이전 응답의 마지막 줄에 있던 cursor로 이어받기
+    - 각 줄은 {"cursor", "user_id", "activity"}, 마지막 줄은 {"done": true, ...}
+    """
+    user_cursor, start_index = parse_export_cursor(cursor)
+    
+    async def lines():
+        nonlocal user_cursor, start_index
+        exported = 0
+        while True:
+            if user_id is not None:
+                page = [(1, user_id)] if user_cursor == 0 else []
+            else:
+                page = [(next_cursor, user["id"]) for next_cursor, user in repo.scan_users(user_cursor, EXPORT_PAGE_SIZE)]
+            if not page:
+                break
+            for next_cursor, page_user_id in page:
+                # 사용자의 활동도 조건을 저장소에 넘겨 EXPORT_ACTIVITY_CHUNK개씩 읽음 (활동이 많은 사용자도 메모리 일정)
+                while True:
+                    chunk = repo.scan_activities(page_user_id, start_index, EXPORT_ACTIVITY_CHUNK, since, until, category)
+                    if not chunk:
+                        break
+                    for position, record in chunk:
+                        start_index = position
+                        exported += 1
+                        yield {"cursor": f"{user_cursor}.{position}", "user_id": page_user_id, "activity": record.to_dict()}
+                    await asyncio.sleep(0)
+                user_cursor, start_index = next_cursor, 0
+            await asyncio.sleep(0)
+        yield {
+            "done": True,
+            "exported": exported,
+            "cursor": f"{user_cursor}.0",
+            "total_users": repo.count_users(),
+            "total_activities": repo.count_activities()
+        }
+    
+    return ndjson_response(lines(), gzip)
+
 @app.delete("/api/dev/reset")
 async def reset_database():
     """개발용: 데이터베이스 초기화"""
-    global users_db, tokens_db, user_activities, user_chat_history, user_selected_habits
-    users_db.clear()
-    tokens_db.clear()
-    user_activities.clear()
-    user_chat_history.clear()  # 🆕 채팅 내역도 초기화
-    user_selected_habits.clear()  # 🆕 선택된 습관도 초기화
+    repo.reset()  # 🆕 사용자, 토큰, 활동, 채팅 내역, 선택된 습관 모두 초기화
+    qa_cache.clear()  # 🆕 Q&A 응답 캐시도 초기화
+    similar_cache.clear()
+    activity_analytics.clear()
+    recommendation_pool_cursor.clear()
     
     return {
         "success": True,
         "message": "데이터베이스가 초기화되었습니다"
     }
 
+# 🆕 메인 페이지는 요청마다 달라지는 내용이 없으므로 시작할 때 한 번만 렌더링·압축
+# (사용자 수 등 동적인 값은 페이지에 넣지 않고 /api/status로 조회)
+home_page_asset = PrecompressedAsset(
+    templates.get_template("index.html").render(title="아주 작은 습관 GPT").encode(),
+    "text/html; charset=utf-8",
+    HOME_CACHE_CONTROL
+)
+
 # 기존 메인 페이지
 @app.get("/", response_class=HTMLResponse)
-def home(request: Request):
-    """메인페이지"""
-    context = {
-        "request": request,
-        "title": "아주 작은 습관 GPT",
-        "message_count": len(users_db),
-        "messages": len(tokens_db)
-    }
-    return templates.TemplateResponse("index.html", context)
+async def home(request: Request):
+    """메인페이지 (If-None-Match가 맞으면 304)"""
+    return home_page_asset.response(request)
 
 # 🆕 API 상태 확인
 @app.get("/api/status")
@@ -605,11 +1900,49 @@ async def api_status():
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "users_count": len(users_db),
-        "active_sessions": len(tokens_db),
-        "total_activities": sum(len(activities) for activities in user_activities.values())
+        "users_count": repo.count_users(),
+        "active_sessions": repo.count_tokens(),
+        "total_activities": repo.count_activities(),
+        "storage": {"backend": STORAGE_BACKEND, **repo.stats()},
+        "qa_cache": qa_cache.stats(),
+        "similar_cache": similar_cache.stats(),
+        "activity_analytics": activity_analytics.stats(),
+        "static_responses": {"home": home_page_asset.info(), "goals": goals_asset.info()},
+        "upstream_gateway": upstream_gateway.stats(),
+        "rate_limits": {"enabled": RATE_LIMIT_ENABLED, "user": user_rate_limiter.stats(), "ip": ip_rate_limiter.stats()},
+        "upstream_hedge": {"enabled": UPSTREAM_HEDGE_ENABLED, **upstream_hedge.stats()},
+        "client_disconnects_cancelled": sum(client_disconnects_total.values.values()),
+        "streams_aborted": {stream: count for (stream,), count in streams_aborted_total.values.items()},
+        "chat_context": {**chat_context_stats, "token_cache": token_counter.stats()},
+        "upstream_coalescing": upstream_flights.stats(),
+        "recommendation_pool": {
+            **recommendation_pool_stats,
+            "keys": len(recommendation_pool),
+            "clients": len(recommendation_pool_cursor),
+            "variants": sum(len(variants) for variants in recommendation_pool.values())
+        }
     }
 
+# 🆕 저장소 크기와 게이트웨이 상태는 수집 시점에 증분 카운터에서 읽음 (전체 순회 없음)
+metrics_registry.register(CallbackGauge("store_items", "저장소 항목 수", ("store",), lambda: {
+    ("users",): repo.count_users(),
+    ("tokens",): repo.count_tokens(),
+    ("activities",): repo.count_activities(),
+    ("chat_messages",): repo.count_chat_messages(),
+    ("qa_cache",): len(qa_cache),
+    ("similar_cache",): len(similar_cache),
+}))
+metrics_registry.register(CallbackGauge("upstream_gateway", "업스트림 게이트웨이 상태", ("field",), lambda: {
+    ("in_flight",): upstream_gateway.in_flight,
+    ("queue_depth",): upstream_gateway.waiting,
+    ("circuit_open",): int(upstream_gateway.breaker.state != "closed"),
+}))
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """🆕 Prometheus 형식 메트릭"""
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
 # 서버 실행 코드
 if __name__ == "__main__":
     import uvicorn
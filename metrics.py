@@ -0,0 +1,179 @@
+# Prometheus 텍스트 형식 메트릭 (외부 의존성 없이 요청 경로에서 O(1)에 가깝게 기록)
+import asyncio
+import bisect
+import time
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from starlette.routing import Match
+
+# 요청/업스트림 지연 히스토그램 버킷 (초)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        super().__init__(name, help_text, labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.label_names, labels)} {value}"
+            for labels, value in sorted(self.values.items())
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+    def set(self, value: float, *labels: str) -> None:
+        self.values[labels] = value
+
+
+class CallbackGauge(Metric):
+    """값을 저장하지 않고 수집 시점에 콜백으로 읽는 게이지 (저장소 크기 등)"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str], callback: Callable[[], Dict[Tuple[str, ...], float]]):
+        super().__init__(name, help_text, labels)
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.label_names, labels)} {value}"
+            for labels, value in sorted(self.callback().items())
+        ]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # {labels: [버킷별 개수..., +Inf 개수, 합계]}
+        self.values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, series in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                bucket_labels = _format_labels(self.label_names, labels, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """라우트별 지연 히스토그램, 요청 수, 처리 중 요청 게이지를 기록하는 ASGI 미들웨어
+
+    라우트는 (method, path)별로 한 번만 찾아 캐시하고, 없는 경로는 "unmatched"로 묶어
+    라벨 수가 무한히 늘지 않게 합니다. 스트리밍 응답은 본문 전송이 끝날 때까지 측정합니다.
+    """
+
+    def __init__(self, app, latency: Histogram, requests: Counter, in_flight: Gauge, max_routes: int = 1000):
+        self.app = app
+        self.latency = latency
+        self.requests = requests
+        self.in_flight = in_flight
+        self.max_routes = max_routes
+        self._routes: Dict[Tuple[str, str], str] = {}
+
+    def _route_label(self, scope) -> str:
+        key = (scope["method"], scope["path"])
+        label = self._routes.get(key)
+        if label is None:
+            label = "unmatched"
+            router = scope["app"].router if "app" in scope else None
+            if router is not None:
+                for route in router.routes:
+                    match, _ = route.matches(scope)
+                    if match == Match.FULL:
+                        label = getattr(route, "path", scope["path"])
+                        break
+            if len(self._routes) < self.max_routes:
+                self._routes[key] = label
+        return label
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self._route_label(scope)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        self.in_flight.inc(method, route)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except asyncio.CancelledError:
+            if status["code"] == 500:
+                status["code"] = 499  # 응답 전에 클라이언트가 연결을 끊어 취소됨
+            raise
+        finally:
+            self.in_flight.dec(method, route)
+            self.latency.observe(time.perf_counter() - start, method, route)
+            self.requests.inc(method, route, str(status["code"]))
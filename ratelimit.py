@@ -0,0 +1,106 @@
+# 사용자/IP별 토큰 버킷 요청 제한 (타이머 없이 조회할 때 채우고, 키 수는 LRU로 제한)
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Tuple
+
+
+class RateLimitDecision(NamedTuple):
+    allowed: bool
+    limit: int  # 버킷 크기 (연속으로 보낼 수 있는 요청 수)
+    remaining: int
+    reset: float  # 버킷이 다시 가득 찰 때까지 남은 초
+    retry_after: float  # 거절된 경우 다시 시도할 수 있을 때까지 남은 초
+    window: float  # 버킷 크기만큼 채우는 데 걸리는 초 (RateLimit-Policy의 w)
+
+    def headers(self) -> Dict[str, str]:
+        """IETF RateLimit 헤더 (초안) 형식"""
+        headers = {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(math.ceil(self.reset)),
+            "RateLimit-Policy": f"{self.limit};w={math.ceil(self.window)}",
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+class TokenBucketLimiter:
+    """키별 토큰 버킷
+
+    - rate: 초당 채워지는 토큰 수, burst: 버킷 크기
+    - 경과 시간만큼 조회 시점에 채우므로 키마다 타이머가 필요 없음
+    - max_keys를 넘으면 가장 오래 쓰지 않은 키부터 버림 (버린 키는 가득 찬 버킷으로 다시 시작)
+    """
+
+    def __init__(self, rate: float, burst: int, max_keys: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()  # {key: [tokens, updated_at]}
+        self.counters = {"allowed": 0, "limited": 0, "evicted": 0}
+
+    def acquire(self, key: str, cost: float = 1) -> RateLimitDecision:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(self.burst), now]
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+                self.counters["evicted"] += 1
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+
+        allowed = bucket[0] >= cost
+        if allowed:
+            bucket[0] -= cost
+            self.counters["allowed"] += 1
+        else:
+            self.counters["limited"] += 1
+        return RateLimitDecision(
+            allowed=allowed,
+            limit=self.burst,
+            remaining=int(bucket[0]),
+            reset=(self.burst - bucket[0]) / self.rate,
+            retry_after=0 if allowed else (cost - bucket[0]) / self.rate,
+            window=self.burst / self.rate,
+        )
+
+    def clear(self) -> None:
+        self._buckets.clear()
+
+    def stats(self) -> Dict:
+        return {"keys": len(self._buckets), "max_keys": self.max_keys, "rate_per_second": self.rate, "burst": self.burst, **self.counters}
+
+
+class RateLimitHeadersMiddleware:
+    """핸들러가 scope["state"][state_key]에 남긴 헤더를 응답에 붙이는 ASGI 미들웨어
+
+    dict를 반환하는 핸들러와 StreamingResponse를 반환하는 핸들러 모두 같은 방식으로 헤더를 받습니다.
+    """
+
+    def __init__(self, app, state_key: str = "rate_limit_headers"):
+        self.app = app
+        self.state_key = state_key
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                extra = (scope.get("state") or {}).get(self.state_key)
+                if extra:
+                    existing = {name.lower() for name, _ in message.get("headers", [])}
+                    added: List[Tuple[bytes, bytes]] = [
+                        (name.lower().encode(), value.encode())
+                        for name, value in extra.items() if name.lower().encode() not in existing
+                    ]
+                    message = {**message, "headers": list(message.get("headers", [])) + added}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,136 @@
+# 채팅 메시지와 활동 기록의 메모리 절약형 표현
+#
+# 저장소와 분석 인덱스는 딕셔너리 대신 __slots__ 레코드를 보관하고, API 응답/직렬화 직전에만
+# to_dict()로 기존 JSON 형태를 만듭니다.
+# - 시각: 서버가 만드는 ISO 문자열(datetime.isoformat())은 epoch 마이크로초 정수로 보관
+#   (그대로 복원되지 않는 형식, 예: 브라우저의 "...Z" 문자열은 원문 유지)
+# - role / 활동 종류 / 카테고리 / 습관처럼 반복되는 문자열은 intern해서 한 객체를 공유
+import sys
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional, Union
+
+EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+Timestamp = Union[int, str, None]
+
+
+def now_timestamp() -> int:
+    """현재 시각 (datetime.now().isoformat()을 encode_timestamp한 값과 같음)"""
+    return (datetime.now() - EPOCH) // _MICROSECOND
+
+
+def encode_timestamp(text: Optional[str]) -> Timestamp:
+    """ISO 시각 문자열을 epoch 마이크로초로 (같은 문자열로 복원되지 않으면 원문 그대로)"""
+    if not isinstance(text, str):
+        return text
+    try:
+        moment = datetime.fromisoformat(text)
+    except ValueError:
+        return text
+    if moment.tzinfo is not None or moment.isoformat() != text:
+        return text
+    return (moment - EPOCH) // _MICROSECOND
+
+
+def decode_timestamp(value: Timestamp) -> Optional[str]:
+    if isinstance(value, int):
+        return (EPOCH + timedelta(microseconds=value)).isoformat()
+    return value
+
+
+def timestamp_key(value: Timestamp) -> Optional[int]:
+    """정렬/범위 비교용 벽시계 기준 마이크로초 (시간대 표기는 무시, 해석할 수 없으면 None)
+
+    문자열을 사전순으로 비교하던 것과 같은 순서가 되도록 시간대 오프셋은 적용하지 않습니다.
+    """
+    if isinstance(value, int) or value is None:
+        return value
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    return (moment.replace(tzinfo=None) - EPOCH) // _MICROSECOND
+
+
+def timestamp_day(value: Timestamp) -> Optional[date]:
+    key = timestamp_key(value)
+    return (EPOCH + timedelta(microseconds=key)).date() if key is not None else None
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class ChatRecord:
+    """채팅 메시지 {"id", "role", "content", "timestamp"}"""
+
+    __slots__ = ("id", "role", "content", "timestamp")
+
+    def __init__(self, id: Optional[int], role: str, content: str, timestamp: Timestamp):
+        self.id = id
+        self.role = _intern(role)
+        self.content = content
+        self.timestamp = timestamp
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ChatRecord":
+        return cls(data.get("id"), data.get("role"), data.get("content"), encode_timestamp(data.get("timestamp")))
+
+    def to_dict(self) -> Dict:
+        return {"id": self.id, "role": self.role, "content": self.content, "timestamp": decode_timestamp(self.timestamp)}
+
+
+class ActivityRecord:
+    """활동 기록 {"activity", "timestamp", "category", "habit", ["question"], "recordedAt", ...}
+
+    recordedAt이 timestamp와 같으면 같은 정수 객체를 공유합니다. 알려지지 않은 필드는 extra에 보관합니다.
+    """
+
+    __slots__ = ("activity", "timestamp", "category", "habit", "question", "recorded_at", "extra")
+
+    FIELDS = frozenset({"activity", "timestamp", "category", "habit", "question", "recordedAt"})
+
+    def __init__(
+        self,
+        activity: Optional[str],
+        timestamp: Timestamp,
+        category: Optional[str] = None,
+        habit: Optional[str] = None,
+        question: Optional[str] = None,
+        recorded_at: Timestamp = None,
+        extra: Optional[Dict] = None,
+    ):
+        self.activity = _intern(activity)
+        self.timestamp = timestamp
+        self.category = _intern(category)
+        self.habit = _intern(habit)
+        self.question = question
+        self.recorded_at = timestamp if recorded_at == timestamp else recorded_at
+        self.extra = extra or None
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ActivityRecord":
+        return cls(
+            data.get("activity"),
+            encode_timestamp(data.get("timestamp")),
+            data.get("category"),
+            data.get("habit"),
+            data.get("question"),
+            encode_timestamp(data.get("recordedAt")),
+            {key: value for key, value in data.items() if key not in cls.FIELDS},
+        )
+
+    def to_dict(self) -> Dict:
+        data = {
+            "activity": self.activity,
+            "timestamp": decode_timestamp(self.timestamp),
+            "category": self.category,
+            "habit": self.habit,
+        }
+        if self.question is not None:
+            data["question"] = self.question
+        data["recordedAt"] = decode_timestamp(self.recorded_at)
+        if self.extra:
+            data.update(self.extra)
+        return data
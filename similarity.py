@@ -0,0 +1,174 @@
+# 표현만 조금 다른 질문을 찾아 이전 답변을 재사용하기 위한 근사 일치 캐시 (MinHash + LSH, 외부 의존성 없음)
+import hashlib
+import random
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+# 질문의 뜻을 바꾸지 않는 말 (의문/요청 표현 등)
+STOPWORDS = frozenset({
+    "어떻게", "어떡해", "어떤", "무엇", "뭐", "뭘", "뭔가", "좀", "잘", "방법", "방법은", "방법이",
+    "알려주세요", "알려줘", "알려줘요", "추천", "추천해주세요", "해주세요", "주세요", "싶어요", "싶은데",
+    "할까요", "하나요", "있을까요", "있나요", "되나요", "될까요", "수", "것", "거", "please", "how", "what", "the", "a", "to",
+})
+
+# 어간만 남기기 위해 떼어내는 조사/어미 (긴 것부터 비교)
+SUFFIXES = tuple(sorted({
+    "하려면", "하려고", "하는데", "했는데", "해야", "하는", "하기", "해요", "어요", "아요", "려면", "는데",
+    "에서", "으로", "에게", "까지", "부터", "이랑", "하고", "처럼", "보다",
+    "은", "는", "이", "가", "을", "를", "에", "의", "도", "로", "와", "과", "요", "기", "게", "고", "면",
+}, key=len, reverse=True))
+
+# 재사용할 최소 Jaccard 유사도 기본값
+# 습관 카드 질문은 긴 템플릿을 공유해 같은 카테고리의 다른 습관끼리도 최대 0.8까지 나오므로 그보다 높게 둠
+DEFAULT_THRESHOLD = 0.85
+
+_TOKEN_PATTERN = re.compile(r"[0-9a-z가-힣]+")
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def normalize_tokens(text: str) -> List[str]:
+    """소문자/NFKC 정규화 후 단어별로 조사·어미를 떼고 불용어를 뺀 토큰 목록"""
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(unicodedata.normalize("NFKC", text).lower()):
+        if token in STOPWORDS:
+            continue
+        for suffix in SUFFIXES:
+            if token.endswith(suffix) and len(token) - len(suffix) >= 2:
+                token = token[:-len(suffix)]
+                break
+        if token not in STOPWORDS:
+            tokens.append(token)
+    return tokens
+
+
+def shingles(text: str, ngram: int = 2) -> FrozenSet[str]:
+    """단어와 단어 안의 글자 n-gram 집합 (띄어쓰기가 달라도 겹치도록 단어 경계는 넘지 않음)"""
+    result = set()
+    for token in normalize_tokens(text):
+        result.add(token)
+        for i in range(len(token) - ngram + 1):
+            result.add(token[i:i + ngram])
+    return frozenset(result)
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    """shingle 집합을 num_perm개의 최솟값 서명으로 요약 (같은 seed면 프로세스가 달라도 같은 서명)"""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = random.Random(seed)
+        self.permutations = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(num_perm)]
+
+    def signature(self, items: FrozenSet[str]) -> Tuple[int, ...]:
+        hashes = [int.from_bytes(hashlib.blake2b(item.encode(), digest_size=8).digest(), "little") for item in items]
+        if not hashes:
+            return ()
+        return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in self.permutations)
+
+
+class SimilarQuestionCache:
+    """범위(scope)별로 비슷한 질문의 답변을 찾는 캐시
+
+    - 서명을 bands개 구간으로 나눠 한 구간이라도 같은 항목만 후보로 보고 (LSH),
+      후보는 실제 Jaccard 유사도로 확인해 threshold 이상인 가장 비슷한 답변을 반환
+    - scope가 다르면 (카테고리, 시스템 프롬프트/이전 대화가 다르면) 절대 섞이지 않음
+    - max_entries를 넘으면 가장 오래 쓰지 않은 항목부터, ttl이 지난 항목은 조회 시 제거
+    """
+
+    def __init__(self, threshold: float, max_entries: int, ttl: float, num_perm: int = 64, bands: int = 16, ngram: int = 2):
+        if num_perm % bands:
+            raise ValueError("num_perm은 bands의 배수여야 합니다")
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.ngram = ngram
+        self.hasher = MinHasher(num_perm)
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()  # {id: (scope, shingles, band_keys, expires_at, value)}
+        self._buckets: Dict[tuple, set] = {}
+        self._next_id = 0
+        self.counters = {"lookups": 0, "hits": 0, "misses": 0, "stores": 0, "evictions": 0, "candidates": 0}
+
+    def _band_keys(self, scope: str, signature: Tuple[int, ...]) -> List[tuple]:
+        return [(scope, band, hash(signature[band * self.rows:(band + 1) * self.rows])) for band in range(self.bands)]
+
+    def _remove(self, entry_id: int) -> None:
+        _, _, band_keys, _, _ = self._entries.pop(entry_id)
+        for key in band_keys:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def lookup(self, scope: str, text: str) -> Tuple[Optional[object], Optional[float]]:
+        """(답변 또는 None, 가장 비슷한 후보의 유사도 또는 None) 반환"""
+        self.counters["lookups"] += 1
+        items = shingles(text, self.ngram)
+        signature = self.hasher.signature(items)
+        candidates = set()
+        if signature:
+            for key in self._band_keys(scope, signature):
+                candidates.update(self._buckets.get(key, ()))
+        self.counters["candidates"] += len(candidates)
+
+        now = time.monotonic()
+        best_id, best_similarity = None, None
+        for entry_id in candidates:
+            _, entry_items, _, expires_at, _ = self._entries[entry_id]
+            if expires_at < now:
+                self._remove(entry_id)
+                continue
+            similarity = jaccard(items, entry_items)
+            if best_similarity is None or similarity > best_similarity:
+                best_id, best_similarity = entry_id, similarity
+
+        if best_id is None or best_similarity < self.threshold:
+            self.counters["misses"] += 1
+            return None, best_similarity
+        self._entries.move_to_end(best_id)
+        self.counters["hits"] += 1
+        return self._entries[best_id][4], best_similarity
+
+    def store(self, scope: str, text: str, value) -> None:
+        items = shingles(text, self.ngram)
+        signature = self.hasher.signature(items)
+        if not signature:
+            return
+        entry_id = self._next_id
+        self._next_id += 1
+        band_keys = self._band_keys(scope, signature)
+        self._entries[entry_id] = (scope, items, band_keys, time.monotonic() + self.ttl, value)
+        for key in band_keys:
+            self._buckets.setdefault(key, set()).add(entry_id)
+        self.counters["stores"] += 1
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.counters["evictions"] += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._buckets.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict:
+        hits, misses = self.counters["hits"], self.counters["misses"]
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "buckets": len(self._buckets),
+            "threshold": self.threshold,
+            **self.counters,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        }
@@ -0,0 +1,97 @@
+# 변하지 않는 응답(메인 페이지, 고정 목록)을 미리 렌더링·압축해 두고 ETag로 조건부 응답
+import gzip
+import hashlib
+from typing import Dict, Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    import brotli  # 선택 의존성 (pip install brotli)
+except ImportError:
+    brotli = None
+
+# 이보다 작은 본문은 압축해도 이득이 거의 없음
+MIN_COMPRESS_BYTES = 512
+
+# 클라이언트가 둘 다 받으면 br을 우선
+ENCODING_PREFERENCE = ("br", "gzip")
+
+
+def accepted_encodings(header: Optional[str]) -> set:
+    """Accept-Encoding에서 q=0이 아닌 인코딩 목록"""
+    accepted = set()
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name)
+    return accepted
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """If-None-Match 비교 (약한 비교라 W/ 접두사는 무시)"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+class PrecompressedAsset:
+    """본문과 압축본을 한 번만 만들어 두고 요청마다 고르기만 하는 응답
+
+    인코딩마다 바이트가 다르므로 ETag도 인코딩별로 따로 둡니다 (강한 ETag).
+    """
+
+    def __init__(self, body: bytes, media_type: str, cache_control: str):
+        self.media_type = media_type
+        self.cache_control = cache_control
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.variants: Dict[str, bytes] = {"identity": body}
+        if len(body) >= MIN_COMPRESS_BYTES:
+            self.variants["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.variants["br"] = brotli.compress(body)
+        self.etags = {
+            encoding: f'"{digest}"' if encoding == "identity" else f'"{digest}-{encoding}"'
+            for encoding in self.variants
+        }
+        self.stats = {"full": 0, "not_modified": 0}
+
+    def choose_encoding(self, accept_encoding: Optional[str]) -> str:
+        accepted = accepted_encodings(accept_encoding)
+        for encoding in ENCODING_PREFERENCE:
+            if encoding in self.variants and (encoding in accepted or "*" in accepted):
+                return encoding
+        return "identity"
+
+    def response(self, request: Request) -> Response:
+        encoding = self.choose_encoding(request.headers.get("accept-encoding"))
+        headers = {
+            "ETag": self.etags[encoding],
+            "Cache-Control": self.cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if etag_matches(request.headers.get("if-none-match"), self.etags[encoding]):
+            self.stats["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        self.stats["full"] += 1
+        return Response(self.variants[encoding], media_type=self.media_type, headers=headers)
+
+    def info(self) -> Dict:
+        return {
+            "etag": self.etags["identity"],
+            "sizes": {encoding: len(body) for encoding, body in self.variants.items()},
+            **self.stats,
+        }
@@ -0,0 +1,1572 @@
+# 저장소 계층: 엔드포인트는 딕셔너리 대신 Repository 인터페이스를 사용합니다
+import heapq
+import itertools
+import json
+import math
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from records import ActivityRecord, ChatRecord, decode_timestamp
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+def activity_matches(record: ActivityRecord, since: Optional[str], until: Optional[str], category: Optional[str]) -> bool:
+    """timestamp 문자열이 [since, until) 범위이고 카테고리가 같은지 (None인 조건은 무시)"""
+    if category is not None and record.category != category:
+        return False
+    timestamp = decode_timestamp(record.timestamp) or ""
+    return (since is None or timestamp >= since) and (until is None or timestamp < until)
+
+
+class ChatMemory:
+    """사용자별 채팅 메모리
+
+    최근 메시지는 크기가 고정된 ring buffer에 보관하고, 밀려난 오래된 메시지는
+    요약 대기열(pending)에 모았다가 백그라운드에서 하나의 요약문으로 합칩니다.
+    """
+
+    def __init__(self, max_messages: int):
+        self.messages: deque = deque(maxlen=max_messages)
+        self.pending: List[ChatRecord] = []
+        self.summary = ""
+        self.summarizing = False
+
+    def append(self, message: ChatRecord) -> Optional[ChatRecord]:
+        """메시지를 추가하고, ring buffer에서 밀려난 메시지가 있으면 반환"""
+        evicted = None
+        if len(self.messages) == self.messages.maxlen:
+            evicted = self.messages[0]
+            self.pending.append(evicted)
+            # 요약이 계속 실패해도 대기열이 무한히 커지지 않도록 제한
+            if len(self.pending) > self.messages.maxlen:
+                del self.pending[0]
+        self.messages.append(message)
+        return evicted
+
+    def recent(self, count: int) -> List[ChatRecord]:
+        start = max(0, len(self.messages) - count)
+        return list(itertools.islice(self.messages, start, None))
+
+    def needs_summary(self, batch_size: int) -> bool:
+        return not self.summarizing and len(self.pending) >= batch_size
+
+    def start_summary(self) -> bool:
+        """요약을 맡으면 True (이미 요약 중이면 False), 끝나면 summarizing = False로 해제"""
+        if self.summarizing:
+            return False
+        self.summarizing = True
+        return True
+
+    def clear(self) -> None:
+        self.messages.clear()
+        self.pending = []
+        self.summary = ""
+
+
+class EmailTaken(Exception):
+    """다른 사용자가 이미 쓰고 있는 이메일로 가입/변경하려는 경우"""
+
+
+class StorageWriteError(Exception):
+    """write-behind 큐의 쓰기를 커밋하지 못한 경우 (SQLiteRepository.flush에서 발생)"""
+
+
+class Repository:
+    """저장소 인터페이스 (메모리/SQLite 구현이 같은 메서드를 제공)
+
+    활동과 채팅 메시지는 records 모듈의 레코드 객체로 주고받고, JSON 형태는 직렬화할 때만 만듭니다.
+    """
+
+    # 사용자
+    def new_user_id(self) -> str:
+        """워커가 여러 개여도 겹치지 않는 사용자 id"""
+        return f"user_{int(time.time())}_{uuid.uuid4().hex[:12]}"
+
+    def add_user(self, user: Dict) -> None:
+        """이메일이 이미 등록되어 있으면 EmailTaken"""
+        raise NotImplementedError
+
+    def get_user(self, user_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def get_user_by_email(self, email: str) -> Optional[Dict]:
+        """정규화된 이메일로 사용자 조회"""
+        raise NotImplementedError
+
+    def update_user(self, user_id: str, changes: Dict) -> Dict:
+        """사용자 정보 변경 (이메일 인덱스도 함께 갱신) 후 변경된 사용자 반환"""
+        raise NotImplementedError
+
+    def iter_users(self) -> Iterator[Dict]:
+        raise NotImplementedError
+
+    def scan_users(self, cursor: int, limit: int) -> List[Tuple[int, Dict]]:
+        """가입 순서로 cursor 다음의 사용자 최대 limit명을 (다음 cursor, 사용자)로 반환 (처음은 cursor=0)"""
+        raise NotImplementedError
+
+    def count_users(self) -> int:
+        raise NotImplementedError
+
+    # 토큰 (만료 시각은 epoch 초)
+    def add_token(self, token: str, user_id: str, expires_at: float) -> None:
+        raise NotImplementedError
+
+    def get_token(self, token: str) -> Optional[Tuple[str, float]]:
+        """(user_id, expires_at) 반환, 없으면 None"""
+        raise NotImplementedError
+
+    def refresh_token(self, token: str, expires_at: float) -> None:
+        raise NotImplementedError
+
+    def delete_token(self, token: str) -> None:
+        raise NotImplementedError
+
+    def user_tokens(self, user_id: str) -> List[str]:
+        """사용자의 유효 토큰 목록 (오래된 순)"""
+        raise NotImplementedError
+
+    def purge_expired_tokens(self, now: float, limit: int) -> int:
+        """만료 시각 순으로 최대 limit개의 만료 토큰을 삭제하고 삭제 개수 반환"""
+        raise NotImplementedError
+
+    def count_tokens(self) -> int:
+        raise NotImplementedError
+
+    # 활동 기록
+    def add_activity(self, user_id: str, record: ActivityRecord) -> None:
+        raise NotImplementedError
+
+    def add_activities(self, user_id: str, records: List[ActivityRecord]) -> None:
+        """여러 활동을 한 번에 추가 (백엔드가 한 번의 쓰기로 묶을 수 있으면 재정의)"""
+        for record in records:
+            self.add_activity(user_id, record)
+
+    def get_activities(self, user_id: str) -> List[ActivityRecord]:
+        raise NotImplementedError
+
+    def scan_activities(
+        self,
+        user_id: str,
+        after: int,
+        limit: int,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        category: Optional[str] = None,
+    ) -> List[Tuple[int, ActivityRecord]]:
+        """저장 순서로 위치 after 다음의 활동 중 조건에 맞는 것을 최대 limit개 (위치, 활동)로 반환
+
+        위치는 다음 호출의 after로 쓰는 재개 키이고 처음은 after=0, 빈 목록이면 끝입니다.
+        since/until은 timestamp 문자열 범위 [since, until)입니다.
+        """
+        activities = self.get_activities(user_id)
+        matched = [(index + 1, record) for index, record in enumerate(activities[after:], after)
+                   if activity_matches(record, since, until, category)]
+        return matched[:limit]
+
+    def count_user_activities(self, user_id: str) -> int:
+        """사용자의 활동 수 (다른 프로세스의 쓰기를 감지하는 데 사용)"""
+        return len(self.get_activities(user_id))
+
+    def iter_activities(self) -> Iterator[Tuple[str, List[ActivityRecord]]]:
+        """(user_id, 활동 목록) 순회"""
+        raise NotImplementedError
+
+    def count_activities(self) -> int:
+        raise NotImplementedError
+
+    # 채팅
+    def next_message_id(self) -> int:
+        """단조 증가하는 채팅 메시지 id 발급"""
+        raise NotImplementedError
+
+    def chat_memory(self, user_id: str) -> ChatMemory:
+        raise NotImplementedError
+
+    def append_chat_message(self, user_id: str, message: ChatRecord) -> None:
+        raise NotImplementedError
+
+    def count_chat_messages(self) -> int:
+        """보관 중인 전체 채팅 메시지 수 (증분 카운터)"""
+        raise NotImplementedError
+
+    def save_chat_summary(self, user_id: str, summary: str) -> None:
+        raise NotImplementedError
+
+    def trim_chat_pending(self, user_id: str, message_ids: List[int]) -> None:
+        """요약에 반영된 메시지만 id로 골라 요약 대기열에서 제거
+
+        요약하는 동안 대기열 상한으로 앞쪽이 잘리거나 새 메시지가 밀려 들어와도 요약하지 않은 메시지는 남습니다.
+        """
+        summarized = set(message_ids)
+        memory = self.chat_memory(user_id)
+        memory.pending[:] = [message for message in memory.pending if message.id not in summarized]
+
+    def clear_chat(self, user_id: str) -> None:
+        raise NotImplementedError
+
+    # 선택된 습관
+    def get_selected_habit(self, user_id: str) -> Dict:
+        raise NotImplementedError
+
+    def set_selected_habit(self, user_id: str, habit: Dict) -> None:
+        raise NotImplementedError
+
+    # 관리
+    def stats(self) -> Dict:
+        """/api/status에 보여줄 저장소 상태"""
+        return {}
+
+    def reset(self) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryRepository(Repository):
+    """프로세스 메모리(딕셔너리) 저장소 - 재시작하면 데이터가 사라집니다"""
+
+    def __init__(self, chat_max_messages: int):
+        self.chat_max_messages = chat_max_messages
+        self.users_db = {}  # {user_id: user_data}
+        self.user_order = []  # 가입 순서 (scan_users 커서용)
+        self.email_index = {}  # {normalized_email: user_id}
+        self.tokens_db = {}  # {token: (user_id, expires_at)}
+        self.token_expiry_heap = []  # [(expires_at, token)] 만료 순 힙 (갱신 전 항목은 지연 삭제)
+        self.user_token_index = {}  # {user_id: {token: None}} 발급 순서 유지
+        self.user_activities = {}  # {user_id: [ActivityRecord]}
+        self.user_chat_history = {}  # {user_id: ChatMemory} (메시지는 ChatRecord)
+        self.user_selected_habits = {}  # {user_id: selected_habit_data}
+        self.message_ids = itertools.count(1)
+        self.activity_count = 0
+        self.chat_message_count = 0
+
+    def add_user(self, user: Dict) -> None:
+        user_id = user["id"]
+        if user["email"] in self.email_index:
+            raise EmailTaken(user["email"])
+        self.users_db[user_id] = user
+        self.user_order.append(user_id)
+        self.email_index[user["email"]] = user_id
+        self.user_activities[user_id] = []
+        self.user_chat_history[user_id] = ChatMemory(self.chat_max_messages)
+        self.user_selected_habits[user_id] = {}
+
+    def get_user(self, user_id: str) -> Optional[Dict]:
+        return self.users_db.get(user_id)
+
+    def get_user_by_email(self, email: str) -> Optional[Dict]:
+        user_id = self.email_index.get(email)
+        return self.users_db.get(user_id) if user_id else None
+
+    def update_user(self, user_id: str, changes: Dict) -> Dict:
+        user = self.users_db[user_id]
+        if "email" in changes and changes["email"] != user["email"]:
+            if changes["email"] in self.email_index:
+                raise EmailTaken(changes["email"])
+            self.email_index.pop(user["email"], None)
+            self.email_index[changes["email"]] = user_id
+        user.update(changes)
+        return user
+
+    def iter_users(self) -> Iterator[Dict]:
+        return iter(list(self.users_db.values()))
+
+    def scan_users(self, cursor: int, limit: int) -> List[Tuple[int, Dict]]:
+        user_ids = self.user_order[cursor:cursor + limit]
+        return [(cursor + i + 1, self.users_db[user_id]) for i, user_id in enumerate(user_ids)]
+
+    def count_users(self) -> int:
+        return len(self.users_db)
+
+    def add_token(self, token: str, user_id: str, expires_at: float) -> None:
+        self.tokens_db[token] = (user_id, expires_at)
+        self.user_token_index.setdefault(user_id, {})[token] = None
+        self._push_expiry(expires_at, token)
+
+    def get_token(self, token: str) -> Optional[Tuple[str, float]]:
+        return self.tokens_db.get(token)
+
+    def refresh_token(self, token: str, expires_at: float) -> None:
+        entry = self.tokens_db.get(token)
+        if entry is None:
+            return
+        self.tokens_db[token] = (entry[0], expires_at)
+        self._push_expiry(expires_at, token)
+
+    def _push_expiry(self, expires_at: float, token: str) -> None:
+        heapq.heappush(self.token_expiry_heap, (expires_at, token))
+        # 갱신으로 남은 옛 항목이 너무 많아지면 힙을 다시 구성 (분할 상환 O(1))
+        if len(self.token_expiry_heap) > 2 * len(self.tokens_db) + 64:
+            self.token_expiry_heap = [(entry[1], tok) for tok, entry in self.tokens_db.items()]
+            heapq.heapify(self.token_expiry_heap)
+
+    def delete_token(self, token: str) -> None:
+        entry = self.tokens_db.pop(token, None)
+        if entry is None:
+            return
+        user_tokens = self.user_token_index.get(entry[0])
+        if user_tokens is not None:
+            user_tokens.pop(token, None)
+            if not user_tokens:
+                del self.user_token_index[entry[0]]
+
+    def user_tokens(self, user_id: str) -> List[str]:
+        return list(self.user_token_index.get(user_id, ()))
+
+    def purge_expired_tokens(self, now: float, limit: int) -> int:
+        removed = 0
+        heap = self.token_expiry_heap
+        while heap and heap[0][0] <= now and removed < limit:
+            expires_at, token = heapq.heappop(heap)
+            entry = self.tokens_db.get(token)
+            # 갱신되었거나 이미 삭제된 토큰의 옛 항목은 건너뜀
+            if entry is not None and entry[1] == expires_at:
+                self.delete_token(token)
+                removed += 1
+        return removed
+
+    def count_tokens(self) -> int:
+        return len(self.tokens_db)
+
+    def add_activity(self, user_id: str, record: ActivityRecord) -> None:
+        self.user_activities.setdefault(user_id, []).append(record)
+        self.activity_count += 1
+
+    def add_activities(self, user_id: str, records: List[ActivityRecord]) -> None:
+        self.user_activities.setdefault(user_id, []).extend(records)
+        self.activity_count += len(records)
+
+    def get_activities(self, user_id: str) -> List[ActivityRecord]:
+        return self.user_activities.get(user_id, [])
+
+    def scan_activities(
+        self,
+        user_id: str,
+        after: int,
+        limit: int,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        category: Optional[str] = None,
+    ) -> List[Tuple[int, ActivityRecord]]:
+        activities = self.user_activities.get(user_id, [])
+        matched = []
+        for index in range(after, len(activities)):
+            if activity_matches(activities[index], since, until, category):
+                matched.append((index + 1, activities[index]))
+                if len(matched) >= limit:
+                    break
+        return matched
+
+    def count_user_activities(self, user_id: str) -> int:
+        return len(self.user_activities.get(user_id, ()))
+
+    def iter_activities(self) -> Iterator[Tuple[str, List[ActivityRecord]]]:
+        return iter(list(self.user_activities.items()))
+
+    def count_activities(self) -> int:
+        return self.activity_count
+
+    def next_message_id(self) -> int:
+        return next(self.message_ids)
+
+    def chat_memory(self, user_id: str) -> ChatMemory:
+        memory = self.user_chat_history.get(user_id)
+        if memory is None:
+            memory = self.user_chat_history[user_id] = ChatMemory(self.chat_max_messages)
+        return memory
+
+    def append_chat_message(self, user_id: str, message: ChatRecord) -> None:
+        if self.chat_memory(user_id).append(message) is None:
+            self.chat_message_count += 1
+
+    def count_chat_messages(self) -> int:
+        return self.chat_message_count
+
+    def save_chat_summary(self, user_id: str, summary: str) -> None:
+        self.chat_memory(user_id).summary = summary
+
+    def clear_chat(self, user_id: str) -> None:
+        memory = self.chat_memory(user_id)
+        self.chat_message_count -= len(memory.messages)
+        memory.clear()
+
+    def get_selected_habit(self, user_id: str) -> Dict:
+        return self.user_selected_habits.get(user_id, {})
+
+    def set_selected_habit(self, user_id: str, habit: Dict) -> None:
+        self.user_selected_habits[user_id] = habit
+
+    def reset(self) -> None:
+        self.users_db.clear()
+        self.user_order.clear()
+        self.email_index.clear()
+        self.tokens_db.clear()
+        self.token_expiry_heap.clear()
+        self.user_token_index.clear()
+        self.user_activities.clear()
+        self.user_chat_history.clear()
+        self.user_selected_habits.clear()
+        self.activity_count = 0
+        self.chat_message_count = 0
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    email TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS tokens (
+    token TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    created_at REAL NOT NULL DEFAULT 0,
+    expires_at REAL NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS activities (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    timestamp TEXT,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS chat_messages (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS chat_summaries (
+    user_id TEXT PRIMARY KEY,
+    summary TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS selected_habits (
+    user_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+"""
+
+# 컬럼 추가 마이그레이션 후에 만들어야 하는 인덱스
+SQLITE_INDEXES = """
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email ON users(email);
+CREATE INDEX IF NOT EXISTS idx_tokens_user ON tokens(user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_tokens_expiry ON tokens(expires_at);
+CREATE INDEX IF NOT EXISTS idx_activities_user_time ON activities(user_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_chat_messages_user ON chat_messages(user_id, id);
+"""
+
+# 이전 버전 데이터베이스에 없는 컬럼 (테이블, 컬럼, 정의)
+SQLITE_MIGRATIONS = [
+    ("tokens", "created_at", "REAL NOT NULL DEFAULT 0"),
+    # 만료 시각이 없던 토큰은 0으로 채워져 다음 정리 때 삭제됩니다
+    ("tokens", "expires_at", "REAL NOT NULL DEFAULT 0"),
+]
+
+_STOP = object()
+
+
+class SQLiteRepository(Repository):
+    """SQLite(WAL) 저장소
+
+    쓰기는 write-behind 큐에 넣고 전용 스레드가 여러 건을 한 트랜잭션으로 묶어
+    커밋하므로 요청 처리 중에 fsync를 기다리지 않습니다. 아직 커밋되지 않은
+    쓰기는 오버레이(_pending_*)에 보관해 바로 다음 읽기에서도 보이게 합니다.
+    시작 시에는 카운터와 id 시퀀스만 읽고 데이터 전체를 메모리에 올리지 않습니다.
+
+    활동/메시지 id는 시작 시 MAX(id)에서 이어지는 프로세스 내 카운터로 미리 발급하므로
+    한 DB 파일에는 한 프로세스만 쓸 수 있습니다. `<path>.lock`에 배타 잠금을 걸어 두 번째
+    프로세스는 시작할 때 실패합니다 (여러 워커는 STORAGE_BACKEND=redis 사용).
+    커밋에 실패한 쓰기는 오버레이에 남겨 계속 보이게 하고, flush()가 StorageWriteError로 알립니다.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        chat_max_messages: int,
+        chat_cache_users: int = 10000,
+        queue_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 0.05,
+    ):
+        self.path = path
+        self.chat_max_messages = chat_max_messages
+        self.chat_cache_users = chat_cache_users
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._seq = itertools.count(1)
+        self._lock_file = None
+        self._acquire_writer_lock()
+
+        # 커밋하지 못한 쓰기 (오버레이에 남아 있음)
+        self._failed: List[tuple] = []
+        self.last_write_error: Optional[str] = None
+
+        # 아직 커밋되지 않은 쓰기: {(table, key): (seq, value)} / {(table, user_id): [(seq, id, row)]}
+        self._pending_kv: Dict[Tuple[str, str], Tuple[int, object]] = {}
+        self._pending_rows: Dict[Tuple[str, str], List[Tuple[int, int, Dict]]] = {}
+
+        # 활성 사용자의 채팅 메모리만 LRU로 보관
+        self._chat_cache: "OrderedDict[str, ChatMemory]" = OrderedDict()
+
+        conn = self._reader()
+        conn.executescript(SQLITE_SCHEMA)
+        for table, column, definition in SQLITE_MIGRATIONS:
+            columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if column not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        conn.executescript(SQLITE_INDEXES)
+        self._counts = {
+            "users": conn.execute("SELECT COUNT(*) FROM users").fetchone()[0],
+            "tokens": conn.execute("SELECT COUNT(*) FROM tokens").fetchone()[0],
+            "activities": conn.execute("SELECT COUNT(*) FROM activities").fetchone()[0],
+            # ring buffer 밖의 요약 대기 메시지는 세지 않음
+            "chat_messages": conn.execute(
+                "SELECT COALESCE(SUM(MIN(n, ?)), 0) FROM (SELECT COUNT(*) AS n FROM chat_messages GROUP BY user_id)",
+                (chat_max_messages,)
+            ).fetchone()[0],
+        }
+        self._message_ids = itertools.count(
+            (conn.execute("SELECT MAX(id) FROM chat_messages").fetchone()[0] or 0) + 1
+        )
+        self._activity_ids = itertools.count(
+            (conn.execute("SELECT MAX(id) FROM activities").fetchone()[0] or 0) + 1
+        )
+
+        self._writer = threading.Thread(target=self._writer_loop, name="sqlite-writer", daemon=True)
+        self._writer.start()
+
+    # 연결 관리
+    def _acquire_writer_lock(self) -> None:
+        """이 DB 파일의 유일한 쓰기 프로세스가 되도록 배타 잠금 (fcntl이 없는 플랫폼에서는 생략)"""
+        if fcntl is None or self.path == ":memory:":
+            return
+        lock_file = open(self.path + ".lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError as e:
+            lock_file.close()
+            raise RuntimeError(
+                f"{self.path}는 다른 프로세스가 사용 중입니다. SQLite 저장소는 단일 프로세스 전용입니다 "
+                "(여러 워커는 STORAGE_BACKEND=redis 사용)"
+            ) from e
+        self._lock_file = lock_file
+
+    def _release_writer_lock(self) -> None:
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL 모드에서는 NORMAL로도 프로세스 크래시에 안전합니다
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=OFF")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    # write-behind 큐
+    def _ensure_writer(self) -> None:
+        """close() 이후 다시 쓰기가 들어오면 writer 스레드를 새로 시작"""
+        if not self._writer.is_alive():
+            if self._lock_file is None:
+                self._acquire_writer_lock()
+            self._writer = threading.Thread(target=self._writer_loop, name="sqlite-writer", daemon=True)
+            self._writer.start()
+
+    def _enqueue(self, statements: List[Tuple[str, tuple]], kv: Dict = None, rows: List[Tuple[tuple, int, object]] = None) -> None:
+        """SQL 문장들을 큐에 넣고, 커밋 전까지 보일 오버레이를 기록 (rows는 (키, 행 id, 행) 목록)"""
+        seq = next(self._seq)
+        kv_keys = []
+        row_keys = []
+        with self._lock:
+            for key, value in (kv or {}).items():
+                self._pending_kv[key] = (seq, value)
+                kv_keys.append(key)
+            for key, row_id, row in rows or ():
+                self._pending_rows.setdefault(key, []).append((seq, row_id, row))
+                row_keys.append(key)
+        self._ensure_writer()
+        self._queue.put((seq, statements, kv_keys, row_keys))
+
+    def _release(self, ops: List[tuple]) -> None:
+        """커밋된 쓰기를 오버레이에서 제거 (그 사이 더 새로운 쓰기가 있으면 유지)"""
+        with self._lock:
+            for seq, _, kv_keys, row_keys in ops:
+                for key in kv_keys:
+                    entry = self._pending_kv.get(key)
+                    if entry is not None and entry[0] <= seq:
+                        del self._pending_kv[key]
+                for key in row_keys:
+                    rows = self._pending_rows.get(key)
+                    if rows is None:
+                        continue
+                    # 앞서 실패해 남아 있는 행은 유지하도록 이 쓰기의 행만 제거
+                    rows[:] = [item for item in rows if item[0] != seq]
+                    if not rows:
+                        del self._pending_rows[key]
+
+    def _writer_loop(self) -> None:
+        conn = self._connect()
+        stop = False
+        while not stop:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=self.flush_interval))
+                except queue.Empty:
+                    break
+
+            ops = [op for op in batch if op is not _STOP]
+            stop = len(ops) != len(batch)
+            committed = ops
+            try:
+                with conn:
+                    for _, statements, _, _ in ops:
+                        for sql, params in statements:
+                            conn.execute(sql, params)
+            except sqlite3.Error:
+                # 한 건의 오류로 묶음 전체가 실패하지 않도록 개별 트랜잭션으로 재시도
+                committed = []
+                for op in ops:
+                    try:
+                        with conn:
+                            for sql, params in op[1]:
+                                conn.execute(sql, params)
+                        committed.append(op)
+                    except sqlite3.Error as op_error:
+                        # 실패한 쓰기는 오버레이에서 지우지 않고 flush()에서 오류로 알림
+                        with self._lock:
+                            self._failed.append(op)
+                            self.last_write_error = str(op_error)
+
+            self._release(committed)
+            for _ in batch:
+                self._queue.task_done()
+        conn.close()
+
+    def flush(self) -> None:
+        """큐에 쌓인 쓰기가 모두 처리될 때까지 대기 (커밋하지 못한 쓰기가 있으면 StorageWriteError)"""
+        self._queue.join()
+        with self._lock:
+            failed = len(self._failed)
+        if failed:
+            raise StorageWriteError(f"SQLite 쓰기 {failed}건을 커밋하지 못했습니다: {self.last_write_error}")
+
+    def _pending_value(self, table: str, key: str):
+        with self._lock:
+            return self._pending_kv.get((table, key))
+
+    def _pending_snapshot(self, table: str, user_id: str) -> List[Tuple[int, int, object]]:
+        with self._lock:
+            return list(self._pending_rows.get((table, user_id), ()))
+
+    def _read_rows(self, table: str, user_id: str, sql: str, params: tuple, record_type) -> Dict[int, object]:
+        """SELECT (id, data) 결과와 아직 커밋되지 않은 행을 {id: 레코드}로 합침
+
+        오버레이를 SELECT보다 먼저 복사해야 그 사이 커밋되어 오버레이에서 빠진 행도 DB 쪽에서 보입니다.
+        같은 id는 DB 행을 사용합니다.
+        """
+        pending = self._pending_snapshot(table, user_id)
+        rows = self._reader().execute(sql, params).fetchall()
+        merged = {row_id: row for _, row_id, row in pending}
+        merged.update((row_id, record_type.from_dict(json.loads(data))) for row_id, data in rows)
+        return merged
+
+    # 사용자
+    def add_user(self, user: Dict) -> None:
+        # 쓰기는 이 프로세스의 큐를 거치므로 확인과 큐 등록 사이에 다른 가입이 끼어들지 않음 (이벤트 루프 안에서 호출)
+        if self.get_user_by_email(user["email"]) is not None:
+            raise EmailTaken(user["email"])
+        self._enqueue(
+            [("INSERT INTO users (id, email, data) VALUES (?, ?, ?)", (user["id"], user["email"], json.dumps(user, ensure_ascii=False)))],
+            kv={("users", user["id"]): dict(user), ("email", user["email"]): user["id"]},
+        )
+        self._counts["users"] += 1
+
+    def get_user(self, user_id: str) -> Optional[Dict]:
+        pending = self._pending_value("users", user_id)
+        if pending is not None:
+            return dict(pending[1]) if pending[1] is not None else None
+        row = self._reader().execute("SELECT data FROM users WHERE id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_user_by_email(self, email: str) -> Optional[Dict]:
+        pending = self._pending_value("email", email)
+        if pending is not None:
+            return self.get_user(pending[1]) if pending[1] is not None else None
+        row = self._reader().execute("SELECT id FROM users WHERE email = ?", (email,)).fetchone()
+        return self.get_user(row[0]) if row else None
+
+    def update_user(self, user_id: str, changes: Dict) -> Dict:
+        user = self.get_user(user_id)
+        old_email = user["email"]
+        user.update(changes)
+        kv = {("users", user_id): dict(user)}
+        if user["email"] != old_email:
+            kv[("email", old_email)] = None
+            kv[("email", user["email"])] = user_id
+        self._enqueue(
+            [("UPDATE users SET email = ?, data = ? WHERE id = ?", (user["email"], json.dumps(user, ensure_ascii=False), user_id))],
+            kv=kv,
+        )
+        return user
+
+    def iter_users(self) -> Iterator[Dict]:
+        with self._lock:
+            pending = {key: value for (table, key), (_, value) in self._pending_kv.items() if table == "users"}
+        for (data,) in self._reader().execute("SELECT data FROM users ORDER BY rowid"):
+            user = json.loads(data)
+            yield pending.pop(user["id"], user)
+        yield from (user for user in pending.values() if user is not None)
+
+    def scan_users(self, cursor: int, limit: int) -> List[Tuple[int, Dict]]:
+        # cursor는 rowid (아직 커밋되지 않은 신규 가입자는 커밋 후 다음 페이지에서 보임)
+        rows = self._reader().execute(
+            "SELECT rowid, id, data FROM users WHERE rowid > ? ORDER BY rowid LIMIT ?", (cursor, limit)
+        ).fetchall()
+        result = []
+        for rowid, user_id, data in rows:
+            pending = self._pending_value("users", user_id)
+            result.append((rowid, dict(pending[1]) if pending is not None else json.loads(data)))
+        return result
+
+    def count_users(self) -> int:
+        return self._counts["users"]
+
+    # 토큰
+    def add_token(self, token: str, user_id: str, expires_at: float) -> None:
+        created_at = time.time()
+        self._enqueue(
+            [("INSERT OR REPLACE INTO tokens (token, user_id, created_at, expires_at) VALUES (?, ?, ?, ?)",
+              (token, user_id, created_at, expires_at))],
+            kv={("tokens", token): (user_id, expires_at, created_at)},
+        )
+        self._counts["tokens"] += 1
+
+    def _token_entry(self, token: str) -> Optional[Tuple[str, float, float]]:
+        pending = self._pending_value("tokens", token)
+        if pending is not None:
+            return pending[1]
+        return self._reader().execute(
+            "SELECT user_id, expires_at, created_at FROM tokens WHERE token = ?", (token,)
+        ).fetchone()
+
+    def get_token(self, token: str) -> Optional[Tuple[str, float]]:
+        entry = self._token_entry(token)
+        return (entry[0], entry[1]) if entry else None
+
+    def refresh_token(self, token: str, expires_at: float) -> None:
+        entry = self._token_entry(token)
+        if entry is None:
+            return
+        self._enqueue(
+            [("UPDATE tokens SET expires_at = ? WHERE token = ?", (expires_at, token))],
+            kv={("tokens", token): (entry[0], expires_at, entry[2])},
+        )
+
+    def delete_token(self, token: str) -> None:
+        if self._token_entry(token) is None:
+            return
+        self._enqueue([("DELETE FROM tokens WHERE token = ?", (token,))], kv={("tokens", token): None})
+        self._counts["tokens"] -= 1
+
+    def user_tokens(self, user_id: str) -> List[str]:
+        with self._lock:
+            pending = {key: value for (table, key), (_, value) in self._pending_kv.items() if table == "tokens"}
+        created = {
+            token: created_at
+            for token, created_at in self._reader().execute(
+                "SELECT token, created_at FROM tokens WHERE user_id = ?", (user_id,)
+            )
+        }
+        for token, entry in pending.items():
+            if entry is None:
+                created.pop(token, None)
+            elif entry[0] == user_id:
+                created[token] = entry[2]
+        return sorted(created, key=created.get)
+
+    def purge_expired_tokens(self, now: float, limit: int) -> int:
+        # idx_tokens_expiry 인덱스로 만료된 앞부분만 읽음
+        rows = self._reader().execute(
+            "SELECT token FROM tokens WHERE expires_at <= ? ORDER BY expires_at LIMIT ?", (now, limit)
+        ).fetchall()
+        removed = 0
+        for (token,) in rows:
+            entry = self._token_entry(token)
+            if entry is not None and entry[1] <= now:
+                self.delete_token(token)
+                removed += 1
+        return removed
+
+    def count_tokens(self) -> int:
+        return self._counts["tokens"]
+
+    # 활동 기록
+    def add_activity(self, user_id: str, record: ActivityRecord) -> None:
+        activity_id = next(self._activity_ids)
+        self._enqueue(
+            [("INSERT INTO activities (id, user_id, timestamp, data) VALUES (?, ?, ?, ?)",
+              (activity_id, user_id, decode_timestamp(record.timestamp), json.dumps(record.to_dict(), ensure_ascii=False)))],
+            rows=[(("activities", user_id), activity_id, record)],
+        )
+        self._counts["activities"] += 1
+
+    def add_activities(self, user_id: str, records: List[ActivityRecord]) -> None:
+        # 큐 항목 하나로 넣어 같은 트랜잭션에서 커밋
+        if not records:
+            return
+        ids = [next(self._activity_ids) for _ in records]
+        self._enqueue(
+            [("INSERT INTO activities (id, user_id, timestamp, data) VALUES (?, ?, ?, ?)",
+              (activity_id, user_id, decode_timestamp(record.timestamp), json.dumps(record.to_dict(), ensure_ascii=False)))
+             for activity_id, record in zip(ids, records)],
+            rows=[(("activities", user_id), activity_id, record) for activity_id, record in zip(ids, records)],
+        )
+        self._counts["activities"] += len(records)
+
+    def get_activities(self, user_id: str) -> List[ActivityRecord]:
+        merged = self._read_rows("activities", user_id, "SELECT id, data FROM activities WHERE user_id = ?", (user_id,), ActivityRecord)
+        return [record for _, record in sorted(merged.items())]
+
+    def scan_activities(
+        self,
+        user_id: str,
+        after: int,
+        limit: int,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        category: Optional[str] = None,
+    ) -> List[Tuple[int, ActivityRecord]]:
+        # 위치는 활동 id, 조건은 (user_id, timestamp) 인덱스를 쓰는 쿼리로 넘김
+        sql = "SELECT id, data FROM activities WHERE user_id = ? AND id > ?"
+        params: list = [user_id, after]
+        if since is not None:
+            sql += " AND COALESCE(timestamp, '') >= ?"
+            params.append(since)
+        if until is not None:
+            sql += " AND COALESCE(timestamp, '') < ?"
+            params.append(until)
+        if category is not None:
+            sql += " AND json_extract(data, '$.category') = ?"
+            params.append(category)
+        pending = self._pending_snapshot("activities", user_id)
+        rows = self._reader().execute(sql + " ORDER BY id LIMIT ?", (*params, limit)).fetchall()
+        merged = {row_id: ActivityRecord.from_dict(json.loads(data)) for row_id, data in rows}
+        # 아직 커밋되지 않은 행도 같은 조건으로 합침 (DB에서 읽은 limit개보다 뒤의 id는 다음 호출에서)
+        last_id = max(merged) if len(merged) >= limit else None
+        for _, row_id, record in pending:
+            if row_id > after and (last_id is None or row_id < last_id) and activity_matches(record, since, until, category):
+                merged.setdefault(row_id, record)
+        return sorted(merged.items())[:limit]
+
+    def count_user_activities(self, user_id: str) -> int:
+        with self._lock:
+            pending_ids = {row_id for _, row_id, _ in self._pending_rows.get(("activities", user_id), ())}
+        conn = self._reader()
+        if not pending_ids:
+            return conn.execute("SELECT COUNT(*) FROM activities WHERE user_id = ?", (user_id,)).fetchone()[0]
+        # 오버레이에 남은 행 중 그 사이 커밋된 것은 두 번 세지 않음 (확인은 min(pending) 이후 id만)
+        committed = conn.execute("SELECT COUNT(*) FROM activities WHERE user_id = ?", (user_id,)).fetchone()[0]
+        overlap = sum(
+            1 for (row_id,) in conn.execute(
+                "SELECT id FROM activities WHERE user_id = ? AND id >= ?", (user_id, min(pending_ids))
+            ) if row_id in pending_ids
+        )
+        return committed + len(pending_ids) - overlap
+
+    def iter_activities(self) -> Iterator[Tuple[str, List[ActivityRecord]]]:
+        for (user_id,) in self._reader().execute("SELECT id FROM users ORDER BY rowid").fetchall():
+            yield user_id, self.get_activities(user_id)
+
+    def count_activities(self) -> int:
+        return self._counts["activities"]
+
+    # 채팅
+    def next_message_id(self) -> int:
+        return next(self._message_ids)
+
+    def chat_memory(self, user_id: str) -> ChatMemory:
+        memory = self._chat_cache.get(user_id)
+        if memory is not None:
+            self._chat_cache.move_to_end(user_id)
+            return memory
+
+        # 캐시에 없으면 최근 메시지, 그보다 앞의 요약 대기 메시지, 요약만 읽어 메모리 구성
+        merged = self._read_rows(
+            "chat_messages", user_id,
+            "SELECT id, data FROM chat_messages WHERE user_id = ? ORDER BY id DESC LIMIT ?", (user_id, 2 * self.chat_max_messages),
+            ChatRecord,
+        )
+        rows = [message for _, message in sorted(merged.items())]
+        memory = ChatMemory(self.chat_max_messages)
+        memory.messages.extend(rows[-self.chat_max_messages:])
+        memory.pending = rows[:-self.chat_max_messages]
+
+        pending = self._pending_value("chat_summaries", user_id)
+        if pending is not None:
+            memory.summary = pending[1] or ""
+        else:
+            row = self._reader().execute("SELECT summary FROM chat_summaries WHERE user_id = ?", (user_id,)).fetchone()
+            memory.summary = row[0] if row else ""
+
+        self._chat_cache[user_id] = memory
+        while len(self._chat_cache) > self.chat_cache_users:
+            self._chat_cache.popitem(last=False)
+        return memory
+
+    def append_chat_message(self, user_id: str, message: ChatRecord) -> None:
+        memory = self.chat_memory(user_id)
+        evicted = memory.append(message)
+        statements = [("INSERT INTO chat_messages (id, user_id, data) VALUES (?, ?, ?)",
+                       (message.id, user_id, json.dumps(message.to_dict(), ensure_ascii=False)))]
+        if evicted is not None:
+            # 밀려난 메시지는 요약에 반영될 때까지 요약 대기 메시지로 남기고, 대기열 상한을 넘어 버려진 것만 삭제
+            statements.append(("DELETE FROM chat_messages WHERE user_id = ? AND id < ?", (user_id, memory.pending[0].id)))
+        else:
+            self._counts["chat_messages"] += 1
+        self._enqueue(statements, rows=[(("chat_messages", user_id), message.id, message)])
+
+    def count_chat_messages(self) -> int:
+        return self._counts["chat_messages"]
+
+    def trim_chat_pending(self, user_id: str, message_ids: List[int]) -> None:
+        super().trim_chat_pending(user_id, message_ids)
+        summarized = set(message_ids)
+        if not summarized:
+            return
+        with self._lock:
+            rows = self._pending_rows.get(("chat_messages", user_id))
+            if rows is not None:
+                rows[:] = [item for item in rows if item[1] not in summarized]
+        self._enqueue(
+            [("DELETE FROM chat_messages WHERE user_id = ? AND id = ?", (user_id, message_id)) for message_id in sorted(summarized)]
+        )
+
+    def save_chat_summary(self, user_id: str, summary: str) -> None:
+        self.chat_memory(user_id).summary = summary
+        self._enqueue(
+            [("INSERT OR REPLACE INTO chat_summaries (user_id, summary) VALUES (?, ?)", (user_id, summary))],
+            kv={("chat_summaries", user_id): summary},
+        )
+
+    def clear_chat(self, user_id: str) -> None:
+        memory = self.chat_memory(user_id)
+        self._counts["chat_messages"] -= len(memory.messages)
+        memory.clear()
+        with self._lock:
+            self._pending_rows.pop(("chat_messages", user_id), None)
+        self._enqueue(
+            [("DELETE FROM chat_messages WHERE user_id = ?", (user_id,)),
+             ("DELETE FROM chat_summaries WHERE user_id = ?", (user_id,))],
+            kv={("chat_summaries", user_id): ""},
+        )
+
+    # 선택된 습관
+    def get_selected_habit(self, user_id: str) -> Dict:
+        pending = self._pending_value("selected_habits", user_id)
+        if pending is not None:
+            return pending[1]
+        row = self._reader().execute("SELECT data FROM selected_habits WHERE user_id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def set_selected_habit(self, user_id: str, habit: Dict) -> None:
+        self._enqueue(
+            [("INSERT OR REPLACE INTO selected_habits (user_id, data) VALUES (?, ?)", (user_id, json.dumps(habit, ensure_ascii=False)))],
+            kv={("selected_habits", user_id): habit},
+        )
+
+    # 관리
+    def stats(self) -> Dict:
+        with self._lock:
+            failed = len(self._failed)
+        return {"queued_writes": self._queue.qsize(), "failed_writes": failed, "last_write_error": self.last_write_error}
+
+    def reset(self) -> None:
+        self._queue.join()
+        conn = self._reader()
+        with conn:
+            for table in ("users", "tokens", "activities", "chat_messages", "chat_summaries", "selected_habits"):
+                conn.execute(f"DELETE FROM {table}")
+        with self._lock:
+            self._pending_kv.clear()
+            self._pending_rows.clear()
+            self._failed = []
+            self.last_write_error = None
+        self._chat_cache.clear()
+        self._counts = {"users": 0, "tokens": 0, "activities": 0, "chat_messages": 0}
+
+    def close(self) -> None:
+        """남은 쓰기를 모두 커밋하고 writer 스레드 종료"""
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+        self._release_writer_lock()
+        if self._failed:
+            print(f"SQLite 쓰기 {len(self._failed)}건을 커밋하지 못하고 종료합니다: {self.last_write_error}")
+
+
+class InProcessRedis:
+    """테스트/단일 프로세스용 Redis 대용품
+
+    RedisRepository가 쓰는 명령만 redis-py(decode_responses=True)와 같은 방식으로 구현합니다.
+    워커 간에 공유되지 않으므로 여러 워커에서는 실제 Redis를 사용해야 합니다.
+    """
+
+    def __init__(self):
+        self._data: Dict[str, object] = {}
+        self._expires: Dict[str, float] = {}
+        self._lock = threading.RLock()
+
+    def _live(self, key: str):
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at <= time.time():
+            self._data.pop(key, None)
+            del self._expires[key]
+        return self._data.get(key)
+
+    # 문자열
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._live(key)
+
+    def mget(self, keys: List[str]) -> List[Optional[str]]:
+        with self._lock:
+            return [self._live(key) for key in keys]
+
+    def set(self, key: str, value: str, nx: bool = False, ex: Optional[int] = None) -> Optional[bool]:
+        with self._lock:
+            if nx and self._live(key) is not None:
+                return None
+            self._data[key] = str(value)
+            if ex is not None:
+                self._expires[key] = time.time() + ex
+            else:
+                self._expires.pop(key, None)
+            return True
+
+    def incrby(self, key: str, amount: int = 1) -> int:
+        with self._lock:
+            value = int(self._live(key) or 0) + amount
+            self._data[key] = str(value)
+            return value
+
+    def incr(self, key: str) -> int:
+        return self.incrby(key, 1)
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            removed = 0
+            for key in keys:
+                if self._live(key) is not None:
+                    removed += 1
+                self._data.pop(key, None)
+                self._expires.pop(key, None)
+            return removed
+
+    def expireat(self, key: str, when: int) -> bool:
+        with self._lock:
+            if self._live(key) is None:
+                return False
+            self._expires[key] = when
+            return True
+
+    def scan_iter(self, match: str) -> Iterator[str]:
+        prefix = match.rstrip("*")
+        with self._lock:
+            keys = [key for key in self._data if key.startswith(prefix)]
+        return iter(keys)
+
+    # 해시
+    def hset(self, key: str, mapping: Dict) -> int:
+        with self._lock:
+            data = self._live(key)
+            if data is None:
+                data = self._data[key] = {}
+            added = len(set(mapping) - set(data))
+            data.update({field: str(value) for field, value in mapping.items()})
+            return added
+
+    def hmget(self, key: str, fields: List[str]) -> List[Optional[str]]:
+        with self._lock:
+            data = self._live(key) or {}
+            return [data.get(field) for field in fields]
+
+    # 리스트
+    def rpush(self, key: str, *values: str) -> int:
+        with self._lock:
+            data = self._live(key)
+            if data is None:
+                data = self._data[key] = []
+            data.extend(values)
+            return len(data)
+
+    @staticmethod
+    def _slice(length: int, start: int, end: int) -> slice:
+        start = max(length + start, 0) if start < 0 else start
+        end = length + end if end < 0 else end
+        return slice(start, max(end + 1, start))
+
+    def llen(self, key: str) -> int:
+        with self._lock:
+            return len(self._live(key) or ())
+
+    def lrange(self, key: str, start: int, end: int) -> List[str]:
+        with self._lock:
+            data = self._live(key) or []
+            return list(data[self._slice(len(data), start, end)])
+
+    def lrem(self, key: str, count: int, value: str) -> int:
+        with self._lock:
+            data = self._live(key)
+            if data is None:
+                return 0
+            indexes = [i for i, item in enumerate(data) if item == value]
+            if count < 0:
+                indexes = indexes[::-1][:-count]
+            elif count > 0:
+                indexes = indexes[:count]
+            for i in sorted(indexes, reverse=True):
+                del data[i]
+            if not data:
+                self.delete(key)
+            return len(indexes)
+
+    def ltrim(self, key: str, start: int, end: int) -> bool:
+        with self._lock:
+            data = self._live(key)
+            if data is not None:
+                data[:] = data[self._slice(len(data), start, end)]
+                if not data:
+                    self.delete(key)
+            return True
+
+    # 정렬 집합
+    def zadd(self, key: str, mapping: Dict[str, float]) -> int:
+        with self._lock:
+            data = self._live(key)
+            if data is None:
+                data = self._data[key] = {}
+            added = len(set(mapping) - set(data))
+            data.update(mapping)
+            return added
+
+    def zrem(self, key: str, *members: str) -> int:
+        with self._lock:
+            data = self._live(key) or {}
+            removed = sum(1 for member in members if data.pop(member, None) is not None)
+            if not data:
+                self._data.pop(key, None)
+            return removed
+
+    def zcard(self, key: str) -> int:
+        with self._lock:
+            return len(self._live(key) or {})
+
+    def _sorted(self, key: str) -> List[str]:
+        data = self._live(key) or {}
+        return sorted(data, key=lambda member: (data[member], member))
+
+    def zrange(self, key: str, start: int, end: int) -> List[str]:
+        with self._lock:
+            members = self._sorted(key)
+            return members[self._slice(len(members), start, end)]
+
+    def zrangebyscore(self, key: str, min: float, max: float, start: int = 0, num: Optional[int] = None) -> List[str]:
+        with self._lock:
+            data = self._live(key) or {}
+            min_score = float("-inf") if min == "-inf" else float(min)
+            members = [member for member in self._sorted(key) if min_score <= data[member] <= float(max)]
+            return members[start:start + num] if num is not None else members[start:]
+
+    def pipeline(self, transaction: bool = True) -> "InProcessPipeline":
+        return InProcessPipeline(self)
+
+
+class InProcessPipeline:
+    """명령을 모았다가 execute()에서 한 번에 실행 (redis-py Pipeline과 같은 사용법)"""
+
+    def __init__(self, client: InProcessRedis):
+        self._client = client
+        self._commands: List[Tuple[str, tuple, Dict]] = []
+
+    def __getattr__(self, name: str):
+        def queue_command(*args, **kwargs):
+            self._commands.append((name, args, kwargs))
+            return self
+        return queue_command
+
+    def execute(self) -> List:
+        with self._client._lock:
+            results = [getattr(self._client, name)(*args, **kwargs) for name, args, kwargs in self._commands]
+        self._commands = []
+        return results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._commands = []
+
+
+class RedisChatMemory(ChatMemory):
+    """Redis에서 읽어 온 채팅 메모리 (요약 진행 여부는 워커 간 공유되는 잠금 키)
+
+    두 워커가 같은 대기 구간을 요약한 뒤 각각 trim_chat_pending을 하면 요약되지 않은 메시지까지
+    지워지므로, 잠금은 SET NX EX로 한 워커만 얻고 얻지 못하면 요약하지 않습니다.
+    """
+
+    def __init__(self, max_messages: int, client, lock_key: str, lock_seconds: int):
+        self._client = client
+        self._lock_key = lock_key
+        self._lock_seconds = lock_seconds
+        self._summarizing = False
+        self._owns_lock = False
+        super().__init__(max_messages)
+
+    @property
+    def summarizing(self) -> bool:
+        return self._summarizing
+
+    @summarizing.setter
+    def summarizing(self, value: bool) -> None:
+        # 잠금은 start_summary에서만 얻고, 여기서는 직접 얻은 잠금만 해제
+        if not value and self._owns_lock:
+            self._client.delete(self._lock_key)
+            self._owns_lock = False
+        self._summarizing = value
+
+    def start_summary(self) -> bool:
+        if self._summarizing or not self._client.set(self._lock_key, "1", nx=True, ex=self._lock_seconds):
+            return False
+        self._owns_lock = True
+        self._summarizing = True
+        return True
+
+
+class RedisRepository(Repository):
+    """Redis 저장소 - 여러 워커/레플리카가 사용자, 세션, 채팅, 선택한 습관을 공유
+
+    한 번의 요청에서 필요한 명령은 파이프라인으로 묶어 왕복 횟수를 줄이고, 토큰 조회는
+    워커별 짧은 TTL의 read-through 캐시를 거칩니다 (다른 워커의 로그아웃은 TTL 안에 반영).
+    토큰 키는 Redis 만료(EXPIREAT)도 걸어 두므로 정리 작업이 늦어도 만료된 토큰은 쓰이지 않습니다.
+    """
+
+    def __init__(
+        self,
+        client,
+        chat_max_messages: int,
+        prefix: str = "ah:",
+        token_cache_ttl: float = 2.0,
+        token_cache_size: int = 10000,
+        summary_lock_seconds: int = 120,
+    ):
+        self.client = client
+        self.chat_max_messages = chat_max_messages
+        self.prefix = prefix
+        self.token_cache_ttl = token_cache_ttl
+        self.token_cache_size = token_cache_size
+        self.summary_lock_seconds = summary_lock_seconds
+        # {token: (cached_at, (user_id, expires_at))}
+        self._token_cache: "OrderedDict[str, Tuple[float, Tuple[str, float]]]" = OrderedDict()
+
+    def _key(self, *parts: str) -> str:
+        return self.prefix + ":".join(parts)
+
+    # 사용자
+    def new_user_id(self) -> str:
+        return f"user_{int(time.time())}_{self.client.incr(self._key('seq', 'user'))}"
+
+    def add_user(self, user: Dict) -> None:
+        # 이메일을 먼저 선점 (동시에 같은 이메일로 가입하면 한 워커만 성공)
+        if not self.client.set(self._key("email", user["email"]), user["id"], nx=True):
+            raise EmailTaken(user["email"])
+        pipe = self.client.pipeline()
+        pipe.set(self._key("user", user["id"]), json.dumps(user, ensure_ascii=False))
+        pipe.rpush(self._key("users"), user["id"])
+        pipe.incr(self._key("count", "users"))
+        pipe.execute()
+
+    def get_user(self, user_id: str) -> Optional[Dict]:
+        data = self.client.get(self._key("user", user_id))
+        return json.loads(data) if data else None
+
+    def get_user_by_email(self, email: str) -> Optional[Dict]:
+        user_id = self.client.get(self._key("email", email))
+        return self.get_user(user_id) if user_id else None
+
+    def update_user(self, user_id: str, changes: Dict) -> Dict:
+        user = self.get_user(user_id)
+        old_email = user["email"]
+        user.update(changes)
+        if user["email"] != old_email and not self.client.set(self._key("email", user["email"]), user_id, nx=True):
+            raise EmailTaken(user["email"])
+        pipe = self.client.pipeline()
+        pipe.set(self._key("user", user_id), json.dumps(user, ensure_ascii=False))
+        if user["email"] != old_email:
+            pipe.delete(self._key("email", old_email))
+        pipe.execute()
+        return user
+
+    def iter_users(self) -> Iterator[Dict]:
+        user_ids = self.client.lrange(self._key("users"), 0, -1)
+        for start in range(0, len(user_ids), 500):
+            keys = [self._key("user", user_id) for user_id in user_ids[start:start + 500]]
+            for data in self.client.mget(keys):
+                if data:
+                    yield json.loads(data)
+
+    def scan_users(self, cursor: int, limit: int) -> List[Tuple[int, Dict]]:
+        user_ids = self.client.lrange(self._key("users"), cursor, cursor + limit - 1)
+        if not user_ids:
+            return []
+        users = self.client.mget([self._key("user", user_id) for user_id in user_ids])
+        return [(cursor + i + 1, json.loads(data)) for i, data in enumerate(users) if data]
+
+    def _count(self, name: str) -> int:
+        return int(self.client.get(self._key("count", name)) or 0)
+
+    def count_users(self) -> int:
+        return self._count("users")
+
+    # 토큰: token:{token} 해시 + 사용자별 발급 순서(user_tokens) + 만료 순서(token_expiry) 정렬 집합
+    def _expiry_member(self, user_id: str, token: str) -> str:
+        return f"{user_id}|{token}"
+
+    def _cache_token(self, token: str, entry: Optional[Tuple[str, float]]) -> None:
+        if entry is None:
+            self._token_cache.pop(token, None)
+            return
+        self._token_cache[token] = (time.monotonic(), entry)
+        self._token_cache.move_to_end(token)
+        while len(self._token_cache) > self.token_cache_size:
+            self._token_cache.popitem(last=False)
+
+    def add_token(self, token: str, user_id: str, expires_at: float) -> None:
+        key = self._key("token", token)
+        pipe = self.client.pipeline()
+        pipe.hset(key, mapping={"user_id": user_id, "expires_at": expires_at})
+        pipe.expireat(key, int(math.ceil(expires_at)))
+        pipe.zadd(self._key("user_tokens", user_id), {token: time.time()})
+        pipe.zadd(self._key("token_expiry"), {self._expiry_member(user_id, token): expires_at})
+        pipe.execute()
+        self._cache_token(token, (user_id, expires_at))
+
+    def get_token(self, token: str) -> Optional[Tuple[str, float]]:
+        cached = self._token_cache.get(token)
+        if cached is not None and time.monotonic() - cached[0] < self.token_cache_ttl:
+            return cached[1]
+        user_id, expires_at = self.client.hmget(self._key("token", token), ["user_id", "expires_at"])
+        entry = (user_id, float(expires_at)) if user_id is not None else None
+        self._cache_token(token, entry)
+        return entry
+
+    def refresh_token(self, token: str, expires_at: float) -> None:
+        entry = self.get_token(token)
+        if entry is None:
+            return
+        key = self._key("token", token)
+        pipe = self.client.pipeline()
+        pipe.hset(key, mapping={"expires_at": expires_at})
+        pipe.expireat(key, int(math.ceil(expires_at)))
+        pipe.zadd(self._key("token_expiry"), {self._expiry_member(entry[0], token): expires_at})
+        pipe.execute()
+        self._cache_token(token, (entry[0], expires_at))
+
+    def _remove_tokens(self, pairs: List[Tuple[str, str]]) -> None:
+        pipe = self.client.pipeline()
+        for user_id, token in pairs:
+            pipe.delete(self._key("token", token))
+            pipe.zrem(self._key("user_tokens", user_id), token)
+            pipe.zrem(self._key("token_expiry"), self._expiry_member(user_id, token))
+            self._token_cache.pop(token, None)
+        pipe.execute()
+
+    def delete_token(self, token: str) -> None:
+        self._token_cache.pop(token, None)
+        entry = self.get_token(token)
+        if entry is not None:
+            self._remove_tokens([(entry[0], token)])
+
+    def user_tokens(self, user_id: str) -> List[str]:
+        return self.client.zrange(self._key("user_tokens", user_id), 0, -1)
+
+    def purge_expired_tokens(self, now: float, limit: int) -> int:
+        members = self.client.zrangebyscore(self._key("token_expiry"), "-inf", now, start=0, num=limit)
+        pairs = [tuple(member.split("|", 1)) for member in members]
+        if pairs:
+            self._remove_tokens(pairs)
+        return len(pairs)
+
+    def count_tokens(self) -> int:
+        return self.client.zcard(self._key("token_expiry"))
+
+    # 활동 기록
+    def add_activity(self, user_id: str, record: ActivityRecord) -> None:
+        pipe = self.client.pipeline()
+        pipe.rpush(self._key("activities", user_id), json.dumps(record.to_dict(), ensure_ascii=False))
+        pipe.incr(self._key("count", "activities"))
+        pipe.execute()
+
+    def add_activities(self, user_id: str, records: List[ActivityRecord]) -> None:
+        if not records:
+            return
+        pipe = self.client.pipeline()
+        pipe.rpush(self._key("activities", user_id), *(json.dumps(record.to_dict(), ensure_ascii=False) for record in records))
+        pipe.incrby(self._key("count", "activities"), len(records))
+        pipe.execute()
+
+    def get_activities(self, user_id: str) -> List[ActivityRecord]:
+        return [ActivityRecord.from_dict(json.loads(data)) for data in self.client.lrange(self._key("activities", user_id), 0, -1)]
+
+    def count_user_activities(self, user_id: str) -> int:
+        return self.client.llen(self._key("activities", user_id))
+
+    def scan_activities(
+        self,
+        user_id: str,
+        after: int,
+        limit: int,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        category: Optional[str] = None,
+    ) -> List[Tuple[int, ActivityRecord]]:
+        # 리스트를 limit개씩 읽으며 거르므로 한 번에 메모리에 올리는 양은 limit개로 제한
+        key = self._key("activities", user_id)
+        matched = []
+        start = after
+        while len(matched) < limit:
+            chunk = self.client.lrange(key, start, start + limit - 1)
+            if not chunk:
+                break
+            for offset, data in enumerate(chunk):
+                record = ActivityRecord.from_dict(json.loads(data))
+                if activity_matches(record, since, until, category):
+                    matched.append((start + offset + 1, record))
+                    if len(matched) >= limit:
+                        break
+            start += len(chunk)
+        return matched
+
+    def iter_activities(self) -> Iterator[Tuple[str, List[ActivityRecord]]]:
+        for user_id in self.client.lrange(self._key("users"), 0, -1):
+            yield user_id, self.get_activities(user_id)
+
+    def count_activities(self) -> int:
+        return self._count("activities")
+
+    # 채팅: chat:{user_id} 리스트(최근 chat_max_messages개), chat_pending:{user_id} 요약 대기 리스트
+    def next_message_id(self) -> int:
+        # 워커가 여러 개여도 사용자별 메시지 id가 전송 순서대로 증가하도록 공유 시퀀스 사용
+        return self.client.incr(self._key("seq", "message"))
+
+    def chat_memory(self, user_id: str) -> ChatMemory:
+        pipe = self.client.pipeline()
+        pipe.lrange(self._key("chat", user_id), 0, -1)
+        pipe.lrange(self._key("chat_pending", user_id), 0, -1)
+        pipe.get(self._key("chat_summary", user_id))
+        pipe.get(self._key("chat_summarizing", user_id))
+        messages, pending, summary, summarizing = pipe.execute()
+
+        memory = RedisChatMemory(
+            self.chat_max_messages, self.client, self._key("chat_summarizing", user_id), self.summary_lock_seconds
+        )
+        memory.messages.extend(ChatRecord.from_dict(json.loads(data)) for data in messages)
+        memory.pending = [ChatRecord.from_dict(json.loads(data)) for data in pending]
+        memory.summary = summary or ""
+        memory._summarizing = summarizing is not None
+        return memory
+
+    def append_chat_message(self, user_id: str, message: ChatRecord) -> None:
+        key = self._key("chat", user_id)
+        keep = self.chat_max_messages
+        pipe = self.client.pipeline()
+        pipe.rpush(key, json.dumps(message.to_dict(), ensure_ascii=False))
+        pipe.lrange(key, 0, -(keep + 1))  # ring buffer에서 밀려날 메시지
+        pipe.ltrim(key, -keep, -1)
+        _, evicted, _ = pipe.execute()
+
+        pipe = self.client.pipeline()
+        if evicted:
+            pending_key = self._key("chat_pending", user_id)
+            pipe.rpush(pending_key, *evicted)
+            # 요약이 계속 실패해도 대기열이 무한히 커지지 않도록 제한
+            pipe.ltrim(pending_key, -keep, -1)
+        pipe.incrby(self._key("count", "chat_messages"), 1 - len(evicted))
+        pipe.execute()
+
+    def count_chat_messages(self) -> int:
+        return self._count("chat_messages")
+
+    def save_chat_summary(self, user_id: str, summary: str) -> None:
+        self.client.set(self._key("chat_summary", user_id), summary)
+
+    def trim_chat_pending(self, user_id: str, message_ids: List[int]) -> None:
+        # 앞에서 개수만큼 자르면 그 사이 상한으로 잘린 만큼 요약하지 않은 메시지가 지워지므로 id가 같은 항목만 제거
+        summarized = set(message_ids)
+        key = self._key("chat_pending", user_id)
+        pipe = self.client.pipeline()
+        for data in self.client.lrange(key, 0, -1):
+            if json.loads(data).get("id") in summarized:
+                pipe.lrem(key, 1, data)
+        pipe.execute()
+
+    def clear_chat(self, user_id: str) -> None:
+        removed = len(self.client.lrange(self._key("chat", user_id), 0, -1))
+        pipe = self.client.pipeline()
+        pipe.delete(self._key("chat", user_id), self._key("chat_pending", user_id), self._key("chat_summary", user_id))
+        pipe.incrby(self._key("count", "chat_messages"), -removed)
+        pipe.execute()
+
+    # 선택된 습관
+    def get_selected_habit(self, user_id: str) -> Dict:
+        data = self.client.get(self._key("habit", user_id))
+        return json.loads(data) if data else {}
+
+    def set_selected_habit(self, user_id: str, habit: Dict) -> None:
+        self.client.set(self._key("habit", user_id), json.dumps(habit, ensure_ascii=False))
+
+    # 관리
+    def reset(self) -> None:
+        keys = list(self.client.scan_iter(match=self.prefix + "*"))
+        for start in range(0, len(keys), 500):
+            self.client.delete(*keys[start:start + 500])
+        self._token_cache.clear()
+
+    def close(self) -> None:
+        close = getattr(self.client, "close", None)
+        if close is not None:
+            close()
+
+
+def create_redis_client(url: str):
+    """REDIS_URL에 맞는 클라이언트 생성 (inprocess://는 테스트용 대용품)"""
+    if url.startswith("inprocess://"):
+        return InProcessRedis()
+    try:
+        import redis
+    except ImportError as e:
+        raise RuntimeError('STORAGE_BACKEND=redis에는 redis 패키지가 필요합니다 (pip install redis)') from e
+    return redis.Redis.from_url(url, decode_responses=True)
@@ -0,0 +1,8 @@
+# 테스트는 외부 서비스 없이 메모리 저장소로 실행 (main을 import하기 전에 설정)
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("PREWARM_ENABLED", "false")
@@ -0,0 +1,51 @@
+# 활동 분석 인덱스: 다른 워커가 추가한 활동은 다시 만들지 않고 새 활동만 반영
+import pytest
+
+from analytics import ActivityAnalytics
+from records import ActivityRecord
+from storage import InProcessRedis, MemoryRepository, RedisRepository, SQLiteRepository
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def repo(request, tmp_path):
+    if request.param == "memory":
+        repository = MemoryRepository(chat_max_messages=10)
+    elif request.param == "sqlite":
+        repository = SQLiteRepository(str(tmp_path / "test.db"), chat_max_messages=10)
+    else:
+        repository = RedisRepository(InProcessRedis(), chat_max_messages=10)
+    yield repository
+    repository.close()
+
+
+def activity(day: int, category: str = "health") -> ActivityRecord:
+    return ActivityRecord.from_dict({"activity": "habit_done", "timestamp": f"2026-10-{day:02d}T09:00:00", "category": category})
+
+
+def test_new_activities_are_applied_incrementally(repo):
+    analytics = ActivityAnalytics(repo.scan_activities, repo.count_user_activities, max_users=10, chunk=2)
+    repo.add_activities("user_a", [activity(1), activity(2), activity(3)])
+    repo.add_activity("user_b", activity(1))
+    assert analytics.get("user_a").seen == 3
+    analytics.get("user_b")
+
+    # 다른 워커가 기록한 것처럼 저장소에만 추가
+    repo.add_activity("user_a", activity(4, "stress"))
+    repo.add_activities("user_a", [activity(5), activity(6)])
+    stats = analytics.get("user_a")
+    assert stats.seen == repo.count_user_activities("user_a") == 6
+    assert stats.categories == {"health": 5, "stress": 1}
+    assert stats.longest_streak == 6
+    assert analytics.counters == {"builds": 2, "rebuilds": 0, "updates": 3}
+    # 변경이 없는 사용자는 그대로
+    assert analytics.get("user_b").seen == 1 and analytics.counters["updates"] == 3
+
+
+def test_reset_rebuilds_only_that_user(repo):
+    analytics = ActivityAnalytics(repo.scan_activities, repo.count_user_activities, max_users=10)
+    repo.add_activities("user_a", [activity(1), activity(2)])
+    analytics.get("user_a")
+    repo.reset()
+    repo.add_activity("user_a", activity(9))
+    assert analytics.get("user_a").seen == 1
+    assert analytics.counters["rebuilds"] == 1
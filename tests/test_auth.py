@@ -0,0 +1,32 @@
+# 회원가입/프로필: 이미 쓰이는 이메일은 확인 단계와 관계없이 409
+from fastapi.testclient import TestClient
+
+import main
+from storage import EmailTaken
+
+
+def register(client: TestClient, email: str):
+    return client.post("/api/auth/register", json={"name": "테스터", "email": email, "password": "password123"})
+
+
+def test_duplicate_email_is_conflict_on_every_path(monkeypatch):
+    main.repo.reset()
+    client = TestClient(main.app)
+    assert register(client, "taken@example.com").status_code == 200
+    # 미리 확인하는 단계에서 걸리는 경우
+    assert register(client, "Taken@example.com").status_code == 409
+
+    # 확인 이후 다른 워커가 먼저 등록해 저장소가 거절하는 경우
+    def add_user(user):
+        raise EmailTaken(user["email"])
+    monkeypatch.setattr(main.repo, "add_user", add_user)
+    assert register(client, "race@example.com").status_code == 409
+
+
+def test_profile_email_owned_by_another_user_is_conflict():
+    main.repo.reset()
+    client = TestClient(main.app)
+    register(client, "first@example.com")
+    token = register(client, "second@example.com").json()["token"]
+    response = client.put("/api/user/profile", json={"email": "first@example.com"}, headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 409
@@ -0,0 +1,62 @@
+# 요약 대기 메시지: 요약에 반영된 메시지만 id로 제거하고, SQLite는 대기열도 디스크에 유지
+import pytest
+
+from records import ChatRecord, now_timestamp
+from storage import InProcessRedis, MemoryRepository, RedisRepository, SQLiteRepository
+
+MAX_MESSAGES = 4
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def repo(request, tmp_path):
+    if request.param == "memory":
+        repository = MemoryRepository(chat_max_messages=MAX_MESSAGES)
+    elif request.param == "sqlite":
+        repository = SQLiteRepository(str(tmp_path / "test.db"), chat_max_messages=MAX_MESSAGES)
+    else:
+        repository = RedisRepository(InProcessRedis(), chat_max_messages=MAX_MESSAGES)
+    yield repository
+    repository.close()
+
+
+def send(repo, count: int) -> None:
+    for _ in range(count):
+        message_id = repo.next_message_id()
+        repo.append_chat_message("user_a", ChatRecord(message_id, "user", f"메시지 {message_id}", now_timestamp()))
+
+
+def pending_ids(repo) -> list:
+    return [message.id for message in repo.chat_memory("user_a").pending]
+
+
+def test_trim_removes_only_summarized_messages(repo):
+    send(repo, MAX_MESSAGES + 3)
+    batch = pending_ids(repo)
+    assert len(batch) == 3
+
+    # 요약하는 동안 더 밀려나 대기열 상한으로 앞쪽이 잘림
+    send(repo, MAX_MESSAGES)
+    before = pending_ids(repo)
+    assert len(before) == MAX_MESSAGES and before[0] != batch[0]
+
+    repo.trim_chat_pending("user_a", batch)
+    assert pending_ids(repo) == [message_id for message_id in before if message_id not in batch]
+
+
+def test_sqlite_keeps_unsummarized_messages_across_restart(tmp_path):
+    path = str(tmp_path / "test.db")
+    repo = SQLiteRepository(path, chat_max_messages=MAX_MESSAGES)
+    send(repo, MAX_MESSAGES + 3)
+    batch = pending_ids(repo)[:2]
+    repo.trim_chat_pending("user_a", batch)
+    pending, messages = pending_ids(repo), [message.id for message in repo.chat_memory("user_a").messages]
+    count = repo.count_chat_messages()
+    repo.close()
+
+    reopened = SQLiteRepository(path, chat_max_messages=MAX_MESSAGES)
+    try:
+        assert pending_ids(reopened) == pending and len(pending) == 1
+        assert [message.id for message in reopened.chat_memory("user_a").messages] == messages
+        assert reopened.count_chat_messages() == count == MAX_MESSAGES
+    finally:
+        reopened.close()
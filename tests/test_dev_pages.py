@@ -0,0 +1,44 @@
+# 개발용 목록 API: 전체를 한 번에 만들지 않고 cursor로 나눠 읽음
+from fastapi.testclient import TestClient
+
+import main
+from records import ActivityRecord
+
+
+def seed(users: int, activities_per_user: list) -> None:
+    main.repo.reset()
+    for i in range(users):
+        main.repo.add_user({"id": f"user_{i}", "name": str(i), "email": f"{i}@example.com", "password": "x"})
+        for j in range(activities_per_user[i]):
+            main.repo.add_activity(f"user_{i}", ActivityRecord.from_dict({"activity": "habit_done", "habit": f"{i}-{j}"}))
+
+
+def test_users_are_paged():
+    seed(5, [0] * 5)
+    client = TestClient(main.app)
+    ids, cursor = [], None
+    while True:
+        body = client.get("/api/dev/users", params={"limit": 2, **({"cursor": cursor} if cursor else {})}).json()
+        assert len(body["users"]) <= 2 and all("password" not in user for user in body["users"])
+        ids.extend(user["id"] for user in body["users"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert ids == [f"user_{i}" for i in range(5)]
+
+
+def test_activities_are_paged_across_users():
+    seed(4, [3, 0, 1, 4])
+    client = TestClient(main.app)
+    habits, cursor, pages = [], None, 0
+    while True:
+        body = client.get("/api/dev/activities", params={"limit": 3, **({"cursor": cursor} if cursor else {})}).json()
+        pages += 1
+        page = [activity["habit"] for activities in body["user_activities"].values() for activity in activities]
+        assert len(page) <= 3
+        habits.extend(page)
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert habits == ["0-0", "0-1", "0-2", "2-0", "3-0", "3-1", "3-2", "3-3"]
+    assert pages == 3
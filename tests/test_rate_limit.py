@@ -0,0 +1,64 @@
+# 요청 제한: 토큰 버킷 충전/차감과 비용이 큰 배치 처리
+from fastapi.testclient import TestClient
+
+import main
+import ratelimit
+from ratelimit import TokenBucketLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def limiter(monkeypatch, rate: float = 1.0, burst: int = 3, max_keys: int = 100) -> tuple:
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock)
+    return TokenBucketLimiter(rate, burst, max_keys), clock
+
+
+def test_burst_then_refill_by_elapsed_time(monkeypatch):
+    bucket, clock = limiter(monkeypatch)
+    assert [bucket.acquire("a").allowed for _ in range(4)] == [True, True, True, False]
+    denied = bucket.acquire("a")
+    assert not denied.allowed and denied.retry_after == 1.0 and denied.headers()["Retry-After"] == "1"
+
+    clock.now += 2.5
+    assert [bucket.acquire("a").allowed for _ in range(3)] == [True, True, False]
+    # 충전은 버킷 크기를 넘지 않음
+    clock.now += 100
+    assert bucket.acquire("a", cost=3).remaining == 0
+
+
+def test_denied_request_is_not_charged(monkeypatch):
+    bucket, clock = limiter(monkeypatch)
+    assert bucket.acquire("a", cost=2).allowed
+    assert not bucket.acquire("a", cost=2).allowed
+    # 거절된 요청이 토큰을 쓰지 않았으므로 남은 1개로 통과
+    assert bucket.acquire("a", cost=1).allowed
+    assert bucket.counters == {"allowed": 2, "limited": 1, "evicted": 0}
+
+
+def test_keys_are_independent_and_bounded(monkeypatch):
+    bucket, clock = limiter(monkeypatch, burst=1, max_keys=2)
+    assert bucket.acquire("a").allowed and bucket.acquire("b").allowed
+    assert not bucket.acquire("a").allowed
+    # 세 번째 키가 들어오면 가장 오래 쓰지 않은 b를 버림 (다시 오면 가득 찬 버킷)
+    assert bucket.acquire("c").allowed
+    assert bucket.stats()["keys"] == 2 and bucket.counters["evicted"] == 1
+    assert bucket.acquire("b").allowed
+    assert not bucket.acquire("c").allowed
+
+
+def test_batch_costing_more_than_burst_is_rejected_without_charging():
+    main.ip_rate_limiter.clear()
+    items = [{"question": f"질문 {i}", "requestType": "alternative"} for i in range(main.RATE_LIMIT_IP_BURST // main.ALTERNATIVE_REQUEST_COST + 1)]
+    allowed = main.ip_rate_limiter.counters["allowed"]
+    response = TestClient(main.app).post("/api/habits/qa/batch", json={"items": items})
+    assert response.status_code == 400
+    assert main.ip_rate_limiter.counters["allowed"] == allowed
+    # 버킷은 그대로 가득 차 있음
+    assert main.ip_rate_limiter.acquire("ip:testclient", main.RATE_LIMIT_IP_BURST).allowed
@@ -0,0 +1,49 @@
+# 미리 만든 카드 추천 답변: 개인화가 필요한 로그인 사용자는 풀을 쓰지 않음
+import main
+
+
+def answer(text: str) -> dict:
+    return {"choices": [{"message": {"role": "assistant", "content": text}}], "usage": {}}
+
+
+def fill_pool(request: main.QARequest, count: int = 3) -> None:
+    main.recommendation_pool.clear()
+    main.recommendation_pool_cursor.clear()
+    main.recommendation_pool[main.pool_key(request)] = [answer(f"추천 {i}") for i in range(count)]
+
+
+def card_request() -> main.QARequest:
+    return next(request for request in main.catalog_requests() if request.requestType == "normal")
+
+
+def test_anonymous_request_uses_pool_and_logged_in_request_does_not():
+    request = card_request()
+    fill_pool(request)
+    user = {"id": "user_a", "name": "테스터"}
+    try:
+        assert main.find_cached_qa(request, main.build_qa_messages(request, None)) is not None
+        assert main.find_cached_qa(request, main.build_qa_messages(request, user), user) is None
+    finally:
+        main.recommendation_pool.clear()
+
+
+def test_each_client_rotates_through_variants_independently():
+    request = card_request()
+    fill_pool(request)
+    messages = main.build_qa_messages(request, None)
+
+    def take(client_key: str) -> str:
+        token = main.upstream_flow.set((client_key, 1.0))
+        try:
+            return main.find_cached_qa(request, messages)["choices"][0]["message"]["content"]
+        finally:
+            main.upstream_flow.reset(token)
+
+    try:
+        assert take("ip:a") == "추천 0"
+        # 다른 요청자의 클릭이 끼어들어도 a는 아직 보지 않은 다음 답변을 받음
+        assert [take("ip:b"), take("ip:b")] == ["추천 0", "추천 1"]
+        assert [take("ip:a"), take("ip:a"), take("ip:a")] == ["추천 1", "추천 2", "추천 0"]
+    finally:
+        main.recommendation_pool.clear()
+        main.recommendation_pool_cursor.clear()
@@ -0,0 +1,58 @@
+# 같은 Redis를 쓰는 두 워커를 두 RedisRepository 인스턴스로 흉내냄
+import pytest
+
+from records import ChatRecord
+from storage import EmailTaken, InProcessRedis, RedisRepository
+
+
+@pytest.fixture
+def workers():
+    client = InProcessRedis()
+    return RedisRepository(client, chat_max_messages=2), RedisRepository(client, chat_max_messages=2)
+
+
+def user(user_id: str, email: str) -> dict:
+    return {"id": user_id, "name": user_id, "email": email, "password": "x"}
+
+
+def test_user_ids_are_unique_across_workers(workers):
+    first, second = workers
+    ids = [repo.new_user_id() for _ in range(50) for repo in (first, second)]
+    assert len(set(ids)) == len(ids)
+
+
+def test_same_email_registers_only_once(workers):
+    first, second = workers
+    first.add_user(user(first.new_user_id(), "a@example.com"))
+    with pytest.raises(EmailTaken):
+        second.add_user(user(second.new_user_id(), "a@example.com"))
+
+    owner = second.get_user_by_email("a@example.com")
+    assert owner is not None and owner["id"] == first.get_user_by_email("a@example.com")["id"]
+    assert second.count_users() == 1
+
+
+def test_email_change_cannot_take_another_users_email(workers):
+    first, second = workers
+    first.add_user(user("user_a", "a@example.com"))
+    second.add_user(user("user_b", "b@example.com"))
+    with pytest.raises(EmailTaken):
+        second.update_user("user_b", {"email": "a@example.com"})
+    assert first.get_user_by_email("a@example.com")["id"] == "user_a"
+    assert first.get_user_by_email("b@example.com")["id"] == "user_b"
+
+
+def test_only_one_worker_summarizes_a_chat(workers):
+    first, second = workers
+    first.add_user(user("user_a", "a@example.com"))
+    for i in range(4):
+        first.append_chat_message("user_a", ChatRecord(i + 1, "user", f"메시지 {i}", None))
+
+    memory_a, memory_b = first.chat_memory("user_a"), second.chat_memory("user_a")
+    assert memory_a.needs_summary(2) and memory_b.needs_summary(2)
+    assert memory_a.start_summary()
+    assert not memory_b.start_summary()
+    assert not second.chat_memory("user_a").needs_summary(2)
+
+    memory_a.summarizing = False
+    assert second.chat_memory("user_a").start_summary()
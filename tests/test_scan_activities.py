@@ -0,0 +1,53 @@
+# Repository.scan_activities: 조건을 저장소에 넘겨 정해진 개수씩 읽고, 위치로 이어 읽기
+import pytest
+
+from records import ActivityRecord
+from storage import InProcessRedis, MemoryRepository, RedisRepository, SQLiteRepository, activity_matches
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def repo(request, tmp_path):
+    if request.param == "memory":
+        repository = MemoryRepository(chat_max_messages=10)
+    elif request.param == "sqlite":
+        repository = SQLiteRepository(str(tmp_path / "test.db"), chat_max_messages=10)
+    else:
+        repository = RedisRepository(InProcessRedis(), chat_max_messages=10)
+    repository.add_user({"id": "user_a", "name": "a", "email": "a@example.com", "password": "x"})
+    yield repository
+    repository.close()
+
+
+def activity(i: int) -> ActivityRecord:
+    return ActivityRecord.from_dict({
+        "activity": "habit_done",
+        "timestamp": f"2026-10-{1 + i % 28:02d}T09:00:00",
+        "category": ["health", "stress"][i % 2],
+        "habit": "run",
+    })
+
+
+def scan_all(repo, chunk: int, **conditions) -> list:
+    records, after = [], 0
+    while True:
+        page = repo.scan_activities("user_a", after, chunk, **conditions)
+        if not page:
+            return records
+        assert len(page) <= chunk
+        records.extend(record.to_dict() for _, record in page)
+        after = page[-1][0]
+
+
+@pytest.mark.parametrize("conditions", [{}, {"since": "2026-10-10", "until": "2026-10-20"}, {"category": "stress"}])
+def test_chunked_scan_matches_full_filter(repo, conditions):
+    records = [activity(i) for i in range(100)]
+    repo.add_activities("user_a", records[:60])
+    if hasattr(repo, "flush"):
+        repo.flush()
+    repo.add_activities("user_a", records[60:])  # SQLite에서는 일부가 아직 커밋 전(오버레이)
+
+    expected = [
+        record.to_dict() for record in records
+        if activity_matches(record, conditions.get("since"), conditions.get("until"), conditions.get("category"))
+    ]
+    assert scan_all(repo, 7, **conditions) == expected
@@ -0,0 +1,41 @@
+import itertools
+
+import main
+from similarity import DEFAULT_THRESHOLD, jaccard, shingles
+
+
+def answer(text: str) -> dict:
+    return {"choices": [{"message": {"role": "assistant", "content": text}}], "usage": {}}
+
+
+def test_catalog_habits_in_one_category_never_share_an_answer():
+    for request_type in main.CATALOG_QUESTION_TEMPLATES:
+        requests = [request for request in main.catalog_requests() if request.requestType == request_type]
+        for stored in requests:
+            main.qa_cache.clear()
+            main.similar_cache.clear()
+            main.store_qa_answer(stored, main.build_qa_messages(stored, None), answer(stored.habitType))
+            for request in requests:
+                if request.category != stored.category or request.habitType == stored.habitType:
+                    continue
+                assert main.find_cached_qa(request, main.build_qa_messages(request, None)) is None
+
+
+def test_paraphrased_question_reuses_only_same_habit():
+    main.qa_cache.clear()
+    main.similar_cache.clear()
+    stored = main.QARequest(question="아침 운동 습관을 매일 꾸준히 이어가는 방법", category="health", habitType="아침 운동")
+    main.store_qa_answer(stored, main.build_qa_messages(stored, None), answer("아침 운동"))
+
+    same = main.QARequest(question="아침 운동 습관을 매일 꾸준히 이어가는 방법은", category="health", habitType="아침 운동")
+    other = main.QARequest(question=same.question, category="health", habitType="스트레칭")
+    assert main.find_cached_qa(same, main.build_qa_messages(same, None)) is not None
+    assert main.find_cached_qa(other, main.build_qa_messages(other, None)) is None
+
+
+def test_default_threshold_is_above_catalog_template_similarity():
+    for cards in main.HABIT_CATALOG.values():
+        for template in main.CATALOG_QUESTION_TEMPLATES.values():
+            questions = [template.format(prompt=prompt) for _, prompt in cards]
+            for a, b in itertools.combinations(questions, 2):
+                assert jaccard(shingles(a), shingles(b)) < DEFAULT_THRESHOLD
@@ -0,0 +1,88 @@
+# SingleFlight: 같은 키의 동시 호출은 한 번만 실행하고, 대기자 취소가 다른 대기자에게 영향을 주지 않음
+import asyncio
+
+from main import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    async def scenario():
+        flights = SingleFlight()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return {"answer": calls}
+
+        results = await asyncio.gather(*(flights.do("key", fetch) for _ in range(5)))
+        # 끝난 뒤의 호출은 새로 실행
+        again = await flights.do("key", fetch)
+        return flights, results, again
+
+    flights, results, again = asyncio.run(scenario())
+    assert results == [{"answer": 1}] * 5 and results[0] is results[4]
+    assert again == {"answer": 2}
+    assert flights.stats() == {"in_flight": 0, "calls": 2, "shared": 4, "abandoned": 0}
+
+
+def test_cancelled_waiter_does_not_cancel_shared_call():
+    async def scenario():
+        flights = SingleFlight()
+        started = asyncio.Event()
+
+        async def fetch():
+            started.set()
+            await asyncio.sleep(0.02)
+            return "done"
+
+        first = asyncio.create_task(flights.do("key", fetch))
+        await started.wait()
+        second = asyncio.create_task(flights.do("key", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        return flights, await second, await asyncio.gather(first, return_exceptions=True)
+
+    flights, result, (first,) = asyncio.run(scenario())
+    assert result == "done"
+    assert isinstance(first, asyncio.CancelledError)
+    assert flights.abandoned == 0
+
+
+def test_call_is_cancelled_when_every_waiter_leaves():
+    async def scenario():
+        flights = SingleFlight()
+        finished = False
+
+        async def fetch():
+            nonlocal finished
+            await asyncio.sleep(1)
+            finished = True
+
+        waiters = [asyncio.create_task(flights.do("key", fetch)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0.01)
+        return flights, finished
+
+    flights, finished = asyncio.run(scenario())
+    assert not finished
+    assert flights.stats()["abandoned"] == 1 and flights.stats()["in_flight"] == 0
+
+
+def test_error_reaches_every_waiter():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream")
+
+        results = await asyncio.gather(*(flights.do("key", fail) for _ in range(3)), return_exceptions=True)
+        return flights, results
+
+    flights, results = asyncio.run(scenario())
+    assert len(results) == 3 and all(isinstance(result, ValueError) for result in results)
+    assert flights.stats() == {"in_flight": 0, "calls": 1, "shared": 2, "abandoned": 0}
@@ -0,0 +1,69 @@
+# SQLiteRepository: write-behind 오버레이와 DB를 함께 읽을 때 커밋 직후의 행을 놓치지 않는지
+import pytest
+
+from records import ActivityRecord
+from storage import SQLiteRepository, StorageWriteError
+
+
+def activity(i: int) -> ActivityRecord:
+    return ActivityRecord.from_dict({"activity": "habit_done", "timestamp": f"2026-10-01T09:00:{i % 60:02d}", "habit": str(i)})
+
+
+def test_reads_see_rows_committed_during_the_read(tmp_path):
+    # 한 건씩 아주 짧은 간격으로 커밋해 SELECT와 오버레이 복사 사이에 커밋이 끼어들게 함
+    repo = SQLiteRepository(str(tmp_path / "test.db"), chat_max_messages=10, batch_size=1, flush_interval=0.0005)
+    try:
+        after = 0
+        for i in range(2000):
+            repo.add_activity("user_a", activity(i))
+            page = repo.scan_activities("user_a", after, 10)
+            assert [record.habit for _, record in page] == [str(i)]
+            after = page[-1][0]
+            if i % 100 == 0:
+                assert len(repo.get_activities("user_a")) == i + 1
+    finally:
+        repo.close()
+
+
+def test_flushed_rows_keep_order_and_content(tmp_path):
+    repo = SQLiteRepository(str(tmp_path / "test.db"), chat_max_messages=10)
+    try:
+        for i in range(5):
+            repo.add_activity("user_a", activity(i))
+        before = [record.to_dict() for record in repo.get_activities("user_a")]
+        repo.flush()
+        assert [record.to_dict() for record in repo.get_activities("user_a")] == before
+        assert [record.habit for record in repo.get_activities("user_a")] == ["0", "1", "2", "3", "4"]
+    finally:
+        repo.close()
+
+
+def test_failed_write_stays_visible_and_is_reported(tmp_path):
+    repo = SQLiteRepository(str(tmp_path / "test.db"), chat_max_messages=10)
+    try:
+        repo._reader().execute(
+            "CREATE TRIGGER reject_bad BEFORE INSERT ON activities WHEN json_extract(NEW.data, '$.habit') = 'bad' "
+            "BEGIN SELECT RAISE(ABORT, 'rejected'); END"
+        )
+        repo.add_activity("user_a", activity(0))
+        repo.add_activities("user_a", [ActivityRecord.from_dict({"activity": "habit_done", "habit": "bad"})])
+        repo.add_activity("user_a", activity(2))
+        with pytest.raises(StorageWriteError, match="rejected"):
+            repo.flush()
+        # 커밋하지 못한 행도 오버레이에서 사라지지 않음
+        assert [record.habit for record in repo.get_activities("user_a")] == ["0", "bad", "2"]
+        assert repo.count_user_activities("user_a") == 3
+        assert repo.stats()["failed_writes"] == 1
+    finally:
+        repo.close()
+
+
+def test_second_writer_on_same_file_is_rejected(tmp_path):
+    path = str(tmp_path / "test.db")
+    repo = SQLiteRepository(path, chat_max_messages=10)
+    try:
+        with pytest.raises(RuntimeError):
+            SQLiteRepository(path, chat_max_messages=10)
+    finally:
+        repo.close()
+    SQLiteRepository(path, chat_max_messages=10).close()
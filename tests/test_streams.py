@@ -0,0 +1,17 @@
+# SSE 스트림: done까지 보내지 못한 스트림은 로그 대신 메트릭으로 셈
+from fastapi.testclient import TestClient
+
+import main
+
+
+def test_failed_qa_stream_is_counted():
+    main.qa_cache.clear()
+    main.similar_cache.clear()
+    main.ip_rate_limiter.clear()
+    before = main.streams_aborted_total.values.get(("qa",), 0)
+    # lifespan 없이 호출하므로 업스트림 클라이언트가 없어 스트림 중간에 오류 이벤트로 끝남
+    response = TestClient(main.app).post("/api/habits/qa/stream", json={"question": "스트림 중단 테스트 질문"})
+    assert response.status_code == 200
+    assert "event: done" not in response.text
+    assert main.streams_aborted_total.values[("qa",)] == before + 1
+    assert "sse_streams_aborted_total" in main.metrics_registry.render()
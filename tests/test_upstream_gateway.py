@@ -0,0 +1,120 @@
+# UpstreamGateway.admit: 동시 실행 제한, 흐름별 공정 대기열(WFQ), 대기 시간 초과/취소 시 슬롯 반납
+import asyncio
+
+import pytest
+
+from upstream import CircuitBreaker, UpstreamGateway, UpstreamUnavailable, upstream_flow
+
+
+def gateway(max_in_flight: int = 1, max_queue: int = 16, queue_timeout: float = 1.0, max_queue_per_flow=None) -> UpstreamGateway:
+    return UpstreamGateway(
+        max_in_flight=max_in_flight, max_queue=max_queue, queue_timeout=queue_timeout,
+        max_retries=0, retry_base=0.01, retry_max=0.01,
+        breaker=CircuitBreaker(failure_threshold=5, reset_timeout=1.0),
+        max_queue_per_flow=max_queue_per_flow,
+    )
+
+
+async def use_slot(gw: UpstreamGateway, flow: str, order: list, hold: float = 0.0) -> None:
+    upstream_flow.set((flow, 1.0))
+    async with gw.admit():
+        order.append(flow)
+        await asyncio.sleep(hold)
+
+
+async def settle() -> None:
+    """대기열에 들어갈 때까지 이벤트 루프를 몇 번 돌림"""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_in_flight_never_exceeds_limit():
+    async def scenario():
+        gw = gateway(max_in_flight=3, max_queue=32)
+        active, peak = 0, 0
+
+        async def call(i: int) -> None:
+            nonlocal active, peak
+            upstream_flow.set((f"user:{i % 4}", 1.0))
+            async with gw.admit():
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0.005)
+                active -= 1
+
+        await asyncio.gather(*(call(i) for i in range(20)))
+        return gw, peak
+
+    gw, peak = asyncio.run(scenario())
+    assert peak == 3
+    assert gw.in_flight == 0 and gw.waiting == 0
+
+
+def test_waiting_flows_are_served_fairly():
+    async def scenario():
+        gw = gateway(max_in_flight=1)
+        order = []
+        holder = asyncio.create_task(use_slot(gw, "holder", order, hold=0.01))
+        await settle()
+        # 한 사용자가 먼저 몰아서 보내도 뒤에 온 다른 사용자가 그 뒤에 줄 서지 않음
+        heavy = [asyncio.create_task(use_slot(gw, "user:heavy", order)) for _ in range(4)]
+        await settle()
+        light = asyncio.create_task(use_slot(gw, "user:light", order))
+        await asyncio.gather(holder, *heavy, light)
+        return gw, order
+
+    gw, order = asyncio.run(scenario())
+    assert order[0] == "holder"
+    assert order.index("user:light") <= 2
+    assert gw.in_flight == 0
+
+
+def test_per_flow_queue_cap_rejects_only_that_flow():
+    async def scenario():
+        gw = gateway(max_in_flight=1, max_queue_per_flow=2)
+        order = []
+        holder = asyncio.create_task(use_slot(gw, "holder", order, hold=0.01))
+        await settle()
+        waiting = [asyncio.create_task(use_slot(gw, "user:a", order)) for _ in range(2)]
+        await settle()
+        with pytest.raises(UpstreamUnavailable) as rejected:
+            await use_slot(gw, "user:a", order)
+        other = asyncio.create_task(use_slot(gw, "user:b", order))
+        await asyncio.gather(holder, *waiting, other)
+        return gw, order, rejected.value
+
+    gw, order, rejected = asyncio.run(scenario())
+    assert rejected.status_code == 429
+    assert sorted(order) == ["holder", "user:a", "user:a", "user:b"]
+    assert gw.in_flight == 0 and gw.waiting == 0
+
+
+def test_timed_out_and_cancelled_waiters_do_not_leak_slots():
+    async def scenario():
+        gw = gateway(max_in_flight=1, queue_timeout=0.02)
+        order = []
+        release = asyncio.Event()
+
+        async def hold() -> None:
+            async with gw.admit():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await settle()
+        with pytest.raises(UpstreamUnavailable) as timed_out:
+            await use_slot(gw, "user:a", order)
+        cancelled = asyncio.create_task(use_slot(gw, "user:b", order))
+        await settle()
+        cancelled.cancel()
+        await asyncio.gather(cancelled, return_exceptions=True)
+
+        release.set()
+        await holder
+        # 반납된 슬롯은 다음 요청이 바로 얻음
+        await use_slot(gw, "user:c", order)
+        return gw, order, timed_out.value
+
+    gw, order, timed_out = asyncio.run(scenario())
+    assert timed_out.status_code == 503
+    assert order == ["user:c"]
+    assert gw.in_flight == 0 and gw.waiting == 0 and not gw._queue
@@ -0,0 +1,97 @@
+# 업스트림에 보낼 메시지의 토큰 수를 로컬에서 세고, 토큰 예산 안에서 대화 맥락을 구성
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from records import ChatRecord
+
+# 채팅 형식에서 메시지마다 붙는 토큰 (role, 구분자)과 답변 시작 토큰
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMING_TOKENS = 3
+
+
+def estimate_tokens(text: str) -> int:
+    """tiktoken이 없을 때 쓰는 보정된 추정기
+
+    cl100k 계열 토크나이저 기준으로 한글/한자는 글자당 약 1.2토큰, 영문·숫자는
+    약 4글자당 1토큰, 공백과 문장부호는 약 2글자당 1토큰으로 계산합니다.
+    예산을 넘지 않도록 약간 크게 잡습니다.
+    """
+    cjk = 0
+    ascii_word = 0
+    other = 0
+    for char in text:
+        code = ord(char)
+        if 0xAC00 <= code <= 0xD7A3 or 0x3130 <= code <= 0x318F or 0x4E00 <= code <= 0x9FFF:
+            cjk += 1
+        elif char.isalnum() and code < 128:
+            ascii_word += 1
+        else:
+            other += 1
+    return int(cjk * 1.2 + ascii_word / 4 + other / 2) + 1
+
+
+def load_tokenizer() -> Tuple[str, Callable[[str], int]]:
+    """tiktoken이 설치되어 있으면 실제 토크나이저를, 없으면 추정기를 사용 (pip install tiktoken)"""
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return "estimate", estimate_tokens
+    return "tiktoken:cl100k_base", lambda text: len(encoding.encode(text))
+
+
+class TokenCounter:
+    """메시지 내용별 토큰 수를 LRU로 캐시 (보낼 때마다 전체 내역을 다시 세지 않음)"""
+
+    def __init__(self, max_entries: int, count: Optional[Callable[[str], int]] = None):
+        if count is None:
+            self.tokenizer, count = load_tokenizer()
+        else:
+            self.tokenizer = "custom"
+        self._count = count
+        self._cache: OrderedDict = OrderedDict()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def count_text(self, text: str) -> int:
+        tokens = self._cache.get(text)
+        if tokens is not None:
+            self._cache.move_to_end(text)
+            self.hits += 1
+            return tokens
+        self.misses += 1
+        tokens = self._count(text)
+        self._cache[text] = tokens
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return tokens
+
+    def count_message(self, message: Dict) -> int:
+        return self.count_text(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+    def stats(self) -> Dict:
+        return {"tokenizer": self.tokenizer, "entries": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+
+def pack_context(
+    counter: TokenCounter,
+    system_message: Dict,
+    history: List[ChatRecord],
+    budget: int,
+) -> Tuple[List[Dict], int]:
+    """시스템 메시지 + 예산 안에 들어가는 최근 대화를 (메시지 목록, 추정 prompt 토큰)으로 반환
+
+    history는 오래된 순이며 최신 메시지(방금 보낸 질문)는 예산을 넘어도 항상 포함합니다.
+    업스트림에는 role/content만 전달합니다.
+    """
+    used = counter.count_message(system_message) + REPLY_PRIMING_TOKENS
+    selected: List[Dict] = []
+    for message in reversed(history):
+        tokens = counter.count_text(message.content) + MESSAGE_OVERHEAD_TOKENS
+        if selected and used + tokens > budget:
+            break
+        used += tokens
+        selected.append({"role": message.role, "content": message.content})
+    selected.reverse()
+    return [system_message] + selected, used
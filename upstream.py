@@ -0,0 +1,364 @@
+# 업스트림(LLM API) 호출 보호 계층: 동시 실행 제한, 대기열, 재시도, 서킷 브레이커
+import asyncio
+import heapq
+import itertools
+import math
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+
+# 🆕 지금 처리 중인 요청의 (흐름 키, 가중치): 요청 핸들러에서 설정하면 그 안에서 만든 Task에도 전달됨
+upstream_flow: ContextVar[Optional[Tuple[str, float]]] = ContextVar("upstream_flow", default=None)
+
+# 흐름을 설정하지 않은 호출 (추천 사전 생성, 대화 요약 등 백그라운드 작업)
+BACKGROUND_FLOW = ("background", 0.25)
+
+
+class UpstreamUnavailable(Exception):
+    """업스트림을 지금 호출할 수 없음 (대기열 초과, 서킷 열림 등) - 429/503으로 응답"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+# 재시도할 만한 업스트림 상태 코드
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def is_retryable(error: Exception) -> bool:
+    """타임아웃, 연결 오류, 일시적인 5xx/429는 재시도 대상"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (httpx.TimeoutException, httpx.TransportError))
+
+
+def counts_as_failure(error: Exception) -> bool:
+    """서킷 브레이커가 업스트림 장애로 볼 오류 (요청 자체가 잘못된 4xx는 제외)"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500 or error.response.status_code == 429
+    return isinstance(error, (httpx.TimeoutException, httpx.TransportError))
+
+
+def retry_after_hint(error: Exception) -> Optional[float]:
+    """업스트림이 보낸 Retry-After(초) 값"""
+    if isinstance(error, httpx.HTTPStatusError):
+        try:
+            return float(error.response.headers.get("retry-after", ""))
+        except ValueError:
+            return None
+    return None
+
+
+class CircuitBreaker:
+    """연속 실패가 임계값을 넘으면 일정 시간 호출을 막고, 이후 한 건씩 시험 호출"""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"  # closed, open, half_open
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._probe_in_flight = False
+
+    def _refresh(self) -> None:
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+
+    def available(self) -> bool:
+        """호출이 허용될지 확인만 함 (시험 호출 자리를 차지하지 않음)"""
+        self._refresh()
+        return self.state == "closed" or (self.state == "half_open" and not self._probe_in_flight)
+
+    def allow(self) -> bool:
+        """실제 호출 직전에 확인 (half_open이면 시험 호출 한 건만 통과)"""
+        if not self.available():
+            return False
+        if self.state == "half_open":
+            self._probe_in_flight = True
+        return True
+
+    def release_probe(self) -> None:
+        """시험 호출이 결과 없이 취소되었을 때 자리 반납"""
+        self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.trips += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def retry_after(self) -> float:
+        if self.state != "open":
+            return 1
+        return max(1.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def stats(self) -> Dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "trips": self.trips,
+        }
+
+
+class HedgePolicy:
+    """느린 호출에 같은 요청을 한 번 더 보내는 시점(헤지 지연)과 예산 관리
+
+    - delay가 있으면 고정 지연, 없으면 최근 성공한 호출 지연의 quantile (표본이 min_samples 미만이면 헤지 안 함)
+    - 헤지 수는 전체 호출의 budget_ratio 비율 (+ 여유 burst건)을 넘지 않음
+    """
+
+    def __init__(self, delay: Optional[float], quantile: float, budget_ratio: float, min_samples: int = 20, window: int = 256, burst: int = 2):
+        self.fixed_delay = delay
+        self.quantile = quantile
+        self.budget_ratio = budget_ratio
+        self.min_samples = min_samples
+        self.burst = burst
+        self._latencies = deque(maxlen=window)
+        self.counters = {"calls": 0, "hedged": 0, "hedge_wins": 0, "over_budget": 0}
+
+    def observe(self, latency: float) -> None:
+        self._latencies.append(latency)
+
+    def delay(self) -> Optional[float]:
+        if self.fixed_delay is not None:
+            return self.fixed_delay
+        if len(self._latencies) < self.min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.quantile))]
+
+    def try_acquire(self) -> bool:
+        if self.counters["hedged"] >= self.budget_ratio * self.counters["calls"] + self.burst:
+            self.counters["over_budget"] += 1
+            return False
+        self.counters["hedged"] += 1
+        return True
+
+    def stats(self) -> Dict:
+        delay = self.delay()
+        return {"delay_seconds": round(delay, 4) if delay is not None else None, "samples": len(self._latencies), **self.counters}
+
+
+class UpstreamGateway:
+    """모든 LLM 호출이 거치는 관문
+
+    - max_in_flight: 동시에 업스트림으로 나가는 요청 수
+    - max_queue: 슬롯을 기다릴 수 있는 요청 수 (넘치면 즉시 429)
+    - max_queue_per_flow: 한 흐름(사용자/IP)이 기다릴 수 있는 요청 수
+    - queue_timeout: 슬롯 대기 최대 시간 (넘으면 503)
+    - 멱등 호출은 일시적 오류에 지터를 준 지수 백오프로 재시도
+
+    🆕 빈 슬롯은 가중치 공정 큐(WFQ)로 나눠 줍니다. 흐름별로 "가상 종료 시각"을 매겨
+    가장 이른 대기자부터 슬롯을 넘기므로, 한 사용자가 몰아서 보내도 다른 사용자의 요청이
+    그 뒤에 줄 서지 않습니다.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_queue: int,
+        queue_timeout: float,
+        max_retries: int,
+        retry_base: float,
+        retry_max: float,
+        breaker: CircuitBreaker,
+        max_queue_per_flow: Optional[int] = None,
+        max_flows: int = 10000,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.breaker = breaker
+        self.max_queue_per_flow = max_queue_per_flow or max_queue
+        self.max_flows = max_flows
+        self._queue: list = []  # [(가상 종료 시각, 순번, future)] 힙
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._flow_finish: Dict[str, float] = {}  # 흐름별 마지막 가상 종료 시각
+        self._flow_waiting: Dict[str, int] = {}
+        self.in_flight = 0
+        self.waiting = 0
+        self.counters = {"calls": 0, "retries": 0, "failures": 0, "rejected_queue_full": 0, "rejected_timeout": 0, "rejected_circuit_open": 0}
+
+    def _circuit_open(self) -> UpstreamUnavailable:
+        self.counters["rejected_circuit_open"] += 1
+        return UpstreamUnavailable(503, "AI 서비스가 일시적으로 불안정합니다. 잠시 후 다시 시도해주세요.", self.breaker.retry_after())
+
+    def check_admission(self) -> None:
+        """지금 요청을 받을 수 없으면 UpstreamUnavailable 발생 (슬롯은 잡지 않음)"""
+        if not self.breaker.available():
+            raise self._circuit_open()
+        if self.in_flight >= self.max_in_flight and self.waiting >= self.max_queue:
+            self.counters["rejected_queue_full"] += 1
+            raise UpstreamUnavailable(429, "요청이 많아 잠시 후 다시 시도해주세요.", 1)
+
+    def _finish_tag(self, flow: str, weight: float) -> float:
+        """흐름의 다음 요청 가상 종료 시각 (오래 쉬던 흐름은 현재 가상 시각부터 시작)"""
+        finish = max(self._virtual_time, self._flow_finish.get(flow, 0.0)) + 1.0 / weight
+        self._flow_finish[flow] = finish
+        if len(self._flow_finish) > self.max_flows:
+            # 이미 가상 시각보다 뒤처진 흐름은 새 흐름과 같으므로 지워도 됨
+            self._flow_finish = {key: value for key, value in self._flow_finish.items() if value > self._virtual_time}
+        return finish
+
+    def _release(self) -> None:
+        """슬롯 반납: 가상 종료 시각이 가장 이른 대기자에게 슬롯을 그대로 넘김"""
+        while self._queue:
+            finish, _, future = heapq.heappop(self._queue)
+            if future.done():  # 시간 초과/취소된 대기자
+                continue
+            self._virtual_time = finish
+            future.set_result(None)
+            return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def admit(self):
+        """업스트림 슬롯 하나를 확보 (대기열이 가득 찼거나 오래 기다리면 거절)"""
+        self.check_admission()
+        flow, weight = upstream_flow.get() or BACKGROUND_FLOW
+        if self.in_flight < self.max_in_flight and not self._queue:
+            self.in_flight += 1  # 빈 슬롯이 있으면 기다리지 않고 바로 획득
+        else:
+            if self._flow_waiting.get(flow, 0) >= self.max_queue_per_flow:
+                self.counters["rejected_queue_full"] += 1
+                raise UpstreamUnavailable(429, "요청이 많아 잠시 후 다시 시도해주세요.", 1)
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._queue, (self._finish_tag(flow, weight), next(self._seq), future))
+            self.waiting += 1
+            self._flow_waiting[flow] = self._flow_waiting.get(flow, 0) + 1
+            try:
+                await asyncio.wait_for(future, self.queue_timeout)
+            except BaseException as e:
+                # 시간 초과/취소와 동시에 슬롯을 넘겨받았다면 다음 대기자에게 돌려줌
+                if future.done() and not future.cancelled():
+                    self._release()
+                if isinstance(e, asyncio.TimeoutError):
+                    self.counters["rejected_timeout"] += 1
+                    raise UpstreamUnavailable(503, "AI 서비스 대기 시간이 초과되었습니다. 잠시 후 다시 시도해주세요.", self.queue_timeout)
+                raise
+            finally:
+                self.waiting -= 1
+                remaining = self._flow_waiting[flow] - 1
+                if remaining:
+                    self._flow_waiting[flow] = remaining
+                else:
+                    del self._flow_waiting[flow]
+
+        try:
+            yield
+        finally:
+            self._release()
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        """지터를 준 지수 백오프 (업스트림 Retry-After가 있으면 존중)"""
+        delay = random.uniform(0, min(self.retry_max, self.retry_base * (2 ** attempt)))
+        hint = retry_after_hint(error)
+        if hint is not None:
+            delay = max(delay, min(hint, self.retry_max))
+        return delay
+
+    def begin_attempt(self) -> None:
+        """시도 직전 서킷 상태 확인 (열려 있으면 503)"""
+        if not self.breaker.allow():
+            raise self._circuit_open()
+        self.counters["calls"] += 1
+
+    def should_retry(self, attempt: int, error: Exception, idempotent: bool = True) -> bool:
+        return idempotent and attempt < self.max_retries and is_retryable(error) and self.breaker.available()
+
+    def record_result(self, error: Optional[Exception] = None) -> None:
+        if error is None:
+            self.breaker.record_success()
+        elif counts_as_failure(error):
+            self.counters["failures"] += 1
+            self.breaker.record_failure()
+        else:
+            self.breaker.release_probe()
+
+    async def call(self, func, idempotent: bool = True):
+        """슬롯을 잡고 func()를 실행, 실패 시 재시도"""
+        async with self.admit():
+            attempt = 0
+            while True:
+                self.begin_attempt()
+                try:
+                    result = await func()
+                except asyncio.CancelledError:
+                    self.breaker.release_probe()
+                    raise
+                except Exception as e:
+                    self.record_result(e)
+                    if not self.should_retry(attempt, e, idempotent):
+                        raise
+                    self.counters["retries"] += 1
+                    await asyncio.sleep(self.backoff(attempt, e))
+                    attempt += 1
+                    continue
+                self.record_result()
+                return result
+
+    async def call_hedged(self, func, hedge: HedgePolicy):
+        """call()과 같지만 헤지 지연 안에 끝나지 않으면 빈 슬롯이 있을 때 한 번 더 호출해 먼저 끝난 결과 사용
+
+        남은 호출은 취소합니다. 둘 다 실패하면 마지막 오류를 그대로 올립니다.
+        """
+        hedge.counters["calls"] += 1
+        delay = hedge.delay()
+        tasks = [asyncio.ensure_future(self.call(func))]
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                # 헤지가 대기열에 쌓이면 오히려 부하만 늘리므로 빈 슬롯이 있을 때만 보냄
+                if not done and self.in_flight < self.max_in_flight and self.breaker.state == "closed" and hedge.try_acquire():
+                    tasks.append(asyncio.ensure_future(self.call(func)))
+            pending = list(tasks)
+            while True:
+                done, still_pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                error = None
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            hedge.counters["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+                pending = list(still_pending)
+                if not pending:
+                    raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict:
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "max_queue_per_flow": self.max_queue_per_flow,
+            "waiting_flows": len(self._flow_waiting),
+            **self.counters,
+            "circuit_breaker": self.breaker.stats(),
+        }